@@ -26,8 +26,10 @@ def create_app():
     from app.models.user_app import UserApp
     from app.apps.multi_control.models import (
         Field, Equipment, Zone, IrrigationPlan,
-        Alert, Log, Firmware
+        Alert, Log, Firmware, FirmwareChunk, FirmwareDelta, FirmwareRollout, FirmwareRolloutTarget, Geometry,
+        SimCard, SimSyncRun, SimUsageHourly, WaterUsageHourly, WaterUsageDaily, SharedMultiControl
     )
+    from app.apps.task_manager.models import SharedTask
     from app.apps.inventory.models import create_app_tables
 
     # Initialize extensions
@@ -0,0 +1,81 @@
+"""SQL behind the LISTEN/NOTIFY change feed.
+
+The only copy of the trigger definitions: the migrations and
+ChangeFeed.install_triggers (used by the tests) all execute these strings.
+Kept free of app imports so migrations can load it cheaply.
+
+fields, equipment and alerts notify per row. logs is the hottest insert
+path, so it gets one statement-level trigger that reads the statement's
+transition table and sends one NOTIFY per (account, event_type) it touched.
+"""
+
+CHANGE_FEED_CHANNEL = 'multi_control_changes'
+ROW_TABLES = ('fields', 'equipment', 'alerts')
+
+ROW_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION multi_control_notify() RETURNS trigger AS $$
+DECLARE
+    row_id INTEGER := NEW.id;
+    data JSONB;
+BEGIN
+    IF TG_TABLE_NAME = 'fields' THEN
+        IF TG_OP = 'UPDATE' AND (NEW.pressure, NEW.flow_rate, NEW.current_zone)
+                IS NOT DISTINCT FROM (OLD.pressure, OLD.flow_rate, OLD.current_zone) THEN
+            RETURN NULL;
+        END IF;
+        data := jsonb_build_object('pressure', NEW.pressure, 'flow_rate', NEW.flow_rate,
+                                   'current_zone', NEW.current_zone);
+    ELSIF TG_TABLE_NAME = 'equipment' THEN
+        IF TG_OP = 'UPDATE' AND NEW.status IS NOT DISTINCT FROM OLD.status THEN
+            RETURN NULL;
+        END IF;
+        data := jsonb_build_object('controller_id', NEW.controller_id, 'status', NEW.status);
+    ELSE
+        IF TG_OP = 'UPDATE' AND NEW.resolved IS NOT DISTINCT FROM OLD.resolved THEN
+            RETURN NULL;
+        END IF;
+        data := jsonb_build_object('field_id', NEW.field_id, 'alert_type', NEW.alert_type,
+                                   'message', left(NEW.message, 500), 'resolved', NEW.resolved);
+    END IF;
+
+    PERFORM pg_notify('{CHANGE_FEED_CHANNEL}', jsonb_build_object(
+        'table', TG_TABLE_NAME, 'op', lower(TG_OP), 'account_id', NEW.account_id,
+        'id', row_id, 'data', data
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+LOGS_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION multi_control_notify_logs() RETURNS trigger AS $$
+DECLARE
+    change RECORD;
+BEGIN
+    FOR change IN SELECT DISTINCT account_id, event_type FROM new_logs LOOP
+        PERFORM pg_notify('{CHANGE_FEED_CHANNEL}', jsonb_build_object(
+            'table', 'logs', 'op', 'insert', 'account_id', change.account_id,
+            'id', NULL, 'data', jsonb_build_object('event_type', change.event_type)
+        )::text);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+INSTALL_SQL = ROW_FUNCTION + LOGS_FUNCTION + "".join(f"""
+DROP TRIGGER IF EXISTS {table}_change_feed ON {table};
+CREATE TRIGGER {table}_change_feed AFTER INSERT OR UPDATE ON {table}
+    FOR EACH ROW EXECUTE FUNCTION multi_control_notify();
+""" for table in ROW_TABLES) + """
+DROP TRIGGER IF EXISTS logs_change_feed ON logs;
+CREATE TRIGGER logs_change_feed AFTER INSERT ON logs REFERENCING NEW TABLE AS new_logs
+    FOR EACH STATEMENT EXECUTE FUNCTION multi_control_notify_logs();
+"""
+
+UNINSTALL_SQL = "".join(
+    f"DROP TRIGGER IF EXISTS {table}_change_feed ON {table};\n" for table in ROW_TABLES + ('logs',)
+) + """
+DROP FUNCTION IF EXISTS multi_control_notify_logs();
+DROP FUNCTION IF EXISTS multi_control_notify();
+"""
@@ -0,0 +1,160 @@
+"""Binary deltas between firmware images.
+
+The format follows bsdiff: the new image is described by a sequence of
+(diff length, extra length, seek) triples. Diff bytes are added (mod 256) to
+the old image at the current position, which turns regions that moved or
+had their embedded addresses shifted into runs of mostly zero bytes; extra
+bytes are copied verbatim; seek moves the old position. The control, diff
+and extra blocks are compressed separately with LZMA.
+
+Matching uses aligned block seeds instead of bsdiff's suffix array, which
+keeps memory proportional to len(old) / BLOCK_SIZE and is fast enough in
+pure Python for images of a few megabytes.
+"""
+import hashlib
+import lzma
+import struct
+from typing import List, Tuple
+
+DELTA_MAGIC = b'VDELTA01'
+BLOCK_SIZE = 16
+COMPARE_STEP = 256
+_HEADER = struct.Struct('<8sQQ32s32sQQQ')
+_TRIPLE = struct.Struct('<qqq')
+
+
+class DeltaError(ValueError):
+    """Raised when a delta is malformed or does not apply to the given image"""
+
+
+def _find_matches(old: bytes, new: bytes) -> List[Tuple[int, int, int]]:
+    """Greedy exact matches as (new_start, old_start, length), increasing in new"""
+    index = {}
+    for i in range(0, len(old) - BLOCK_SIZE + 1, BLOCK_SIZE):
+        index.setdefault(old[i:i + BLOCK_SIZE], i)
+
+    matches = []
+    j = 0
+    last = len(new) - BLOCK_SIZE
+    while j <= last:
+        i = index.get(new[j:j + BLOCK_SIZE])
+        if i is None:
+            j += 1
+            continue
+        length = BLOCK_SIZE
+        while (j + length + COMPARE_STEP <= len(new) and i + length + COMPARE_STEP <= len(old)
+               and new[j + length:j + length + COMPARE_STEP] == old[i + length:i + length + COMPARE_STEP]):
+            length += COMPARE_STEP
+        while j + length < len(new) and i + length < len(old) and new[j + length] == old[i + length]:
+            length += 1
+        matches.append((j, i, length))
+        j += length
+    return matches
+
+
+def _extend_forward(old: bytes, new: bytes, old_pos: int, new_pos: int, limit: int) -> int:
+    """Longest approximate extension where matching bytes outnumber mismatches (bsdiff scoring)"""
+    limit = min(limit, len(old) - old_pos)
+    score = best = length = 0
+    for i in range(limit):
+        if old[old_pos + i] == new[new_pos + i]:
+            score += 1
+        if score * 2 - (i + 1) > best * 2 - length:
+            best, length = score, i + 1
+    return length
+
+
+def _extend_backward(old: bytes, new: bytes, old_pos: int, new_pos: int, limit: int) -> int:
+    limit = min(limit, old_pos)
+    score = best = length = 0
+    for i in range(1, limit + 1):
+        if old[old_pos - i] == new[new_pos - i]:
+            score += 1
+        if score * 2 - i > best * 2 - length:
+            best, length = score, i
+    return length
+
+
+def _subtract(new: bytes, old: bytes) -> bytes:
+    return bytes((a - b) & 0xFF for a, b in zip(new, old))
+
+
+def make_delta(old: bytes, new: bytes) -> bytes:
+    control, diff, extra = bytearray(), bytearray(), bytearray()
+
+    # The current diff run starts at (run_new, run_old): `head` approximate
+    # bytes from a backward extension followed by `exact` matching bytes
+    run_new = run_old = head = exact = 0
+    for new_start, old_start, length in _find_matches(old, new) + [(len(new), None, 0)]:
+        gap_start = run_new + head + exact
+        gap = new_start - gap_start
+        forward_old = run_old + head + exact
+        forward = _extend_forward(old, new, forward_old, gap_start, gap)
+        backward = _extend_backward(old, new, old_start, new_start, gap) if old_start is not None else 0
+
+        overlap = forward + backward - gap
+        if overlap > 0:
+            # Give each overlapping byte to whichever run it matches better
+            start = new_start - backward
+            score = best = split = 0
+            for i in range(overlap):
+                if new[start + i] == old[forward_old + forward - overlap + i]:
+                    score += 1
+                if new[start + i] == old[old_start - backward + i]:
+                    score -= 1
+                if score > best:
+                    best, split = score, i + 1
+            forward += split - overlap
+            backward -= split
+
+        diff += _subtract(new[run_new:run_new + head], old[run_old:run_old + head])
+        diff += bytes(exact)
+        diff += _subtract(new[gap_start:gap_start + forward], old[forward_old:forward_old + forward])
+        extra_length = gap - forward - backward
+        extra += new[gap_start + forward:gap_start + forward + extra_length]
+
+        diff_length = head + exact + forward
+        next_old = old_start - backward if old_start is not None else run_old + diff_length
+        control += _TRIPLE.pack(diff_length, extra_length, next_old - (run_old + diff_length))
+        run_new, run_old, head, exact = new_start - backward, next_old, backward, length
+
+    blocks = [lzma.compress(bytes(block)) for block in (control, diff, extra)]
+    header = _HEADER.pack(
+        DELTA_MAGIC, len(old), len(new), hashlib.sha256(old).digest(), hashlib.sha256(new).digest(),
+        *(len(block) for block in blocks)
+    )
+    return header + b''.join(blocks)
+
+
+def apply_delta(old: bytes, delta: bytes) -> bytes:
+    """Rebuild the new image; both the source and the result are checked against the header digests"""
+    if len(delta) < _HEADER.size:
+        raise DeltaError("Delta is truncated")
+    magic, old_size, new_size, old_hash, new_hash, *lengths = _HEADER.unpack_from(delta)
+    if magic != DELTA_MAGIC:
+        raise DeltaError("Not a firmware delta")
+    if len(old) != old_size or hashlib.sha256(old).digest() != old_hash:
+        raise DeltaError("Delta does not apply to this image")
+
+    blocks, offset = [], _HEADER.size
+    try:
+        for length in lengths:
+            blocks.append(lzma.decompress(delta[offset:offset + length]))
+            offset += length
+    except lzma.LZMAError as e:
+        raise DeltaError(f"Corrupt delta: {e}")
+    control, diff, extra = blocks
+
+    out = bytearray()
+    old_pos = diff_pos = extra_pos = 0
+    for diff_length, extra_length, seek in _TRIPLE.iter_unpack(control):
+        source = old[old_pos:old_pos + diff_length]
+        out += bytes((a + b) & 0xFF for a, b in zip(diff[diff_pos:diff_pos + diff_length], source))
+        out += extra[extra_pos:extra_pos + extra_length]
+        diff_pos += diff_length
+        extra_pos += extra_length
+        old_pos += diff_length + seek
+
+    if len(out) != new_size or hashlib.sha256(out).digest() != new_hash:
+        raise DeltaError("Delta produced the wrong image")
+    return bytes(out)
@@ -0,0 +1,348 @@
+"""Geometry extraction and spatial indexing for field and zone shapes.
+
+KML and SHP uploads are parsed into normalized polygons: a list of
+polygons, each a list of rings (outer ring first, then holes), each ring a
+list of (lon, lat) pairs in WGS84. Only the standard library is used; SHP
+coordinates are assumed to already be longitude/latitude.
+"""
+import math
+import struct
+import xml.etree.ElementTree as ET
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+Point = Tuple[float, float]
+Ring = List[Point]
+Polygon = List[Ring]
+BBox = Tuple[float, float, float, float]  # min_lon, min_lat, max_lon, max_lat
+
+EARTH_RADIUS_M = 6371008.8
+METRES_PER_DEGREE = math.radians(1) * EARTH_RADIUS_M
+SHP_POLYGON_TYPES = {5, 15, 25}  # Polygon, PolygonZ, PolygonM
+
+# Precomputed map levels: Douglas-Peucker tolerance in metres and the number
+# of coordinate decimals worth shipping at that tolerance (4 decimals ~ 11 m)
+SIMPLIFY_LEVELS = {
+    'low': (100.0, 4),
+    'medium': (10.0, 5),
+    'high': (1.0, 6),
+}
+FULL_LEVEL = 'full'
+FULL_PRECISION = 7
+
+
+class GeometryError(ValueError):
+    """Raised when an uploaded file holds no usable polygon geometry"""
+
+
+def _close(ring: Ring) -> Ring:
+    if ring and ring[0] != ring[-1]:
+        ring = ring + [ring[0]]
+    return ring
+
+
+def parse_kml(data: bytes) -> List[Polygon]:
+    try:
+        root = ET.fromstring(data)
+    except ET.ParseError as e:
+        raise GeometryError(f"Invalid KML: {e}")
+
+    def ring_from(element) -> Ring:
+        coordinates = element.find('.//{*}coordinates')
+        if coordinates is None or not coordinates.text:
+            return []
+        ring = []
+        for token in coordinates.text.split():
+            parts = token.split(',')
+            if len(parts) < 2:
+                continue
+            try:
+                point = (float(parts[0]), float(parts[1]))
+            except ValueError:
+                raise GeometryError(f"Invalid KML coordinate: {token[:50]}")
+            if not all(math.isfinite(value) for value in point):
+                raise GeometryError(f"Invalid KML coordinate: {token[:50]}")
+            ring.append(point)
+        return _close(ring)
+
+    polygons = []
+    for polygon in root.iterfind('.//{*}Polygon'):
+        outer = polygon.find('{*}outerBoundaryIs')
+        if outer is None:
+            continue
+        rings = [ring_from(outer)] + [ring_from(inner) for inner in polygon.findall('{*}innerBoundaryIs')]
+        rings = [ring for ring in rings if len(ring) >= 4]
+        if rings:
+            polygons.append(rings)
+    if not polygons:
+        raise GeometryError("KML contains no polygons")
+    return polygons
+
+
+def signed_ring_area(ring: Sequence[Point]) -> float:
+    """Shoelace area in coordinate units; negative for clockwise rings"""
+    return sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip(ring, ring[1:])) / 2
+
+
+def parse_shp(data: bytes) -> List[Polygon]:
+    """Read polygon records from an ESRI .shp main file.
+
+    Clockwise rings are outer boundaries; counter-clockwise rings are holes
+    of the preceding outer ring, per the shapefile specification.
+    """
+    if len(data) < 100 or struct.unpack('>i', data[0:4])[0] != 9994:
+        raise GeometryError("Invalid SHP file header")
+
+    polygons: List[Polygon] = []
+    offset = 100
+    while offset + 8 <= len(data):
+        _, content_words = struct.unpack('>2i', data[offset:offset + 8])
+        if content_words < 0:
+            raise GeometryError("Invalid SHP record length")
+        content = data[offset + 8:offset + 8 + content_words * 2]
+        offset += 8 + content_words * 2
+        if len(content) < 44:
+            continue
+        shape_type = struct.unpack('<i', content[0:4])[0]
+        if shape_type not in SHP_POLYGON_TYPES:
+            continue
+
+        num_parts, num_points = struct.unpack('<2i', content[36:44])
+        points_start = 44 + 4 * num_parts
+        if num_parts < 0 or num_points < 0 or points_start + 16 * num_points > len(content):
+            raise GeometryError("Truncated or corrupt SHP polygon record")
+        parts = list(struct.unpack(f'<{num_parts}i', content[44:points_start]))
+        coords = struct.unpack(f'<{2 * num_points}d', content[points_start:points_start + 16 * num_points])
+        points = list(zip(coords[0::2], coords[1::2]))
+
+        for start, end in zip(parts, parts[1:] + [num_points]):
+            ring = _close(points[start:end])
+            if len(ring) < 4:
+                continue
+            if signed_ring_area(ring) <= 0 or not polygons:
+                polygons.append([ring])
+            else:
+                polygons[-1].append(ring)
+    if not polygons:
+        raise GeometryError("SHP contains no polygons")
+    return polygons
+
+
+def parse_geometry(data: bytes, kind: str) -> List[Polygon]:
+    if kind == 'kml':
+        return parse_kml(data)
+    if kind == 'shp':
+        return parse_shp(data)
+    raise GeometryError(f"Unsupported geometry format: {kind}")
+
+
+def bbox_of(polygons: Iterable[Polygon]) -> BBox:
+    xs, ys = [], []
+    for polygon in polygons:
+        for x, y in polygon[0]:
+            xs.append(x)
+            ys.append(y)
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def area_m2(polygons: Iterable[Polygon]) -> float:
+    """Area in square metres using an equirectangular projection per polygon"""
+    total = 0.0
+    for polygon in polygons:
+        # Project around the bbox centre so the result is independent of vertex
+        # density and the shoelace sums stay small enough to keep their precision
+        min_x, min_y, max_x, max_y = bbox_of([polygon])
+        x0, y0 = (min_x + max_x) / 2, (min_y + max_y) / 2
+        scale_x = METRES_PER_DEGREE * math.cos(math.radians(y0))
+        scale_y = METRES_PER_DEGREE
+        areas = [
+            abs(signed_ring_area([((x - x0) * scale_x, (y - y0) * scale_y) for x, y in ring]))
+            for ring in polygon
+        ]
+        total += areas[0] - sum(areas[1:])
+    return total
+
+
+def to_geojson(polygons: List[Polygon], precision: Optional[int] = None) -> dict:
+    if precision is None:
+        coordinates = [[[list(point) for point in ring] for ring in polygon] for polygon in polygons]
+    else:
+        coordinates = [
+            [[[round(x, precision), round(y, precision)] for x, y in ring] for ring in polygon]
+            for polygon in polygons
+        ]
+    return {"type": "MultiPolygon", "coordinates": coordinates}
+
+
+def from_geojson(geojson: dict) -> List[Polygon]:
+    return [[[tuple(point) for point in ring] for ring in polygon] for polygon in geojson["coordinates"]]
+
+
+def simplify_ring(ring: Sequence[Point], tolerance_m: float) -> Ring:
+    """Douglas-Peucker simplification of a closed ring, measured in metres.
+
+    Points are projected equirectangularly around the ring's mean latitude so
+    the tolerance means the same on the ground in both axes.
+    """
+    if len(ring) <= 4:
+        return list(ring)
+    scale_x = METRES_PER_DEGREE * math.cos(math.radians(sum(y for _, y in ring) / len(ring)))
+    projected = [(x * scale_x, y * METRES_PER_DEGREE) for x, y in ring]
+
+    def offset(index: int, start: int, end: int) -> float:
+        (x1, y1), (x2, y2), (px, py) = projected[start], projected[end], projected[index]
+        dx, dy = x2 - x1, y2 - y1
+        if dx == 0 and dy == 0:
+            return math.hypot(px - x1, py - y1)
+        return abs(dy * px - dx * py + x2 * y1 - y2 * x1) / math.hypot(dx, dy)
+
+    # A closed ring starts and ends on the same point, so split it at the
+    # vertex farthest from the start to give the line simplification a real chord
+    last = len(ring) - 1
+    split = max(range(1, last), key=lambda i: math.hypot(
+        projected[i][0] - projected[0][0], projected[i][1] - projected[0][1]
+    ))
+    keep = {0, split, last}
+    stack = [(0, split), (split, last)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        index = max(range(start + 1, end), key=lambda i: offset(i, start, end))
+        if offset(index, start, end) > tolerance_m:
+            keep.add(index)
+            stack.append((start, index))
+            stack.append((index, end))
+    return [ring[i] for i in sorted(keep)]
+
+
+def simplify(polygons: Iterable[Polygon], tolerance_m: float) -> List[Polygon]:
+    """Simplify every ring; holes that collapse are dropped, outer rings keep their original shape"""
+    simplified = []
+    for polygon in polygons:
+        outer = simplify_ring(polygon[0], tolerance_m)
+        if len(outer) < 4:
+            outer = list(polygon[0])
+        holes = [hole for hole in (simplify_ring(ring, tolerance_m) for ring in polygon[1:]) if len(hole) >= 4]
+        simplified.append([outer] + holes)
+    return simplified
+
+
+def simplified_levels(polygons: List[Polygon]) -> dict:
+    """MultiPolygon coordinates for every SIMPLIFY_LEVELS entry, keyed by level name"""
+    return {
+        level: to_geojson(simplify(polygons, tolerance), precision)["coordinates"]
+        for level, (tolerance, precision) in SIMPLIFY_LEVELS.items()
+    }
+
+
+def level_for_zoom(zoom: float) -> str:
+    """Pick a simplification level for a web-map zoom (~150 m/px at z10, ~1 m/px at z17)"""
+    if zoom < 13:
+        return 'low'
+    if zoom < 16:
+        return 'medium'
+    if zoom < 18:
+        return 'high'
+    return FULL_LEVEL
+
+
+def encode_polyline(ring: Sequence[Sequence[float]], precision: int) -> str:
+    """Encode a ring with the Google polyline algorithm (lat/lon order, delta + varint text)"""
+    factor = 10 ** precision
+    encoded = []
+    previous_lat = previous_lon = 0
+    for lon, lat in ring:
+        lat_i, lon_i = int(round(lat * factor)), int(round(lon * factor))
+        for delta in (lat_i - previous_lat, lon_i - previous_lon):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                encoded.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            encoded.append(chr(value + 63))
+        previous_lat, previous_lon = lat_i, lon_i
+    return ''.join(encoded)
+
+
+def _point_in_ring(lon: float, lat: float, ring: Sequence[Point]) -> bool:
+    inside = False
+    for (x1, y1), (x2, y2) in zip(ring, ring[1:]):
+        if (y1 > lat) != (y2 > lat) and lon < (x2 - x1) * (lat - y1) / (y2 - y1) + x1:
+            inside = not inside
+    return inside
+
+
+def contains(polygons: Iterable[Polygon], lon: float, lat: float) -> bool:
+    for polygon in polygons:
+        if _point_in_ring(lon, lat, polygon[0]) and not any(_point_in_ring(lon, lat, hole) for hole in polygon[1:]):
+            return True
+    return False
+
+
+def distance_to_bbox_m(bbox: BBox, lon: float, lat: float) -> float:
+    """Approximate ground distance from a point to the nearest edge of a bbox (0 inside)"""
+    dx = max(bbox[0] - lon, 0, lon - bbox[2])
+    dy = max(bbox[1] - lat, 0, lat - bbox[3])
+    return math.hypot(dx * METRES_PER_DEGREE * math.cos(math.radians(lat)), dy * METRES_PER_DEGREE)
+
+
+def _intersects(a: BBox, b: BBox) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def _union(boxes: Iterable[BBox]) -> BBox:
+    boxes = list(boxes)
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+class RTree:
+    """Static R-tree bulk-loaded with Sort-Tile-Recursive packing.
+
+    Built once from (bbox, item) pairs and rebuilt when the underlying
+    shapes change, which keeps lookups to a handful of bbox tests per level.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[BBox, Any]], capacity: int = 16):
+        self.capacity = capacity
+        self.size = 0
+        level = []
+        for bbox, item in entries:
+            level.append((bbox, item, True))
+            self.size += 1
+        self.root: Optional[Tuple[BBox, Any, bool]] = None
+        if not level:
+            return
+        while len(level) > 1:
+            level = [(_union(child[0] for child in group), group, False) for group in self._pack(level)]
+        self.root = level[0] if not level[0][2] else (level[0][0], [level[0]], False)
+
+    def _pack(self, nodes: List[Tuple[BBox, Any, bool]]) -> List[List[Tuple[BBox, Any, bool]]]:
+        def center(node, axis):
+            return (node[0][axis] + node[0][axis + 2]) / 2
+
+        slice_count = math.ceil(math.sqrt(math.ceil(len(nodes) / self.capacity)))
+        slice_size = slice_count * self.capacity
+        groups = []
+        nodes = sorted(nodes, key=lambda node: center(node, 0))
+        for i in range(0, len(nodes), slice_size):
+            vertical = sorted(nodes[i:i + slice_size], key=lambda node: center(node, 1))
+            groups.extend(vertical[j:j + self.capacity] for j in range(0, len(vertical), self.capacity))
+        return groups
+
+    def query(self, bbox: BBox) -> List[Any]:
+        """Return every item whose bbox intersects `bbox`"""
+        if self.root is None:
+            return []
+        found, stack = [], [self.root]
+        while stack:
+            node_bbox, payload, is_leaf = stack.pop()
+            if not _intersects(node_bbox, bbox):
+                continue
+            if is_leaf:
+                found.append(payload)
+            else:
+                stack.extend(payload)
+        return found
+
+    def query_point(self, lon: float, lat: float) -> List[Any]:
+        return self.query((lon, lat, lon, lat))
@@ -0,0 +1,251 @@
+"""Overlap detection and flow-capacity packing for irrigation plans.
+
+Every plan of a field is expanded into zone runs over a planning horizon
+(a week by default, which covers every daily and weekly pattern). While a
+zone runs it draws application_rate (mm/h) x area (m2) / 1000 = m3/h, and
+the zones running at the same time must stay within the field's flow_rate
+(m3/h). Zones without a rate or area are unmetered and draw nothing.
+
+A new or edited plan is checked against the other plans of its field through
+an interval tree of their runs. If it overdraws the pump or double-books a
+zone, the smallest start-time delay that fits is proposed instead.
+"""
+import copy
+from collections import namedtuple
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .schedule import CompiledSchedule
+
+DEFAULT_HORIZON = timedelta(days=7)
+MAX_PLAN_DELAY = timedelta(hours=24)
+MAX_REPORTED = 20  # conflicts listed per category; the counts cover all of them
+
+ZoneDemand = namedtuple('ZoneDemand', 'equipment_id flow')
+ZoneRun = namedtuple('ZoneRun', 'start end zone_id plan_id equipment_id flow')
+
+
+def zone_flow(application_rate: Optional[float], area: Optional[float]) -> Optional[float]:
+    """Flow drawn by a running zone in m3/h, or None when it is not metered"""
+    if not application_rate or not area:
+        return None
+    return application_rate * area / 1000
+
+
+class IntervalTree:
+    """Static interval tree over zone runs.
+
+    Runs are sorted by start and laid out as an implicit balanced binary tree
+    (the middle of every slice is its root), each node also holding the latest
+    end in its subtree. Finding the k runs that overlap a window costs
+    O(log n + k).
+    """
+
+    def __init__(self, runs: Iterable[ZoneRun]):
+        self.runs = sorted(runs, key=lambda run: (run.start, run.end))
+        self.max_end = [run.end for run in self.runs]
+        self._augment(0, len(self.runs))
+
+    def _augment(self, lo: int, hi: int) -> Optional[datetime]:
+        if lo >= hi:
+            return None
+        mid = (lo + hi) // 2
+        for child in (self._augment(lo, mid), self._augment(mid + 1, hi)):
+            if child is not None and child > self.max_end[mid]:
+                self.max_end[mid] = child
+        return self.max_end[mid]
+
+    def overlapping(self, start: datetime, end: datetime) -> List[ZoneRun]:
+        """Runs that are active at some point of [start, end)"""
+        found, stack = [], [(0, len(self.runs))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if self.max_end[mid] <= start:
+                continue  # everything below ends before the window
+            stack.append((lo, mid))
+            run = self.runs[mid]
+            if run.start < end:
+                if run.end > start:
+                    found.append(run)
+                stack.append((mid + 1, hi))
+        return found
+
+    def __len__(self) -> int:
+        return len(self.runs)
+
+
+def expand_runs(compiled: CompiledSchedule, plan_id: Optional[int], zones: Dict[int, ZoneDemand],
+                start: datetime, end: datetime) -> List[ZoneRun]:
+    """Zone runs of a plan whose run starts in [start, end)"""
+    runs = []
+    steps = list(zip(compiled.steps[0::2], compiled.steps[1::2]))
+    run_at = compiled.next_run(start - timedelta(microseconds=1))
+    while run_at is not None and run_at < end:
+        for (on, _, zone_id, _), (off, _, _, _) in steps:
+            zone = zones.get(zone_id)
+            runs.append(ZoneRun(
+                run_at + timedelta(seconds=on), run_at + timedelta(seconds=off), zone_id, plan_id,
+                zone.equipment_id if zone else None, (zone.flow or 0.0) if zone else 0.0
+            ))
+        run_at = compiled.next_run(run_at)
+    return runs
+
+
+def _peak_flow(run: ZoneRun, others: List[ZoneRun]) -> float:
+    """Highest total flow while `run` is active, itself included"""
+    events = []
+    for other in others:
+        events.append((max(other.start, run.start), other.flow))
+        events.append((min(other.end, run.end), -other.flow))
+    # Ends sort before starts at the same instant, so back-to-back runs do not add up
+    events.sort()
+    peak = flow = 0.0
+    for _, change in events:
+        flow += change
+        peak = max(peak, flow)
+    return run.flow + peak
+
+
+def _own_overlaps(runs: List[ZoneRun]) -> List[List[ZoneRun]]:
+    """For each run of a plan, the plan's other runs that overlap it"""
+    tree = IntervalTree(runs)
+    return [[other for other in tree.overlapping(run.start, run.end) if other is not run] for run in runs]
+
+
+def _shifted(run: ZoneRun, delay: timedelta) -> ZoneRun:
+    return run._replace(start=run.start + delay, end=run.end + delay) if delay else run
+
+
+def _window(run: ZoneRun) -> dict:
+    return {'zone_id': run.zone_id, 'start': run.start.isoformat(), 'end': run.end.isoformat()}
+
+
+class PlanCheck:
+    """Checks one plan against the other plans of its field"""
+
+    def __init__(self, others: Iterable[Tuple[int, CompiledSchedule]], zones: Dict[int, ZoneDemand],
+                 capacity: Optional[float], start: datetime, horizon: timedelta = DEFAULT_HORIZON):
+        self.zones = zones
+        self.capacity = capacity
+        self.start = start
+        self.end = start + horizon
+        self.horizon = horizon
+        # Other plans are expanded a little further so delayed runs near the end still meet them
+        existing_end = self.end + MAX_PLAN_DELAY + timedelta(days=1)
+        self.tree = IntervalTree(
+            run for plan_id, compiled in others for run in expand_runs(compiled, plan_id, zones, start, existing_end)
+        )
+
+    def _over_capacity(self, peak: float) -> bool:
+        return self.capacity is not None and peak > self.capacity + 1e-9
+
+    def _blocking(self, run: ZoneRun, overlapping: List[ZoneRun], own: List[ZoneRun]) -> bool:
+        """Whether the run double-books its zone or pushes the field past capacity"""
+        others = overlapping + own
+        return any(other.zone_id == run.zone_id for other in others) or self._over_capacity(_peak_flow(run, others))
+
+    def check(self, compiled: CompiledSchedule, plan_id: Optional[int] = None) -> dict:
+        runs = expand_runs(compiled, plan_id, self.zones, self.start, self.end)
+        report = {
+            'capacity': self.capacity, 'horizon_days': self.horizon.days, 'runs': len(runs), 'peak_flow': 0.0,
+            'overlaps': [], 'overlap_count': 0, 'zone_conflicts': [], 'zone_conflict_count': 0,
+            'violations': [], 'violation_count': 0,
+            'unmetered_zones': sorted({zone_id for _, _, zone_id, _ in compiled.steps
+                                       if zone_id in self.zones and self.zones[zone_id].flow is None}),
+            'unknown_zones': sorted({zone_id for _, _, zone_id, _ in compiled.steps if zone_id not in self.zones}),
+        }
+        for run, own in zip(runs, _own_overlaps(runs)):
+            overlapping = self.tree.overlapping(run.start, run.end)
+            peak = _peak_flow(run, overlapping + own)
+            report['peak_flow'] = max(report['peak_flow'], peak)
+
+            for other in overlapping + own:
+                if other.zone_id == run.zone_id:
+                    report['zone_conflict_count'] += 1
+                    if len(report['zone_conflicts']) < MAX_REPORTED:
+                        report['zone_conflicts'].append({**_window(run), 'other_plan_id': other.plan_id})
+                elif run.equipment_id is not None and other.equipment_id == run.equipment_id:
+                    report['overlap_count'] += 1
+                    if len(report['overlaps']) < MAX_REPORTED:
+                        report['overlaps'].append({
+                            **_window(run), 'equipment_id': run.equipment_id,
+                            'other_plan_id': other.plan_id, 'other_zone_id': other.zone_id
+                        })
+            if self._over_capacity(peak):
+                report['violation_count'] += 1
+                if len(report['violations']) < MAX_REPORTED:
+                    report['violations'].append({**_window(run), 'flow': round(peak, 3)})
+
+        report['peak_flow'] = round(report['peak_flow'], 3)
+        # Runs of zones that are not on the field cannot be checked, so they never pass
+        report['ok'] = not (report['violation_count'] or report['zone_conflict_count'] or report['unknown_zones'])
+        return report
+
+    def earliest_delay(self, compiled: CompiledSchedule, max_delay: timedelta) -> Optional[timedelta]:
+        """Smallest whole-minute delay at which the plan fits, or None if none within max_delay.
+
+        The plan is expanded once; a delay shifts all of its runs, so overlaps
+        among them never change and only the other plans are queried again.
+        """
+        runs = expand_runs(compiled, None, self.zones, self.start, self.end)
+        own = _own_overlaps(runs)
+        if any(self._blocking(run, [], mine) for run, mine in zip(runs, own)):
+            return None  # the plan collides with itself or a zone alone overdraws the pump
+
+        delay = timedelta(0)
+        while delay <= max_delay:
+            shift = None
+            for run, mine in zip(runs, own):
+                moved = _shifted(run, delay)
+                overlapping = self.tree.overlapping(moved.start, moved.end)
+                if overlapping and self._blocking(moved, overlapping, [_shifted(other, delay) for other in mine]):
+                    # Nothing changes until the first of the runs in the way finishes
+                    shift = min(other.end for other in overlapping) - moved.start
+                    break
+            if shift is None:
+                return delay
+            delay += shift
+            if delay % timedelta(minutes=1):
+                delay += timedelta(minutes=1) - delay % timedelta(minutes=1)
+        return None
+
+
+def max_delay(compiled: CompiledSchedule) -> timedelta:
+    """Largest shift that keeps the schedule expressible: daily and weekly times stay on their day"""
+    if compiled.frequency in ('daily', 'weekly'):
+        last = compiled.times[-1]
+        return min(MAX_PLAN_DELAY, timedelta(hours=24 - last.hour, minutes=-last.minute - 1))
+    if compiled.frequency == 'interval':
+        return min(MAX_PLAN_DELAY, compiled.period - timedelta(minutes=1))
+    return MAX_PLAN_DELAY
+
+
+def delayed_schedule(schedule: dict, compiled: CompiledSchedule, delay: timedelta) -> dict:
+    """Copy of a plan schedule with its start times moved `delay` later"""
+    proposal = copy.deepcopy(schedule)
+    if compiled.frequency in ('daily', 'weekly'):
+        base = datetime(2000, 1, 1)
+        proposal.pop('start_time', None)
+        proposal['start_times'] = [(datetime.combine(base, start) + delay).strftime('%H:%M')
+                                   for start in compiled.times]
+    else:
+        start_at = datetime.fromisoformat(schedule['start_at']) if schedule.get('start_at') else datetime(2000, 1, 1)
+        proposal['start_at'] = (start_at + delay).isoformat()
+    return proposal
+
+
+def solve_plan(schedule: dict, compiled: CompiledSchedule, check: PlanCheck, plan_id: Optional[int] = None) -> dict:
+    """Report conflicts of a plan and, when it does not fit, propose a delayed schedule that does"""
+    report = check.check(compiled, plan_id)
+    report['proposal'] = None
+    if not report['ok'] and not report['unknown_zones']:
+        delay = check.earliest_delay(compiled, max_delay(compiled))
+        if delay is not None:
+            report['proposal'] = {
+                'delay_minutes': int(delay.total_seconds() // 60),
+                'schedule': delayed_schedule(schedule, compiled, delay)
+            }
+    return report
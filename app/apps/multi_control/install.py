@@ -1,6 +1,7 @@
 from app.extensions import db
 from .models import create_multi_control_model, create_enum_type
 from app.models.user_app import UserApp
+from app.services.tenancy import shared_tenancy
 from sqlalchemy import text, inspect
 from datetime import datetime
 
@@ -8,17 +9,19 @@ from datetime import datetime
 def install_multi_control(account_id):
     """Install the multi control app for a specific account"""
     try:
-        # Create enum type first
-        create_enum_type()
-        
-        # Create the model and table
-        MultiControlModel = create_multi_control_model(account_id)
-        
-        inspector = inspect(db.engine)
-        table_name = f"multi_controls_{account_id}"
-        
-        if not inspector.has_table(table_name):
-            MultiControlModel.__table__.create(db.engine)
+        # Shared tenancy keeps every account in the multi_controls table: no DDL per install
+        if not shared_tenancy():
+            # Create enum type first
+            create_enum_type()
+
+            # Create the model and table
+            MultiControlModel = create_multi_control_model(account_id)
+
+            inspector = inspect(db.engine)
+            table_name = f"multi_controls_{account_id}"
+
+            if not inspector.has_table(table_name):
+                MultiControlModel.__table__.create(db.engine)
             
         # Mark the app as installed in user_apps table
         user_app = UserApp.query.filter_by(
@@ -1,6 +1,9 @@
 from uuid import uuid4
+from sqlalchemy import DDL, event, text
 from sqlalchemy.dialects.postgresql import UUID, ENUM, JSONB
 from app.extensions import db
+from app.utils.model_registry import ModelRegistry
+from app.services.tenancy import shared_tenancy, bind_tenant, partition_ddl
 from datetime import datetime
 from enum import Enum
 
@@ -11,12 +14,15 @@ class ControlStatus(str, Enum):
 
 
 def create_enum_type():
-    """Create the controlstatus enum type if it doesn't exist"""
-    try:
-        db.session.execute('CREATE TYPE controlstatus AS ENUM (\'ACTIVE\', \'INACTIVE\')')
-        db.session.commit()
-    except Exception:
-        db.session.rollback()  # Type might already exist
+    """Create the controlstatus enum type if it doesn't exist.
+
+    Runs on its own connection so it never commits or rolls back the caller's session.
+    """
+    with db.engine.begin() as connection:
+        connection.execute(text(
+            "DO $$ BEGIN CREATE TYPE controlstatus AS ENUM ('ACTIVE', 'INACTIVE'); "
+            "EXCEPTION WHEN duplicate_object THEN NULL; END $$"
+        ))
 
 
 class MultiControl(db.Model):
@@ -34,9 +40,8 @@ class MultiControl(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
 
-def create_multi_control_model(account_id):
+def build_multi_control_model(account_id):
     """Dynamically create a MultiControl model for a specific account"""
-    create_enum_type()  # Ensure enum type exists
     table_name = f"multi_controls_{account_id}"
     
     return type(
@@ -49,6 +54,45 @@ def create_multi_control_model(account_id):
     )
 
 
+class SharedMultiControl(MultiControl):
+    """Every account's controls in one table, hash-partitioned on account_id (TENANCY_MODE=shared).
+
+    Each account maps to a single-table-inheritance subclass whose identity
+    is its account_id, so queries through it only see that account's rows.
+    """
+    __tablename__ = 'multi_controls'
+    __table_args__ = {'postgresql_partition_by': 'HASH (account_id)'}
+
+    account_id = db.Column(db.Integer, primary_key=True)
+
+    @db.declared_attr.directive
+    def __mapper_args__(cls):
+        return {'polymorphic_on': cls.__table__.c.account_id, 'primary_key': [cls.__table__.c.id]}
+
+
+event.listen(SharedMultiControl.__table__, 'after_create', DDL(partition_ddl('multi_controls')))
+
+
+def build_shared_multi_control_model(account_id):
+    return type(
+        f"SharedMultiControl_{account_id}",
+        (SharedMultiControl,),
+        {"__mapper_args__": {"polymorphic_identity": int(account_id)}}
+    )
+
+
+multi_control_models = ModelRegistry(build_multi_control_model, bootstrap=create_enum_type)
+shared_multi_control_models = ModelRegistry(build_shared_multi_control_model)
+
+
+def create_multi_control_model(account_id):
+    """Return the account's MultiControl model, building it (and the enum type) only on first use"""
+    if shared_tenancy():
+        bind_tenant(account_id)
+        return shared_multi_control_models.get(account_id)
+    return multi_control_models.get(account_id)
+
+
 # Irrigation Management System Models
 
 class Field(db.Model):
@@ -61,8 +105,10 @@ class Field(db.Model):
     pressure = db.Column(db.Float)
     flow_rate = db.Column(db.Float)
     current_zone = db.Column(db.String(100))
-    kml_file = db.Column(db.LargeBinary)
-    shp_file = db.Column(db.LargeBinary)
+    kml_blob = db.Column(db.String(64))  # sha256 of the file in the blob store
+    shp_blob = db.Column(db.String(64))
+    kml_size = db.Column(db.BigInteger)
+    shp_size = db.Column(db.BigInteger)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
     # Relationships
@@ -74,6 +120,9 @@ class Field(db.Model):
 
 class Equipment(db.Model):
     __tablename__ = 'equipment'
+    __table_args__ = (
+        db.Index('ix_equipment_account_status', 'account_id', 'status'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     account_id = db.Column(db.Integer, nullable=False, index=True)
     field_id = db.Column(db.Integer, db.ForeignKey('fields.id', ondelete="CASCADE"), nullable=False, index=True)
@@ -94,8 +143,10 @@ class Zone(db.Model):
     name = db.Column(db.String(100), nullable=False)
     application_rate = db.Column(db.Float)
     area = db.Column(db.Float)
-    kml_file = db.Column(db.LargeBinary)
-    shp_file = db.Column(db.LargeBinary)
+    kml_blob = db.Column(db.String(64))  # sha256 of the file in the blob store
+    shp_blob = db.Column(db.String(64))
+    kml_size = db.Column(db.BigInteger)
+    shp_size = db.Column(db.BigInteger)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
 
@@ -109,28 +160,68 @@ class IrrigationPlan(db.Model):
     name = db.Column(db.String(100), nullable=False)
     schedule = db.Column(JSONB)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # Bumped on every change; the irrigation scheduler polls it to pick up edits from any worker
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False, index=True)
 
 
 class Alert(db.Model):
     __tablename__ = 'alerts'
+    __table_args__ = (
+        # Active-alert lookups only ever touch unresolved rows
+        db.Index(
+            'ix_alerts_account_unresolved', 'account_id', 'created_at',
+            postgresql_where=db.text('resolved = false')
+        ),
+        # Finds the open alert that a repeated (account, field, type) coalesces into
+        db.Index(
+            'ix_alerts_dedup', 'account_id', 'field_id', 'alert_type', 'last_seen',
+            postgresql_where=db.text('resolved = false')
+        ),
+    )
     id = db.Column(db.Integer, primary_key=True)
     account_id = db.Column(db.Integer, nullable=False, index=True)
     field_id = db.Column(db.Integer, db.ForeignKey('fields.id', ondelete="CASCADE"), nullable=False, index=True)
     alert_type = db.Column(db.String(100), nullable=False, index=True)
     message = db.Column(db.Text)
     resolved = db.Column(db.Boolean, default=False)
+    occurrence_count = db.Column(db.Integer, default=1, server_default='1', nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_seen = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
 
 class Log(db.Model):
+    """Controller event log, range-partitioned by month on `timestamp`.
+
+    PostgreSQL requires the partition key in the primary key, so the table
+    key is (id, timestamp) while the mapper still identifies rows by id.
+    Monthly partitions are named logs_YYYY_MM; rows outside them land in
+    logs_default.
+    """
     __tablename__ = 'logs'
-    id = db.Column(db.Integer, primary_key=True)
+    __table_args__ = (
+        db.Index('ix_logs_account_event_timestamp', 'account_id', 'event_type', 'timestamp'),
+        db.Index('ix_logs_account_timestamp', 'account_id', 'timestamp', 'id'),
+        {'postgresql_partition_by': 'RANGE (timestamp)'},
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     account_id = db.Column(db.Integer, nullable=False, index=True)
     user_id = db.Column(db.Integer, nullable=True)
     field_id = db.Column(db.Integer, db.ForeignKey('fields.id', ondelete="CASCADE"), nullable=False, index=True)
     event_type = db.Column(db.String(100), index=True)
     event_data = db.Column(JSONB)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    timestamp = db.Column(db.DateTime, primary_key=True, default=datetime.utcnow, nullable=False)
+
+    __mapper_args__ = {'primary_key': [id]}
+
+
+# A partitioned table rejects rows with no matching partition; the default
+# partition keeps inserts working until monthly partitions are created.
+event.listen(
+    Log.__table__,
+    'after_create',
+    DDL("CREATE TABLE IF NOT EXISTS logs_default PARTITION OF logs DEFAULT")
+)
 
 
 class Firmware(db.Model):
@@ -141,5 +232,188 @@ class Firmware(db.Model):
     version = db.Column(db.String(50), nullable=False, index=True)
     release_date = db.Column(db.DateTime, nullable=False)
     changelog = db.Column(db.Text)
-    file_data = db.Column(db.LargeBinary)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False) 
\ No newline at end of file
+    # Legacy inline image, moved into chunks on first download. Only loaded
+    # on access so listings never pull firmware images
+    file_data = db.deferred(db.Column(db.LargeBinary))
+    file_size = db.Column(db.BigInteger)
+    sha256 = db.Column(db.String(64))  # digest of the whole image, used as its ETag
+    chunk_size = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    chunks = db.relationship('FirmwareChunk', backref='firmware', cascade='all, delete-orphan',
+                             order_by='FirmwareChunk.seq', passive_deletes=True)
+
+
+@event.listens_for(Firmware.file_data, 'set')
+def _track_firmware_size(target, value, oldvalue, initiator):
+    if value is not None:
+        target.file_size = len(value)
+
+
+class FirmwareChunk(db.Model):
+    """Fixed-size slice of a firmware image; `digest` is the chunk's sha256 and its blob store key"""
+    __tablename__ = 'firmware_chunks'
+    firmware_id = db.Column(db.Integer, db.ForeignKey('firmware.id', ondelete="CASCADE"), primary_key=True)
+    seq = db.Column(db.Integer, primary_key=True)
+    offset = db.Column(db.BigInteger, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    digest = db.Column(db.String(64), nullable=False, index=True)
+
+
+class FirmwareDelta(db.Model):
+    """Cached binary delta from one firmware image to a later one for the same equipment.
+
+    `digest` is NULL when the delta was not sufficiently smaller than the full
+    image, which records that the full download should be served instead.
+    """
+    __tablename__ = 'firmware_deltas'
+    __table_args__ = (
+        db.UniqueConstraint('source_id', 'target_id', name='uix_firmware_deltas_pair'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    source_id = db.Column(db.Integer, db.ForeignKey('firmware.id', ondelete="CASCADE"), nullable=False)
+    target_id = db.Column(db.Integer, db.ForeignKey('firmware.id', ondelete="CASCADE"), nullable=False, index=True)
+    digest = db.Column(db.String(64))
+    size = db.Column(db.BigInteger, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class FirmwareRollout(db.Model):
+    """A staged push of one firmware image to a set of equipment, advanced in waves by a background worker"""
+    __tablename__ = 'firmware_rollouts'
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, nullable=False, index=True)
+    firmware_id = db.Column(db.Integer, db.ForeignKey('firmware.id', ondelete="CASCADE"), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='running', index=True)  # running, paused, completed, cancelled
+    wave_size = db.Column(db.Integer, nullable=False)
+    max_concurrency = db.Column(db.Integer, nullable=False)  # downloads in flight for this rollout
+    error_threshold = db.Column(db.Float, nullable=False)  # failed / finished ratio that pauses the rollout
+    min_samples = db.Column(db.Integer, nullable=False)  # finished targets before the error rate is trusted
+    paused_reason = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    completed_at = db.Column(db.DateTime)
+
+    firmware = db.relationship('Firmware')
+    targets = db.relationship('FirmwareRolloutTarget', backref='rollout', cascade='all, delete-orphan',
+                              lazy='dynamic', passive_deletes=True)
+
+
+class FirmwareRolloutTarget(db.Model):
+    __tablename__ = 'firmware_rollout_targets'
+    __table_args__ = (
+        db.Index('ix_firmware_rollout_targets_rollout_status', 'rollout_id', 'status', 'wave'),
+        db.Index('ix_firmware_rollout_targets_equipment_status', 'equipment_id', 'status'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    rollout_id = db.Column(db.Integer, db.ForeignKey('firmware_rollouts.id', ondelete="CASCADE"), nullable=False)
+    equipment_id = db.Column(db.Integer, db.ForeignKey('equipment.id', ondelete="CASCADE"), nullable=False)
+    wave = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, downloading, succeeded, failed, skipped
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.String(255))
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+
+class SimCard(db.Model):
+    """Local copy of a Soracom subscriber, refreshed by SimSyncService.
+
+    Linked to equipment through `controller_id`, read from the subscriber's
+    tags; there is no foreign key because a SIM can be tagged before its
+    controller is registered.
+    """
+    __tablename__ = 'sims'
+    imsi = db.Column(db.String(15), primary_key=True)
+    iccid = db.Column(db.String(22), index=True)
+    msisdn = db.Column(db.String(20))
+    status = db.Column(db.String(20))
+    speed_class = db.Column(db.String(30))
+    group_id = db.Column(db.String(64))
+    online = db.Column(db.Boolean)
+    tags = db.Column(JSONB)
+    controller_id = db.Column(db.String(50), index=True)
+    content_hash = db.Column(db.String(64), nullable=False)  # sha256 of the synced fields, compared on each sync
+    modified_at = db.Column(db.DateTime)  # Soracom lastModifiedAt
+    synced_at = db.Column(db.DateTime, nullable=False)
+
+    equipment = db.relationship(
+        'Equipment', primaryjoin='foreign(SimCard.controller_id) == Equipment.controller_id',
+        viewonly=True, uselist=False
+    )
+
+
+class SimUsageHourly(db.Model):
+    """Cellular data usage per SIM and hour, summed over speed classes; (imsi, bucket) is the only key"""
+    __tablename__ = 'sim_usage_hourly'
+    imsi = db.Column(db.String(15), primary_key=True)
+    bucket = db.Column(db.DateTime, primary_key=True)
+    upload_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    download_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    upload_packets = db.Column(db.BigInteger, nullable=False, default=0)
+    download_packets = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class SimSyncRun(db.Model):
+    __tablename__ = 'sim_sync_runs'
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='running')  # running, succeeded, partial, failed
+    started_at = db.Column(db.DateTime, nullable=False)
+    finished_at = db.Column(db.DateTime)
+    duration_ms = db.Column(db.Integer)
+    fetched = db.Column(db.Integer, nullable=False, default=0)
+    changed = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+
+
+class Geometry(db.Model):
+    """Polygons parsed from a field or zone KML/SHP upload, stored as GeoJSON MultiPolygon"""
+    __tablename__ = 'geometries'
+    __table_args__ = (
+        db.UniqueConstraint('owner_type', 'owner_id', name='uix_geometries_owner'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, nullable=False, index=True)
+    owner_type = db.Column(db.String(10), nullable=False)  # 'field' or 'zone'
+    owner_id = db.Column(db.Integer, nullable=False)
+    source = db.Column(db.String(3), nullable=False)  # 'kml' or 'shp'
+    digest = db.Column(db.String(64))  # sha256 of the uploaded blob the shape came from
+    geojson = db.deferred(db.Column(JSONB, nullable=False))
+    simplified = db.deferred(db.Column(JSONB))  # {level: MultiPolygon coordinates}, see SIMPLIFY_LEVELS
+    min_lon = db.Column(db.Float, nullable=False)
+    min_lat = db.Column(db.Float, nullable=False)
+    max_lon = db.Column(db.Float, nullable=False)
+    max_lat = db.Column(db.Float, nullable=False)
+    area = db.Column(db.Float, nullable=False)  # square metres
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
+# Water usage rollups, maintained incrementally from irrigation_event logs.
+# zone_id is 0 for events that do not carry a zone so the bucket key stays
+# NOT NULL and can back an ON CONFLICT upsert.
+
+class WaterUsageRollup(db.Model):
+    __abstract__ = True
+
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, nullable=False, index=True)
+    field_id = db.Column(db.Integer, nullable=False, index=True)
+    zone_id = db.Column(db.Integer, nullable=False, default=0)
+    bucket = db.Column(db.DateTime, nullable=False)
+    water_volume = db.Column(db.Float, nullable=False, default=0)
+    duration = db.Column(db.Float, nullable=False, default=0)
+    event_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class WaterUsageHourly(WaterUsageRollup):
+    __tablename__ = 'water_usage_hourly'
+    __table_args__ = (
+        db.UniqueConstraint('account_id', 'field_id', 'zone_id', 'bucket', name='uix_water_usage_hourly_bucket'),
+    )
+
+
+class WaterUsageDaily(WaterUsageRollup):
+    __tablename__ = 'water_usage_daily'
+    __table_args__ = (
+        db.UniqueConstraint('account_id', 'field_id', 'zone_id', 'bucket', name='uix_water_usage_daily_bucket'),
+    )
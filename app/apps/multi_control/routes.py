@@ -1,17 +1,44 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, Response, redirect, send_file, stream_with_context, url_for
+from werkzeug.wsgi import FileWrapper
+from sqlalchemy import tuple_
+from sqlalchemy.orm import load_only
 from app.extensions import db
-from .models import create_multi_control_model, ControlStatus, Field, Equipment, Zone, IrrigationPlan, Alert, Log, Firmware
+from .models import (
+    create_multi_control_model, ControlStatus, Field, Equipment, Zone, IrrigationPlan, Alert, Log, Firmware,
+    FirmwareRollout, SimCard
+)
 from .install import install_multi_control, uninstall_multi_control
 from app.utils.auth_helpers import any_admin_required
+from app.services.blob_store import get_blob_store
 from app.models.user_app import UserApp
-from .services import MultiControlService
-from werkzeug.utils import secure_filename
+from .services import (
+    MultiControlService, TelemetryService, ReportService, StatusService, PresenceService, ChangeBroker, ChangeFeed,
+    GeometryService, FirmwareStorageService, FirmwareDeltaService, RolloutService, SimSyncService,
+    CellularUsageService, IrrigationScheduler, IrrigationPlanService, AlertIngestService, WATER_USAGE_GRANULARITIES
+)
+from .geometry import GeometryError, SIMPLIFY_LEVELS, FULL_LEVEL, level_for_zoom
+from .schedule import ScheduleError, compile_schedule
 import logging
+import json
+import math
+import base64
 from datetime import datetime, timedelta
 
 multi_control_bp = Blueprint("multi_controls", __name__, url_prefix="/multi_controls")
 
 
+@multi_control_bp.record_once
+def init_live_services(state):
+    PresenceService.configure(state.app.config.get("PRESENCE_REDIS_URL"))
+    ChangeBroker.default.history_size = state.app.config.get("CHANGE_HISTORY_SIZE", 256)
+    AlertIngestService.default.configure(
+        state.app.config.get("ALERT_DEDUP_WINDOW", 3600), state.app.config.get("ALERT_RATE_LIMIT", 5),
+        state.app.config.get("ALERT_RATE_BURST", 100), state.app.config.get("ALERT_BATCH_SIZE", 500)
+    )
+    if state.app.config.get("CHANGE_FEED_ENABLED"):
+        ChangeFeed.default.start(state.app)
+
+
 def get_multi_control_model(account_id):
     """Helper function to get the correct multi control model for an account"""
     return create_multi_control_model(account_id)
@@ -122,11 +149,26 @@ def allowed_file(filename, allowed_extensions):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
 
+def extract_upload_geometry(owner, owner_type, kind, digest):
+    """Parse an uploaded shape file; unreadable geometry is reported, not fatal.
+
+    The file replaces the owner's previous one either way, so a shape that
+    cannot be parsed also drops the geometry taken from the old file.
+    """
+    try:
+        return {"geometry": GeometryService.extract(owner, owner_type, kind, digest)}
+    except GeometryError as e:
+        GeometryService.clear(owner, owner_type)
+        return {"geometry": None, "geometry_error": str(e)}
+
+
 @multi_control_bp.route('/fields/', methods=['GET'])
 def get_fields():
     """GET /fields/ - List all fields with vital info (name, pressure, flow rate, operating zone)"""
     try:
-        fields = Field.query.all()
+        fields = Field.query.options(load_only(
+            Field.id, Field.name, Field.pressure, Field.flow_rate, Field.current_zone
+        )).all()
         result = []
         for field in fields:
             result.append({
@@ -159,8 +201,10 @@ def get_field_details(field_id):
             "flow_rate": field.flow_rate,
             "current_zone": field.current_zone,
             "created_at": field.created_at.isoformat(),
-            "kml_file_uploaded": bool(field.kml_file),
-            "shp_file_uploaded": bool(field.shp_file)
+            "kml_file_uploaded": bool(field.kml_blob),
+            "shp_file_uploaded": bool(field.shp_blob),
+            "kml_file_size": field.kml_size,
+            "shp_file_size": field.shp_size
         }
         return jsonify(field_data), 200
     except Exception as e:
@@ -188,11 +232,17 @@ def upload_kml():
         if not field:
             return jsonify({"error": "Field not found"}), 404
         
-        filename = secure_filename(file.filename)  # filename secured, though not stored
-        file_data = file.read()
-        field.kml_file = file_data
+        digest, size = get_blob_store().put_stream(file.stream)
+        field.kml_blob = digest
+        field.kml_size = size
+        geometry = extract_upload_geometry(field, 'field', 'kml', digest)
         db.session.commit()
-        return jsonify({"message": "KML file uploaded successfully"}), 200
+        return jsonify({
+            "message": "KML file uploaded successfully",
+            "sha256": digest,
+            "size": size,
+            **geometry
+        }), 200
 
     except Exception as e:
         logging.error("Error uploading KML file: %s", e)
@@ -220,11 +270,17 @@ def upload_shp():
         if not field:
             return jsonify({"error": "Field not found"}), 404
         
-        filename = secure_filename(file.filename)
-        file_data = file.read()
-        field.shp_file = file_data
+        digest, size = get_blob_store().put_stream(file.stream)
+        field.shp_blob = digest
+        field.shp_size = size
+        geometry = extract_upload_geometry(field, 'field', 'shp', digest)
         db.session.commit()
-        return jsonify({"message": "SHP file uploaded successfully"}), 200
+        return jsonify({
+            "message": "SHP file uploaded successfully",
+            "sha256": digest,
+            "size": size,
+            **geometry
+        }), 200
 
     except Exception as e:
         logging.error("Error uploading SHP file: %s", e)
@@ -232,6 +288,73 @@ def upload_shp():
         return jsonify({"error": "Error uploading SHP file"}), 500
 
 
+@multi_control_bp.route('/fields/nearby', methods=['GET'])
+def get_nearby_fields():
+    """GET /fields/nearby - Fields within `radius` metres of a lat/lon point"""
+    try:
+        account_id = request.args.get('account_id')
+        if not account_id:
+            return jsonify({"error": "Account ID is required"}), 400
+        lat = request.args.get('lat', type=float)
+        lon = request.args.get('lon', type=float)
+        if lat is None or lon is None:
+            return jsonify({"error": "lat and lon are required"}), 400
+        radius = request.args.get('radius', 1000, type=float)
+
+        fields = GeometryService.nearby_fields(
+            account_id, lon, lat, radius,
+            ttl=current_app.config.get('GEOMETRY_INDEX_TTL', 300)
+        )
+        return jsonify(fields), 200
+    except Exception as e:
+        logging.error("Error finding nearby fields: %s", e)
+        return jsonify({"error": "Error finding nearby fields"}), 500
+
+
+@multi_control_bp.route('/geometries/', methods=['GET'])
+def get_geometries():
+    """GET /geometries/ - Simplified field/zone outlines for map display
+
+    `zoom` (or an explicit `level`: low, medium, high, full) selects the
+    precomputed tolerance; `format=polyline` encodes rings as polylines.
+    Responses carry an ETag so unchanged outlines revalidate with a 304.
+    """
+    try:
+        account_id = request.args.get('account_id')
+        if not account_id:
+            return jsonify({"error": "Account ID is required"}), 400
+        owner_type = request.args.get('owner_type')
+        if owner_type not in (None, 'field', 'zone'):
+            return jsonify({"error": "owner_type must be 'field' or 'zone'"}), 400
+        encoding = request.args.get('format', 'geojson')
+        if encoding not in ('geojson', 'polyline'):
+            return jsonify({"error": "format must be 'geojson' or 'polyline'"}), 400
+
+        level = request.args.get('level')
+        zoom = request.args.get('zoom', type=float)
+        if level is None:
+            level = level_for_zoom(zoom) if zoom is not None else 'medium'
+        if level != FULL_LEVEL and level not in SIMPLIFY_LEVELS:
+            return jsonify({"error": f"Unknown level: {level}"}), 400
+
+        etag = GeometryService.outlines_etag(account_id, level, encoding, owner_type)
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            collection = GeometryService.outlines(account_id, level, encoding, owner_type)
+            response = Response(
+                json.dumps(collection, separators=(',', ':')),
+                mimetype='application/geo+json'
+            )
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.max_age = current_app.config.get('GEOMETRY_CACHE_MAX_AGE', 60)
+        return response
+    except Exception as e:
+        logging.error("Error fetching geometries: %s", e)
+        return jsonify({"error": "Error fetching geometries"}), 500
+
+
 @multi_control_bp.route('/fields/', methods=['POST'])
 def create_field():
     """POST /fields/ - Create a new field"""
@@ -275,7 +398,9 @@ def create_field():
 def list_equipment():
     """GET /equipment/ - List all irrigation controllers"""
     try:
-        equipment = Equipment.query.all()
+        equipment = Equipment.query.options(load_only(
+            Equipment.id, Equipment.name, Equipment.controller_id, Equipment.field_id, Equipment.created_at
+        )).all()
         result = []
         for eq in equipment:
             result.append({
@@ -313,6 +438,8 @@ def get_equipment_details(controller_id):
             "controller_id": equipment.controller_id,
             "field_id": equipment.field_id,
             "account_id": equipment.account_id,
+            "status": equipment.status,
+            "last_seen": PresenceService.last_seen().get(equipment.controller_id),
             "created_at": equipment.created_at.isoformat(),
             "zones": zones_data
         }
@@ -361,6 +488,26 @@ def add_equipment():
         return jsonify({"error": "Error adding equipment"}), 500
 
 
+@multi_control_bp.route('/equipment/heartbeat', methods=['POST'])
+def equipment_heartbeat():
+    """POST /equipment/heartbeat - Record controller check-ins without a DB write"""
+    try:
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({"error": "No data provided"}), 400
+
+        controller_ids = data.get('controller_ids') or [data.get('controller_id')]
+        if not isinstance(controller_ids, list) or not any(controller_ids):
+            return jsonify({"error": "controller_id or controller_ids is required"}), 400
+
+        PresenceService.ensure_flusher(current_app._get_current_object())
+        accepted = PresenceService.heartbeat(controller_ids)
+        return jsonify({"accepted": accepted}), 202
+    except Exception as e:
+        logging.error("Error recording heartbeat: %s", e)
+        return jsonify({"error": "Error recording heartbeat"}), 500
+
+
 @multi_control_bp.route('/equipment/<controller_id>', methods=['PUT'])
 def update_equipment(controller_id):
     """PUT /equipment/<controller_id> - Update controller settings"""
@@ -419,7 +566,9 @@ def delete_equipment(controller_id):
 def list_zones():
     """GET /zones/ - List all irrigation zones"""
     try:
-        zones = Zone.query.all()
+        zones = Zone.query.options(load_only(
+            Zone.id, Zone.name, Zone.equipment_id, Zone.application_rate, Zone.area, Zone.created_at
+        )).all()
         result = []
         for zone in zones:
             result.append({
@@ -452,8 +601,10 @@ def get_zone_details(zone_id):
             "application_rate": zone.application_rate,
             "area": zone.area,
             "created_at": zone.created_at.isoformat(),
-            "kml_file_uploaded": bool(zone.kml_file),
-            "shp_file_uploaded": bool(zone.shp_file)
+            "kml_file_uploaded": bool(zone.kml_blob),
+            "shp_file_uploaded": bool(zone.shp_blob),
+            "kml_file_size": zone.kml_size,
+            "shp_file_size": zone.shp_size
         }
         return jsonify(zone_data), 200
     except Exception as e:
@@ -461,6 +612,28 @@ def get_zone_details(zone_id):
         return jsonify({"error": "Error fetching zone details"}), 500
 
 
+@multi_control_bp.route('/zones/locate', methods=['GET'])
+def locate_zones():
+    """GET /zones/locate - Zones whose outline contains a lat/lon point"""
+    try:
+        account_id = request.args.get('account_id')
+        if not account_id:
+            return jsonify({"error": "Account ID is required"}), 400
+        lat = request.args.get('lat', type=float)
+        lon = request.args.get('lon', type=float)
+        if lat is None or lon is None:
+            return jsonify({"error": "lat and lon are required"}), 400
+
+        zones = GeometryService.locate_zones(
+            account_id, lon, lat,
+            ttl=current_app.config.get('GEOMETRY_INDEX_TTL', 300)
+        )
+        return jsonify(zones), 200
+    except Exception as e:
+        logging.error("Error locating zones: %s", e)
+        return jsonify({"error": "Error locating zones"}), 500
+
+
 @multi_control_bp.route('/zones/', methods=['POST'])
 def create_zone():
     """POST /zones/ - Create a new zone"""
@@ -571,11 +744,17 @@ def upload_zone_kml():
         if not zone:
             return jsonify({"error": "Zone not found"}), 404
         
-        filename = secure_filename(file.filename)
-        file_data = file.read()
-        zone.kml_file = file_data
+        digest, size = get_blob_store().put_stream(file.stream)
+        zone.kml_blob = digest
+        zone.kml_size = size
+        geometry = extract_upload_geometry(zone, 'zone', 'kml', digest)
         db.session.commit()
-        return jsonify({"message": "KML file uploaded successfully"}), 200
+        return jsonify({
+            "message": "KML file uploaded successfully",
+            "sha256": digest,
+            "size": size,
+            **geometry
+        }), 200
 
     except Exception as e:
         logging.error("Error uploading zone KML file: %s", e)
@@ -603,11 +782,17 @@ def upload_zone_shp():
         if not zone:
             return jsonify({"error": "Zone not found"}), 404
         
-        filename = secure_filename(file.filename)
-        file_data = file.read()
-        zone.shp_file = file_data
+        digest, size = get_blob_store().put_stream(file.stream)
+        zone.shp_blob = digest
+        zone.shp_size = size
+        geometry = extract_upload_geometry(zone, 'zone', 'shp', digest)
         db.session.commit()
-        return jsonify({"message": "SHP file uploaded successfully"}), 200
+        return jsonify({
+            "message": "SHP file uploaded successfully",
+            "sha256": digest,
+            "size": size,
+            **geometry
+        }), 200
 
     except Exception as e:
         logging.error("Error uploading zone SHP file: %s", e)
@@ -617,6 +802,11 @@ def upload_zone_shp():
 
 # --- Irrigation Plan Management Endpoints ---
 
+def plan_check_horizon():
+    """How far ahead plan runs are compared for conflicts"""
+    return timedelta(days=current_app.config.get("IRRIGATION_CHECK_HORIZON_DAYS", 7))
+
+
 @multi_control_bp.route('/plans/', methods=['GET'])
 def list_plans():
     """GET /plans/ - List all irrigation plans"""
@@ -698,11 +888,23 @@ def create_plan():
         for field in required_schedule_fields:
             if field not in schedule:
                 return jsonify({"error": f"Schedule missing required field: {field}"}), 400
+        try:
+            compile_schedule(schedule)
+        except ScheduleError as e:
+            return jsonify({"error": str(e)}), 400
 
         # Verify field exists
         field = db.session.get(Field, data['field_id'])
         if not field:
             return jsonify({"error": "Field not found"}), 404
+        foreign = IrrigationPlanService.foreign_zones(field.id, schedule)
+        if foreign:
+            return jsonify({"error": f"Zones not on this field: {foreign}"}), 400
+
+        if not data.get('allow_conflicts'):
+            report = IrrigationPlanService.check_plan(field, schedule, horizon=plan_check_horizon())
+            if not report['ok']:
+                return jsonify({"error": "Plan conflicts with the field's other plans", "check": report}), 409
 
         new_plan = IrrigationPlan(
             name=data['name'],
@@ -714,6 +916,8 @@ def create_plan():
 
         db.session.add(new_plan)
         db.session.commit()
+        IrrigationScheduler.default.notify(new_plan.id)
+        IrrigationScheduler.default.ensure_worker(current_app._get_current_object())
 
         return jsonify({
             "message": "Irrigation plan created successfully",
@@ -737,24 +941,51 @@ def update_plan(plan_id):
         if not plan:
             return jsonify({"error": "Irrigation plan not found"}), 404
 
+        if 'schedule' in data:
+            # Validate schedule format
+            schedule = data['schedule']
+            if not isinstance(schedule, dict):
+                return jsonify({"error": "Schedule must be a JSON object"}), 400
+
+            required_schedule_fields = ['zones', 'frequency']
+            for req_field in required_schedule_fields:
+                if req_field not in schedule:
+                    return jsonify({"error": f"Schedule missing required field: {req_field}"}), 400
+            try:
+                compile_schedule(schedule)
+            except ScheduleError as e:
+                return jsonify({"error": str(e)}), 400
+
+        if 'field_id' in data and (not isinstance(data['field_id'], int) or isinstance(data['field_id'], bool)):
+            return jsonify({"error": "field_id must be an integer"}), 400
+
+        # A new schedule or a move to another field is validated against the field the plan ends up on
+        if 'schedule' in data or 'field_id' in data:
+            schedule = data.get('schedule', plan.schedule)
+            plan_field = db.session.get(Field, data.get('field_id', plan.field_id))
+            if not plan_field or plan_field.account_id != plan.account_id:
+                return jsonify({"error": "Field not found"}), 404
+            try:
+                foreign = IrrigationPlanService.foreign_zones(plan_field.id, schedule)
+            except ScheduleError as e:
+                return jsonify({"error": f"Stored schedule is invalid: {e}"}), 400
+            if foreign:
+                return jsonify({"error": f"Zones not on this field: {foreign}"}), 400
+
+            if not data.get('allow_conflicts'):
+                report = IrrigationPlanService.check_plan(plan_field, schedule, plan.id, plan_check_horizon())
+                if not report['ok']:
+                    return jsonify({"error": "Plan conflicts with the field's other plans", "check": report}), 409
+
         # Update allowed fields
-        allowed_fields = ['name', 'schedule']
+        allowed_fields = ['name', 'field_id', 'schedule']
         for field in allowed_fields:
             if field in data:
-                if field == 'schedule':
-                    # Validate schedule format
-                    schedule = data['schedule']
-                    if not isinstance(schedule, dict):
-                        return jsonify({"error": "Schedule must be a JSON object"}), 400
-                    
-                    required_schedule_fields = ['zones', 'frequency']
-                    for req_field in required_schedule_fields:
-                        if req_field not in schedule:
-                            return jsonify({"error": f"Schedule missing required field: {req_field}"}), 400
-                
                 setattr(plan, field, data[field])
 
         db.session.commit()
+        IrrigationScheduler.default.notify(plan.id)
+        IrrigationScheduler.default.ensure_worker(current_app._get_current_object())
 
         return jsonify({
             "message": "Irrigation plan updated successfully",
@@ -766,6 +997,32 @@ def update_plan(plan_id):
         return jsonify({"error": "Error updating irrigation plan"}), 500
 
 
+@multi_control_bp.route('/plans/check', methods=['POST'])
+def check_plan():
+    """POST /plans/check - Check a schedule for overlaps and flow capacity without saving it"""
+    try:
+        data = request.json
+        if not data:
+            return jsonify({"error": "No data provided"}), 400
+
+        for field in ['field_id', 'schedule']:
+            if field not in data:
+                return jsonify({"error": f"Missing required field: {field}"}), 400
+
+        field = db.session.get(Field, data['field_id'])
+        if not field:
+            return jsonify({"error": "Field not found"}), 404
+
+        try:
+            report = IrrigationPlanService.check_plan(field, data['schedule'], data.get('plan_id'), plan_check_horizon())
+        except ScheduleError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify(report), 200
+    except Exception as e:
+        logging.error("Error checking irrigation plan: %s", e)
+        return jsonify({"error": "Error checking irrigation plan"}), 500
+
+
 @multi_control_bp.route('/plans/<int:plan_id>', methods=['DELETE'])
 def delete_plan(plan_id):
     """DELETE /plans/<plan_id> - Delete an irrigation plan"""
@@ -776,6 +1033,7 @@ def delete_plan(plan_id):
 
         db.session.delete(plan)
         db.session.commit()
+        IrrigationScheduler.default.notify(plan_id)
 
         return jsonify({
             "message": "Irrigation plan deleted successfully",
@@ -810,7 +1068,9 @@ def list_alerts():
                 'field_id': alert.field_id,
                 'alert_type': alert.alert_type,
                 'message': alert.message,
-                'created_at': alert.created_at.isoformat()
+                'occurrence_count': alert.occurrence_count,
+                'created_at': alert.created_at.isoformat(),
+                'last_seen': alert.last_seen.isoformat()
             })
         return jsonify(result), 200
     except Exception as e:
@@ -840,7 +1100,9 @@ def get_alert_details(alert_id):
             "alert_type": alert.alert_type,
             "message": alert.message,
             "resolved": alert.resolved,
-            "created_at": alert.created_at.isoformat()
+            "occurrence_count": alert.occurrence_count,
+            "created_at": alert.created_at.isoformat(),
+            "last_seen": alert.last_seen.isoformat()
         }
         return jsonify(alert_data), 200
     except Exception as e:
@@ -850,7 +1112,11 @@ def get_alert_details(alert_id):
 
 @multi_control_bp.route('/alerts/', methods=['POST'])
 def create_alert():
-    """POST /alerts/ - Create an alert (triggered by system events)"""
+    """POST /alerts/ - Create an alert (triggered by system events).
+
+    Repeats of an open alert's (field, alert_type) are folded into it. When
+    the background writer runs the alert is queued and 202 is returned.
+    """
     try:
         data = request.json
         if not data:
@@ -861,20 +1127,31 @@ def create_alert():
             if field not in data:
                 return jsonify({"error": f"Missing required field: {field}"}), 400
 
-        new_alert = Alert(
-            field_id=data['field_id'],
-            account_id=data['account_id'],
-            alert_type=data['alert_type'],
-            message=data['message'],
-            resolved=False
-        )
+        ingest = AlertIngestService.default
+        try:
+            key = ingest.alert_key(data['account_id'], data['field_id'], data['alert_type'])
+        except (TypeError, ValueError):
+            return jsonify({"error": "account_id and field_id must be integers"}), 400
+        # Checked before queueing so a queued (202) alert fails the same way an inline one does
+        if not db.session.query(Field.id).filter_by(id=key[1], account_id=key[0]).first():
+            return jsonify({"error": "Field not found"}), 404
 
-        db.session.add(new_alert)
-        db.session.commit()
+        retry_after = ingest.submit(*key, data['message'])
+        if retry_after is not None:
+            response = jsonify({"error": "Alert rate limit exceeded"})
+            response.headers['Retry-After'] = str(math.ceil(retry_after))
+            return response, 429
 
+        if ingest.ensure_worker(current_app._get_current_object()):
+            return jsonify({"message": "Alert accepted"}), 202
+
+        # Another request's flush may have written this alert; it has committed once ours returns
+        alert_id = ingest.flush().get(key) or ingest.open_alert_id(key)
+        if alert_id is None:
+            return jsonify({"error": "Field not found"}), 404
         return jsonify({
             "message": "Alert created successfully",
-            "id": new_alert.id
+            "id": alert_id
         }), 201
     except Exception as e:
         logging.error("Error creating alert: %s", e)
@@ -934,9 +1211,39 @@ def delete_alert(alert_id):
 
 # --- Logs & Reports Endpoints ---
 
+LOG_PAGE_MAX_LIMIT = 1000
+LOG_STREAM_CHUNK_SIZE = 1000
+
+
+def serialize_log(log):
+    return {
+        'id': log.id,
+        'event_type': log.event_type,
+        'event_data': log.event_data,
+        'timestamp': log.timestamp.isoformat(),
+        'field_id': log.field_id,
+        'user_id': log.user_id
+    }
+
+
+def encode_log_cursor(log):
+    """Encode the (timestamp, id) keyset position of a log row as an opaque cursor"""
+    raw = json.dumps([log.timestamp.isoformat(), log.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_log_cursor(cursor):
+    timestamp, log_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return datetime.fromisoformat(timestamp), int(log_id)
+
+
 @multi_control_bp.route('/logs/', methods=['GET'])
 def get_logs():
-    """GET /logs/ - Get system logs with optional filtering"""
+    """GET /logs/ - Get system logs with optional filtering.
+
+    Pass `limit` (and the returned `next_cursor` as `cursor`) for keyset
+    pagination, or `format=ndjson` to stream every matching row.
+    """
     try:
         account_id = request.args.get('account_id')
         if not account_id:
@@ -946,6 +1253,20 @@ def get_logs():
         event_type = request.args.get('event_type')
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
+        limit = request.args.get('limit')
+        cursor = request.args.get('cursor')
+        output_format = request.args.get('format')
+        if limit is not None:
+            # Checked up front: a bad limit must not surface after a stream has started
+            max_limit = None if output_format == 'ndjson' else LOG_PAGE_MAX_LIMIT
+            try:
+                limit = int(limit)
+            except ValueError:
+                return jsonify({"error": "limit must be an integer"}), 400
+            if limit < 1:
+                return jsonify({"error": "limit must be at least 1"}), 400
+            if max_limit is not None and limit > max_limit:
+                return jsonify({"error": f"limit must be at most {max_limit}"}), 400
 
         query = Log.query.filter_by(account_id=account_id)
 
@@ -955,25 +1276,85 @@ def get_logs():
             query = query.filter(Log.timestamp >= start_date)
         if end_date:
             query = query.filter(Log.timestamp <= end_date)
-
-        logs = query.order_by(Log.timestamp.desc()).all()
-        
-        result = []
-        for log in logs:
-            result.append({
-                'id': log.id,
-                'event_type': log.event_type,
-                'event_data': log.event_data,
-                'timestamp': log.timestamp.isoformat(),
-                'field_id': log.field_id,
-                'user_id': log.user_id
-            })
-        return jsonify(result), 200
+        if cursor:
+            try:
+                cursor_timestamp, cursor_id = decode_log_cursor(cursor)
+            except (ValueError, TypeError):
+                return jsonify({"error": "Invalid cursor"}), 400
+            query = query.filter(tuple_(Log.timestamp, Log.id) < (cursor_timestamp, cursor_id))
+
+        query = query.order_by(Log.timestamp.desc(), Log.id.desc())
+
+        if output_format == 'ndjson':
+            if limit is not None:
+                query = query.limit(limit)
+
+            def generate():
+                for log in query.yield_per(LOG_STREAM_CHUNK_SIZE):
+                    yield json.dumps(serialize_log(log)) + "\n"
+
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+        if limit is not None or cursor:
+            limit = limit or LOG_PAGE_MAX_LIMIT
+            logs = query.limit(limit + 1).all()
+            has_more = len(logs) > limit
+            logs = logs[:limit]
+            return jsonify({
+                "logs": [serialize_log(log) for log in logs],
+                "next_cursor": encode_log_cursor(logs[-1]) if has_more else None
+            }), 200
+
+        logs = query.all()
+        return jsonify([serialize_log(log) for log in logs]), 200
     except Exception as e:
         logging.error("Error fetching logs: %s", e)
         return jsonify({"error": "Error fetching logs"}), 500
 
 
+def _iter_ndjson(stream):
+    """Yield one parsed event per non-empty NDJSON line (None for invalid lines)"""
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+@multi_control_bp.route('/logs/bulk', methods=['POST'])
+def ingest_logs():
+    """POST /logs/bulk - Batch ingest controller events (JSON array or NDJSON)"""
+    try:
+        if request.mimetype == 'application/x-ndjson':
+            events = _iter_ndjson(request.stream)
+        else:
+            data = request.get_json(silent=True)
+            events = data.get('events') if isinstance(data, dict) else data
+            if not isinstance(events, list):
+                return jsonify({"error": "Expected a JSON array of events"}), 400
+
+        success, result = TelemetryService.ingest_events(
+            events,
+            batch_size=current_app.config.get('TELEMETRY_BATCH_SIZE', 1000)
+        )
+        if not success:
+            logging.error("Error ingesting logs: %s", result.get("error"))
+            return jsonify({"error": "Error ingesting logs"}), 500
+
+        logging.info(
+            "Ingested %s log rows in %s batches (%s ms, %s rows/s)",
+            result["inserted"], result["batches"], result["duration_ms"], result["rows_per_second"]
+        )
+        return jsonify(result), 201 if result["inserted"] else 200
+    except Exception as e:
+        logging.error("Error ingesting logs: %s", e)
+        db.session.rollback()
+        return jsonify({"error": "Error ingesting logs"}), 500
+
+
 @multi_control_bp.route('/logs/<int:log_id>', methods=['GET'])
 def get_log_details(log_id):
     """GET /logs/<log_id> - Get details of a specific log entry"""
@@ -1008,30 +1389,18 @@ def get_water_usage_report():
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         field_id = request.args.get('field_id')  # Optional field filter
+        granularity = request.args.get('granularity', 'day')
 
-        # Query relevant logs and aggregate water usage data
-        query = Log.query.filter_by(
-            account_id=account_id,
-            event_type='irrigation_event'
-        )
+        if granularity not in WATER_USAGE_GRANULARITIES:
+            return jsonify({"error": f"Granularity must be one of: {', '.join(WATER_USAGE_GRANULARITIES)}"}), 400
 
-        if field_id:
-            query = query.filter_by(field_id=field_id)
-        if start_date:
-            query = query.filter(Log.timestamp >= start_date)
-        if end_date:
-            query = query.filter(Log.timestamp <= end_date)
-
-        logs = query.order_by(Log.timestamp).all()
-
-        # Process logs to generate water usage statistics
-        report_data = {
-            "total_water_usage": sum(log.event_data.get('water_volume', 0) for log in logs),
-            "usage_by_field": {},
-            "usage_by_date": {},
-            "period_start": start_date,
-            "period_end": end_date
-        }
+        report_data = ReportService.water_usage(
+            account_id,
+            start_date=start_date,
+            end_date=end_date,
+            field_id=field_id,
+            granularity=granularity
+        )
 
         return jsonify(report_data), 200
     except Exception as e:
@@ -1039,9 +1408,72 @@ def get_water_usage_report():
         return jsonify({"error": "Error generating water usage report"}), 500
 
 
+def usage_window():
+    """Parse start_date/end_date query args, defaulting to the last seven days"""
+    end = request.args.get('end_date')
+    end = datetime.fromisoformat(end) if end else datetime.utcnow()
+    start = request.args.get('start_date')
+    start = datetime.fromisoformat(start) if start else end - timedelta(days=7)
+    return start, end
+
+
+@multi_control_bp.route('/reports/cellular-usage', methods=['GET'])
+def get_cellular_usage_report():
+    """GET /reports/cellular-usage - Cellular data usage per controller, with outliers flagged"""
+    try:
+        account_id = request.args.get('account_id')
+        if not account_id:
+            return jsonify({"error": "Account ID is required"}), 400
+        try:
+            start, end = usage_window()
+        except ValueError:
+            return jsonify({"error": "start_date and end_date must be ISO 8601 timestamps"}), 400
+
+        return jsonify(CellularUsageService.report(
+            account_id, start, end,
+            anomaly_factor=request.args.get(
+                'anomaly_factor', current_app.config['CELLULAR_USAGE_ANOMALY_FACTOR'], type=float
+            )
+        )), 200
+    except Exception as e:
+        logging.error("Error generating cellular usage report: %s", e)
+        return jsonify({"error": "Error generating cellular usage report"}), 500
+
+
+@multi_control_bp.route('/reports/cellular-usage/<controller_id>', methods=['GET'])
+def get_cellular_usage_series(controller_id):
+    """GET /reports/cellular-usage/<controller_id> - Cellular data usage over time for one controller"""
+    try:
+        account_id = request.args.get('account_id')
+        if not account_id:
+            return jsonify({"error": "Account ID is required"}), 400
+        granularity = request.args.get('granularity', 'hour')
+        if granularity not in WATER_USAGE_GRANULARITIES:
+            return jsonify({"error": f"Granularity must be one of: {', '.join(WATER_USAGE_GRANULARITIES)}"}), 400
+        try:
+            start, end = usage_window()
+        except ValueError:
+            return jsonify({"error": "start_date and end_date must be ISO 8601 timestamps"}), 400
+
+        return jsonify({
+            "controller_id": controller_id,
+            "granularity": granularity,
+            "series": CellularUsageService.series(account_id, controller_id, start, end, granularity)
+        }), 200
+    except Exception as e:
+        logging.error("Error fetching cellular usage for %s: %s", controller_id, e)
+        return jsonify({"error": "Error fetching cellular usage"}), 500
+
+
 @multi_control_bp.route('/reports/system-health', methods=['GET'])
 def get_system_health_report():
-    """GET /reports/system-health - Generate system health report"""
+    """GET /reports/system-health - Generate system health report
+
+    `recent_errors` holds the latest ten errors of the last
+    LOG_REPORT_LOOKBACK_DAYS days (30 by default), so the scan stays within
+    recent log partitions; an account with no error in that window gets an
+    empty list. Setting it to 0 searches the whole log history.
+    """
     try:
         account_id = request.args.get('account_id')
         if not account_id:
@@ -1050,10 +1482,12 @@ def get_system_health_report():
         # Collect system health data
         equipment_status = Equipment.query.filter_by(account_id=account_id).all()
         active_alerts = Alert.query.filter_by(account_id=account_id, resolved=False).count()
-        recent_errors = Log.query.filter_by(
-            account_id=account_id,
-            event_type='error'
-        ).order_by(Log.timestamp.desc()).limit(10).all()
+        lookback_days = current_app.config.get('LOG_REPORT_LOOKBACK_DAYS', 30)
+        recent_errors = Log.query.filter_by(account_id=account_id, event_type='error')
+        if lookback_days > 0:
+            # lets the planner prune old partitions
+            recent_errors = recent_errors.filter(Log.timestamp >= datetime.utcnow() - timedelta(days=lookback_days))
+        recent_errors = recent_errors.order_by(Log.timestamp.desc()).limit(10).all()
 
         report_data = {
             "equipment_summary": {
@@ -1067,6 +1501,7 @@ def get_system_health_report():
                 "error_type": log.event_data.get('error_type'),
                 "message": log.event_data.get('message')
             } for log in recent_errors],
+            "recent_errors_lookback_days": lookback_days or None,
             "generated_at": datetime.utcnow().isoformat()
         }
 
@@ -1086,7 +1521,10 @@ def list_firmware():
         if not account_id:
             return jsonify({"error": "Account ID is required"}), 400
 
-        firmware_list = Firmware.query.filter_by(
+        firmware_list = Firmware.query.options(load_only(
+            Firmware.id, Firmware.version, Firmware.equipment_id, Firmware.release_date,
+            Firmware.changelog, Firmware.file_size
+        )).filter_by(
             account_id=account_id
         ).order_by(Firmware.release_date.desc()).all()
 
@@ -1097,7 +1535,8 @@ def list_firmware():
                 'version': fw.version,
                 'equipment_id': fw.equipment_id,
                 'release_date': fw.release_date.isoformat(),
-                'changelog': fw.changelog
+                'changelog': fw.changelog,
+                'file_size': fw.file_size
             })
         return jsonify(result), 200
     except Exception as e:
@@ -1105,6 +1544,173 @@ def list_firmware():
         return jsonify({"error": "Error fetching firmware list"}), 500
 
 
+@multi_control_bp.route('/firmware/', methods=['POST'])
+def upload_firmware():
+    """POST /firmware/ - Upload a firmware image, stored as deduplicated chunks"""
+    try:
+        if 'file' not in request.files:
+            return jsonify({"error": "No file part in the request"}), 400
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({"error": "No selected file"}), 400
+
+        required_fields = ['account_id', 'equipment_id', 'version']
+        for field in required_fields:
+            if not request.form.get(field):
+                return jsonify({"error": f"Missing required field: {field}"}), 400
+
+        equipment = db.session.get(Equipment, request.form['equipment_id'])
+        # Chunks are shared across accounts, so the image must not be filed under someone else's equipment
+        if not equipment or str(equipment.account_id) != request.form['account_id']:
+            return jsonify({"error": "Equipment not found"}), 404
+
+        try:
+            release_date = datetime.fromisoformat(request.form['release_date']) \
+                if request.form.get('release_date') else datetime.utcnow()
+        except ValueError:
+            return jsonify({"error": "Invalid release date"}), 400
+
+        firmware = Firmware(
+            account_id=request.form['account_id'],
+            equipment_id=equipment.id,
+            version=request.form['version'],
+            release_date=release_date,
+            changelog=request.form.get('changelog')
+        )
+        FirmwareStorageService.store(
+            firmware, file.stream, current_app.config.get('FIRMWARE_CHUNK_SIZE', 256 * 1024)
+        )
+        db.session.add(firmware)
+        db.session.commit()
+
+        # Queue the delta from the previous release so the first controller is likely to find it built
+        previous = FirmwareDeltaService.previous_release(firmware)
+        if previous:
+            FirmwareDeltaService.build_later(current_app._get_current_object(), previous, firmware)
+        return jsonify({
+            "message": "Firmware uploaded successfully",
+            "id": firmware.id,
+            "sha256": firmware.sha256,
+            "size": firmware.file_size,
+            "chunks": len(firmware.chunks)
+        }), 201
+    except Exception as e:
+        logging.error("Error uploading firmware: %s", e)
+        db.session.rollback()
+        return jsonify({"error": "Error uploading firmware"}), 500
+
+
+def find_account_firmware(firmware_id):
+    """(firmware, error response) for a chunked image of the request's `account_id`
+
+    Legacy inline images are not converted here; `flask chunk_firmware`
+    moves them into chunked storage.
+    """
+    account_id = request.args.get('account_id')
+    if not account_id:
+        return None, (jsonify({"error": "Account ID is required"}), 400)
+    firmware = Firmware.query.filter_by(id=firmware_id, account_id=account_id).first()
+    if not firmware:
+        return None, (jsonify({"error": "Firmware not found"}), 404)
+    if not firmware.sha256:
+        return None, (jsonify({"error": "Firmware image has not been chunked yet"}), 404)
+    return firmware, None
+
+
+@multi_control_bp.route('/firmware/<int:firmware_id>/manifest', methods=['GET'])
+def get_firmware_manifest(firmware_id):
+    """GET /firmware/<firmware_id>/manifest - Image digest and per-chunk hashes for resumable downloads"""
+    try:
+        firmware, error = find_account_firmware(firmware_id)
+        if error:
+            return error
+        return jsonify(FirmwareStorageService.manifest(firmware)), 200
+    except Exception as e:
+        logging.error("Error fetching firmware manifest: %s", e)
+        return jsonify({"error": "Error fetching firmware manifest"}), 500
+
+
+@multi_control_bp.route('/firmware/<int:firmware_id>/download', methods=['GET'])
+def download_firmware(firmware_id):
+    """GET /firmware/<firmware_id>/download - Firmware image with Range and If-None-Match support
+
+    The image is streamed from its chunks, seeking straight to the chunk a
+    Range starts in; the ETag is the image sha256, which controllers can
+    also check against the manifest after resuming.
+    """
+    try:
+        firmware, error = find_account_firmware(firmware_id)
+        if error:
+            return error
+        response = current_app.response_class(
+            FileWrapper(FirmwareStorageService.open(firmware)),
+            mimetype='application/octet-stream',
+            direct_passthrough=True
+        )
+        response.headers['Content-Disposition'] = f'attachment; filename="firmware-{firmware.version}.bin"'
+        response.content_length = firmware.file_size
+        response.set_etag(firmware.sha256)
+        response.cache_control.public = True
+        response.cache_control.max_age = current_app.config.get('FIRMWARE_CACHE_MAX_AGE', 86400)
+        return response.make_conditional(request.environ, accept_ranges=True, complete_length=firmware.file_size)
+    except FileNotFoundError:
+        return jsonify({"error": "Firmware has no image"}), 404
+    except Exception as e:
+        logging.error("Error downloading firmware: %s", e)
+        return jsonify({"error": "Error downloading firmware"}), 500
+
+
+@multi_control_bp.route('/firmware/<int:firmware_id>/delta', methods=['GET'])
+def download_firmware_delta(firmware_id):
+    """GET /firmware/<firmware_id>/delta - Binary delta from the controller's current version
+
+    The current version comes from `from_version` or the X-Firmware-Version
+    header. When no delta applies (unknown version, or a delta that would not
+    save enough) the request is redirected to the full image download. So is
+    a delta that has not been built yet; it is built in the background for
+    the next controller.
+    """
+    try:
+        firmware, error = find_account_firmware(firmware_id)
+        if error:
+            return error
+        from_version = request.args.get('from_version') or request.headers.get('X-Firmware-Version')
+        if not from_version:
+            return jsonify({"error": "from_version is required"}), 400
+
+        full_download = url_for(
+            '.download_firmware', firmware_id=firmware.id, account_id=request.args['account_id']
+        )
+        source = FirmwareDeltaService.source_for(firmware, from_version)
+        if not source:
+            return redirect(full_download)
+        delta = FirmwareDeltaService.cached(source, firmware)
+        if not delta:
+            FirmwareDeltaService.build_later(current_app._get_current_object(), source, firmware)
+            return redirect(full_download)
+        if not delta.digest:
+            return redirect(full_download)
+
+        response = send_file(
+            get_blob_store().path(delta.digest),
+            mimetype='application/octet-stream',
+            as_attachment=True,
+            download_name=f"firmware-{source.version}-{firmware.version}.delta",
+            conditional=True,
+            etag=delta.digest,
+            max_age=current_app.config.get('FIRMWARE_CACHE_MAX_AGE', 86400)
+        )
+        response.headers['X-Firmware-Sha256'] = firmware.sha256
+        response.headers['X-Delta-Source-Sha256'] = source.sha256
+        return response
+    except FileNotFoundError:
+        return jsonify({"error": "Firmware has no image"}), 404
+    except Exception as e:
+        logging.error("Error downloading firmware delta: %s", e)
+        db.session.rollback()
+        return jsonify({"error": "Error downloading firmware delta"}), 500
+
+
 @multi_control_bp.route('/firmware/update/<controller_id>', methods=['POST'])
 def update_firmware(controller_id):
     """POST /firmware/update/<controller_id> - Push firmware update to a controller"""
@@ -1151,6 +1757,192 @@ def update_firmware(controller_id):
         return jsonify({"error": "Error initiating firmware update"}), 500
 
 
+@multi_control_bp.route('/firmware/rollouts/', methods=['POST'])
+def create_firmware_rollout():
+    """POST /firmware/rollouts/ - Stage a firmware push to an account, some fields or an equipment list"""
+    try:
+        data = request.json
+        if not data:
+            return jsonify({"error": "No data provided"}), 400
+        for field in ('account_id', 'firmware_id'):
+            if field not in data:
+                return jsonify({"error": f"Missing required field: {field}"}), 400
+
+        firmware = db.session.get(Firmware, data['firmware_id'])
+        if not firmware:
+            return jsonify({"error": "Firmware not found"}), 404
+
+        wave_size = int(data.get('wave_size', 25))
+        max_concurrency = int(data.get('max_concurrency', 10))
+        error_threshold = float(data.get('error_threshold', 0.1))
+        min_samples = int(data.get('min_samples', 5))
+        if wave_size < 1 or max_concurrency < 1 or min_samples < 1 or not 0 <= error_threshold <= 1:
+            return jsonify({"error": "Invalid rollout limits"}), 400
+
+        equipment_ids = RolloutService.resolve_targets(
+            data['account_id'], field_ids=data.get('field_ids'), equipment_ids=data.get('equipment_ids')
+        )
+        if not equipment_ids:
+            return jsonify({"error": "No equipment matches the rollout targets"}), 400
+
+        rollout = RolloutService.create(
+            firmware, data['account_id'], equipment_ids, wave_size, max_concurrency, error_threshold, min_samples
+        )
+        RolloutService.ensure_worker(current_app._get_current_object())
+        return jsonify(RolloutService.progress(rollout)), 201
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid rollout limits"}), 400
+    except Exception as e:
+        logging.error("Error creating firmware rollout: %s", e)
+        db.session.rollback()
+        return jsonify({"error": "Error creating firmware rollout"}), 500
+
+
+@multi_control_bp.route('/firmware/rollouts/', methods=['GET'])
+def list_firmware_rollouts():
+    """GET /firmware/rollouts/ - Rollouts for an account with per-status target counts"""
+    try:
+        account_id = request.args.get('account_id')
+        if not account_id:
+            return jsonify({"error": "Account ID is required"}), 400
+        rollouts = FirmwareRollout.query.filter_by(account_id=account_id).order_by(
+            FirmwareRollout.created_at.desc()
+        ).all()
+        return jsonify([RolloutService.progress(rollout) for rollout in rollouts]), 200
+    except Exception as e:
+        logging.error("Error fetching firmware rollouts: %s", e)
+        return jsonify({"error": "Error fetching firmware rollouts"}), 500
+
+
+@multi_control_bp.route('/firmware/rollouts/<int:rollout_id>', methods=['GET'])
+def get_firmware_rollout(rollout_id):
+    """GET /firmware/rollouts/<rollout_id> - Rollout progress"""
+    try:
+        rollout = db.session.get(FirmwareRollout, rollout_id)
+        if not rollout:
+            return jsonify({"error": "Rollout not found"}), 404
+        return jsonify(RolloutService.progress(rollout)), 200
+    except Exception as e:
+        logging.error("Error fetching firmware rollout: %s", e)
+        return jsonify({"error": "Error fetching firmware rollout"}), 500
+
+
+@multi_control_bp.route('/firmware/rollouts/<int:rollout_id>/<action>', methods=['POST'])
+def change_firmware_rollout(rollout_id, action):
+    """POST /firmware/rollouts/<rollout_id>/<pause|resume|cancel> - Operator control of a rollout"""
+    statuses = {'pause': 'paused', 'resume': 'running', 'cancel': 'cancelled'}
+    if action not in statuses:
+        return jsonify({"error": "Unknown rollout action"}), 404
+    try:
+        rollout = db.session.get(FirmwareRollout, rollout_id)
+        if not rollout:
+            return jsonify({"error": "Rollout not found"}), 404
+        success, result = RolloutService.set_status(rollout, statuses[action])
+        return jsonify(result), 200 if success else 409
+    except Exception as e:
+        logging.error("Error updating firmware rollout: %s", e)
+        db.session.rollback()
+        return jsonify({"error": "Error updating firmware rollout"}), 500
+
+
+@multi_control_bp.route('/firmware/report/<controller_id>', methods=['POST'])
+def report_firmware_update(controller_id):
+    """POST /firmware/report/<controller_id> - Controller reports the result of a firmware update"""
+    try:
+        data = request.json
+        if not data or 'firmware_id' not in data or data.get('status') not in ('succeeded', 'failed'):
+            return jsonify({"error": "firmware_id and a status of 'succeeded' or 'failed' are required"}), 400
+
+        equipment = Equipment.query.filter_by(controller_id=controller_id).first()
+        if not equipment:
+            return jsonify({"error": "Equipment not found"}), 404
+
+        target = RolloutService.report(
+            equipment, data['firmware_id'], data['status'] == 'succeeded', data.get('error')
+        )
+        if target:
+            # Picks rollouts back up after a restart without waiting for a new one to be created
+            RolloutService.ensure_worker(current_app._get_current_object())
+        db.session.add(Log(
+            account_id=equipment.account_id,
+            field_id=equipment.field_id,
+            event_type='firmware_update',
+            event_data={
+                'equipment_id': equipment.id,
+                'controller_id': controller_id,
+                'firmware_id': data['firmware_id'],
+                'rollout_id': target.rollout_id if target else None,
+                'status': data['status'],
+                'error': data.get('error')
+            }
+        ))
+        db.session.commit()
+        return jsonify({"message": "Firmware update result recorded"}), 200
+    except Exception as e:
+        logging.error("Error recording firmware update result: %s", e)
+        db.session.rollback()
+        return jsonify({"error": "Error recording firmware update result"}), 500
+
+
+# --- Live Update Endpoints ---
+
+def format_sse(broker, item):
+    return f"id: {broker.event_id(item['id'])}\nevent: {item['event']}\ndata: {json.dumps(item['data'])}\n\n"
+
+
+@multi_control_bp.route('/events/', methods=['GET'])
+def stream_events():
+    """GET /events/ - Live field, alert and equipment status changes for an account.
+
+    Streams Server-Sent Events by default. `mode=poll` long-polls instead:
+    it waits up to `timeout` seconds and returns the events after `since`.
+    An id this worker did not issue (another worker, or before a restart)
+    resumes from the current event.
+    """
+    try:
+        account_id = request.args.get('account_id')
+        if not account_id:
+            return jsonify({"error": "Account ID is required"}), 400
+
+        broker = ChangeBroker.default
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('since')
+        try:
+            after_id = broker.resume_after(last_event_id)
+        except ValueError:
+            return jsonify({"error": "Invalid event id"}), 400
+
+        if request.args.get('mode') == 'poll':
+            max_wait = current_app.config.get('LONG_POLL_TIMEOUT', 25)
+            timeout = min(max(request.args.get('timeout', max_wait, type=float), 0), max_wait)
+            events = broker.wait(account_id, after_id, timeout)
+            return jsonify({
+                "events": [{**item, "id": broker.event_id(item['id'])} for item in events],
+                "last_id": broker.event_id(events[-1]['id'] if events else after_id)
+            }), 200
+
+        keepalive = current_app.config.get('SSE_KEEPALIVE', 15)
+
+        def generate():
+            last_id = after_id
+            yield "retry: 3000\n\n"
+            while True:
+                events = broker.wait(account_id, last_id, keepalive)
+                if not events:
+                    yield ": keepalive\n\n"
+                    continue
+                for item in events:
+                    yield format_sse(broker, item)
+                last_id = events[-1]['id']
+
+        return Response(generate(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+    except Exception as e:
+        logging.error("Error opening event stream: %s", e)
+        return jsonify({"error": "Error opening event stream"}), 500
+
+
 # --- System Status Endpoints ---
 
 @multi_control_bp.route('/status/', methods=['GET'])
@@ -1161,30 +1953,10 @@ def get_system_status():
         if not account_id:
             return jsonify({"error": "Account ID is required"}), 400
 
-        # Collect system status information
-        total_equipment = Equipment.query.filter_by(account_id=account_id).count()
-        active_equipment = Equipment.query.filter_by(account_id=account_id, status='ACTIVE').count()
-        active_alerts = Alert.query.filter_by(account_id=account_id, resolved=False).count()
-        recent_errors = Log.query.filter_by(
-            account_id=account_id,
-            event_type='error'
-        ).filter(
-            Log.timestamp >= datetime.utcnow() - timedelta(hours=24)
-        ).count()
-
-        status_data = {
-            "status": "operational" if active_equipment > 0 else "degraded",
-            "equipment": {
-                "total": total_equipment,
-                "active": active_equipment,
-                "inactive": total_equipment - active_equipment
-            },
-            "alerts": {
-                "active": active_alerts
-            },
-            "errors_24h": recent_errors,
-            "last_updated": datetime.utcnow().isoformat()
-        }
+        status_data = StatusService.get_status(
+            account_id,
+            ttl=current_app.config.get('STATUS_CACHE_TTL', 5)
+        )
 
         return jsonify(status_data), 200
     except Exception as e:
@@ -1192,6 +1964,62 @@ def get_system_status():
         return jsonify({"error": "Error fetching system status"}), 500
 
 
+@multi_control_bp.route('/status/cache', methods=['GET'])
+def get_status_cache_stats():
+    """GET /status/cache - Hit/miss counters for the system status cache"""
+    return jsonify(StatusService.cache.stats()), 200
+
+
+# --- SIM Inventory Endpoints ---
+
+@multi_control_bp.route('/sims/', methods=['GET'])
+def get_sims():
+    """GET /sims/ - SIMs linked to an account's equipment"""
+    try:
+        account_id = request.args.get('account_id')
+        if not account_id:
+            return jsonify({"error": "Account ID is required"}), 400
+
+        rows = db.session.query(SimCard, Equipment.id).join(
+            Equipment, Equipment.controller_id == SimCard.controller_id
+        ).filter(Equipment.account_id == account_id).order_by(SimCard.controller_id).all()
+        return jsonify([{
+            'imsi': sim.imsi,
+            'iccid': sim.iccid,
+            'msisdn': sim.msisdn,
+            'status': sim.status,
+            'speed_class': sim.speed_class,
+            'online': sim.online,
+            'controller_id': sim.controller_id,
+            'equipment_id': equipment_id,
+            'synced_at': sim.synced_at.isoformat()
+        } for sim, equipment_id in rows]), 200
+    except Exception as e:
+        logging.error("Error fetching SIMs: %s", e)
+        return jsonify({"error": "Error fetching SIMs"}), 500
+
+
+@multi_control_bp.route('/sims/sync', methods=['POST'])
+def start_sim_sync():
+    """POST /sims/sync - Start a background sync of the Soracom SIM inventory"""
+    try:
+        if not SimSyncService.start_background(current_app._get_current_object()):
+            return jsonify({"error": "A SIM sync is already running"}), 409
+        return jsonify({"message": "SIM sync started"}), 202
+    except Exception as e:
+        logging.error("Error starting SIM sync: %s", e)
+        return jsonify({"error": "Error starting SIM sync"}), 500
+
+
+@multi_control_bp.route('/sims/sync', methods=['GET'])
+def get_sim_sync_metrics():
+    """GET /sims/sync - Recent SIM sync runs with duration metrics"""
+    try:
+        return jsonify(SimSyncService.metrics(request.args.get('limit', 10, type=int))), 200
+    except Exception as e:
+        logging.error("Error fetching SIM sync metrics: %s", e)
+        return jsonify({"error": "Error fetching SIM sync metrics"}), 500
+
 @multi_control_bp.route('/ping', methods=['GET'])
 def ping():
     """GET /ping - Basic API health check"""
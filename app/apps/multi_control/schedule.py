@@ -0,0 +1,175 @@
+"""Irrigation plan schedules and the timer queue that runs them.
+
+A plan's `schedule` JSON looks like:
+
+    {
+        "frequency": "daily",            # once | daily | weekly | interval
+        "start_times": ["06:00", "18:30"],  # daily/weekly, local time ("start_time" for one)
+        "days": ["mon", "thu"],          # weekly only
+        "every_hours": 12,               # interval only, anchored at "start_at"
+        "start_at": "2026-10-18T06:00",  # once, or the interval anchor
+        "timezone": "Europe/Madrid",     # defaults to UTC
+        "enabled": true,
+        "zones": [{"zone_id": 3, "duration_minutes": 15}, 4]
+    }
+
+Zones run one after another; a bare id runs for DEFAULT_ZONE_MINUTES. All
+datetimes handed in and out are naive UTC, like the rest of the models.
+"""
+import heapq
+import itertools
+from datetime import datetime, time as dt_time, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+FREQUENCIES = ('once', 'daily', 'weekly', 'interval')
+DAY_NAMES = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+DEFAULT_ZONE_MINUTES = 10
+MAX_ZONE_MINUTES = 24 * 60
+
+Step = Tuple[int, str, int, float]  # offset seconds, 'zone_on' | 'zone_off', zone id, duration minutes
+
+
+class ScheduleError(ValueError):
+    """Raised when a plan schedule cannot be compiled"""
+
+
+def _parse_time(value: Any) -> dt_time:
+    try:
+        hour, minute = str(value).split(':')[:2]
+        return dt_time(int(hour), int(minute))
+    except (TypeError, ValueError):
+        raise ScheduleError(f"Invalid time of day: {value!r}")
+
+
+def _parse_day(value: Any) -> int:
+    if isinstance(value, int) and 0 <= value < 7:
+        return value
+    name = str(value).lower()[:3]
+    if name not in DAY_NAMES:
+        raise ScheduleError(f"Invalid day: {value!r}")
+    return DAY_NAMES.index(name)
+
+
+def _compile_zones(zones: Any) -> List[Step]:
+    if not isinstance(zones, list) or not zones:
+        raise ScheduleError("Schedule needs a non-empty list of zones")
+    steps, offset = [], 0
+    for zone in zones:
+        if isinstance(zone, dict):
+            zone_id = zone.get('zone_id', zone.get('id'))
+            minutes = zone.get('duration_minutes', DEFAULT_ZONE_MINUTES)
+        else:
+            zone_id, minutes = zone, DEFAULT_ZONE_MINUTES
+        if isinstance(zone_id, bool) or not isinstance(zone_id, int):
+            raise ScheduleError(f"Invalid zone id: {zone_id!r}")
+        if not isinstance(minutes, (int, float)) or not 0 < minutes <= MAX_ZONE_MINUTES:
+            raise ScheduleError(f"Zone {zone_id} duration must be between 0 and {MAX_ZONE_MINUTES} minutes")
+        steps.append((offset, 'zone_on', zone_id, float(minutes)))
+        offset += int(minutes * 60)
+        steps.append((offset, 'zone_off', zone_id, float(minutes)))
+    return steps
+
+
+class CompiledSchedule:
+    """A validated schedule that can answer "when is the next run after t?" """
+    __slots__ = ('frequency', 'tz', 'times', 'days', 'period', 'anchor', 'enabled', 'steps', 'duration')
+
+    def __init__(self, schedule: Dict[str, Any]):
+        if not isinstance(schedule, dict):
+            raise ScheduleError("Schedule must be a JSON object")
+        self.frequency = schedule.get('frequency')
+        if self.frequency not in FREQUENCIES:
+            raise ScheduleError(f"Frequency must be one of: {', '.join(FREQUENCIES)}")
+        try:
+            self.tz = ZoneInfo(schedule.get('timezone') or 'UTC')
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ScheduleError(f"Unknown timezone: {schedule.get('timezone')!r}")
+        self.enabled = bool(schedule.get('enabled', True))
+        self.steps = _compile_zones(schedule.get('zones'))
+        self.duration = self.steps[-1][0]
+
+        times = schedule.get('start_times') or ([schedule['start_time']] if schedule.get('start_time') else [])
+        self.times = sorted({_parse_time(value) for value in times})
+        self.days = sorted({_parse_day(day) for day in schedule.get('days') or ()})
+        self.period = self.anchor = None
+
+        if self.frequency in ('daily', 'weekly') and not self.times:
+            raise ScheduleError(f"A {self.frequency} schedule needs start_time or start_times")
+        if self.frequency == 'weekly' and not self.days:
+            raise ScheduleError("A weekly schedule needs days")
+        if self.frequency in ('once', 'interval'):
+            start_at = schedule.get('start_at')
+            if self.frequency == 'once' and not start_at:
+                raise ScheduleError("A one-off schedule needs start_at")
+            try:
+                anchor = datetime.fromisoformat(start_at) if start_at else datetime(2000, 1, 1)
+            except (TypeError, ValueError):
+                raise ScheduleError(f"Invalid start_at: {start_at!r}")
+            self.anchor = self._to_utc(anchor)
+        if self.frequency == 'interval':
+            hours = schedule.get('every_hours')
+            if not isinstance(hours, (int, float)) or hours <= 0:
+                raise ScheduleError("An interval schedule needs a positive every_hours")
+            self.period = timedelta(hours=hours)
+            if self.period.total_seconds() < self.duration:
+                raise ScheduleError("every_hours is shorter than one run through the zones")
+
+    def _to_utc(self, local: datetime) -> datetime:
+        if local.tzinfo is None:
+            local = local.replace(tzinfo=self.tz)
+        return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+    def next_run(self, after: datetime) -> Optional[datetime]:
+        """First run start strictly after `after`, or None if the plan never runs again"""
+        if not self.enabled:
+            return None
+        if self.frequency == 'once':
+            return self.anchor if self.anchor > after else None
+        if self.frequency == 'interval':
+            if after < self.anchor:
+                return self.anchor
+            return self.anchor + self.period * ((after - self.anchor) // self.period + 1)
+
+        local_date = after.replace(tzinfo=timezone.utc).astimezone(self.tz).date()
+        for day in range(8):
+            date = local_date + timedelta(days=day)
+            if self.frequency == 'weekly' and date.weekday() not in self.days:
+                continue
+            for start in self.times:
+                run = self._to_utc(datetime.combine(date, start))
+                if run > after:
+                    return run
+        return None
+
+
+def compile_schedule(schedule: Any) -> CompiledSchedule:
+    return CompiledSchedule(schedule)
+
+
+class FireQueue:
+    """Min-heap of timed entries: O(log n) push and pop, O(1) peek at the next due time.
+
+    Entries are never removed in place; callers tag them with a version and
+    drop stale ones when they pop out (lazy deletion).
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, int, Any]] = []
+        self._counter = itertools.count()
+
+    def push(self, when: datetime, item: Any) -> None:
+        heapq.heappush(self._heap, (when, next(self._counter), item))
+
+    def next_due(self) -> Optional[datetime]:
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> Optional[Tuple[datetime, Any]]:
+        """Pop the earliest entry if it is due"""
+        if self._heap and self._heap[0][0] <= now:
+            when, _, item = heapq.heappop(self._heap)
+            return when, item
+        return None
+
+    def __len__(self) -> int:
+        return len(self._heap)
@@ -1,6 +1,37 @@
-from .models import create_multi_control_model, ControlStatus
+from .models import (
+    create_multi_control_model, ControlStatus, Field, Equipment, Zone, IrrigationPlan, Alert, Log, Firmware, FirmwareChunk,
+    FirmwareDelta, FirmwareRollout, FirmwareRolloutTarget, Geometry, SimCard, SimSyncRun,
+    SimUsageHourly, WaterUsageHourly, WaterUsageDaily
+)
+from .delta import make_delta, apply_delta
+from .schedule import ScheduleError, CompiledSchedule, FireQueue, compile_schedule
+from .change_feed import CHANGE_FEED_CHANNEL, INSTALL_SQL as CHANGE_FEED_SQL
+from .hydraulics import DEFAULT_HORIZON, PlanCheck, ZoneDemand, solve_plan, zone_flow
+from .geometry import (
+    RTree, METRES_PER_DEGREE, SIMPLIFY_LEVELS, FULL_LEVEL, FULL_PRECISION, parse_geometry, bbox_of, area_m2,
+    to_geojson, from_geojson, contains, distance_to_bbox_m, simplify, simplified_levels, encode_polyline
+)
+from app.services.blob_store import get_blob_store
+from app.services.soracom_service import SoracomError, get_soracom_client
 from app.extensions import db
-from typing import Optional, Tuple, List, Dict, Any
+from sqlalchemy import insert, select, update, delete, event, func, text, inspect, tuple_, Float, Integer
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, load_only, undefer
+from typing import Optional, Tuple, List, Dict, Set, Any, Iterable, Iterator
+from datetime import datetime, timedelta, timezone
+from collections import deque
+from itertools import islice
+import bisect
+import hashlib
+import io
+import json
+import logging
+import math
+import re
+import select as select_module
+import threading
+import time
+import uuid
 
 
 class MultiControlService:
@@ -84,4 +115,2334 @@ class MultiControlService:
             return True, "Control deleted successfully"
         except Exception as e:
             db.session.rollback()
-            return False, str(e) 
\ No newline at end of file
+            return False, str(e) 
+
+
+class TelemetryService:
+    @staticmethod
+    def _chunks(events: Iterable[Any], size: int) -> Iterator[List[Any]]:
+        """Split an event iterable into lists of at most `size` items"""
+        iterator = iter(events)
+        while True:
+            chunk = list(islice(iterator, size))
+            if not chunk:
+                return
+            yield chunk
+
+    @staticmethod
+    def _parse_timestamp(value: Any) -> datetime:
+        """Parse an ISO-8601 event timestamp into naive UTC, defaulting to now"""
+        if not value:
+            return datetime.utcnow()
+        timestamp = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+        return timestamp
+
+    @staticmethod
+    def _resolve_controllers(controller_ids: Iterable[str]) -> Dict[str, Any]:
+        """Look up equipment rows for a set of controller ids in one query"""
+        rows = db.session.query(
+            Equipment.controller_id, Equipment.id, Equipment.account_id, Equipment.field_id
+        ).filter(Equipment.controller_id.in_(list(controller_ids))).all()
+        return {row.controller_id: row for row in rows}
+
+    @staticmethod
+    def ingest_events(events: Iterable[Any], batch_size: int = 1000) -> Tuple[bool, Dict[str, Any]]:
+        """Write controller events to `logs` with one multi-row INSERT per batch.
+
+        Each event is a dict keyed by `controller_id` with an optional
+        `event_type`, `event_data` and ISO `timestamp`. Equipment ids are
+        resolved once per batch and the whole request commits once.
+        """
+        started = time.perf_counter()
+        controllers: Dict[str, Any] = {}
+        rejected: List[Dict[str, Any]] = []
+        batch_latencies: List[float] = []
+        error_accounts = set()
+        inserted = 0
+        offset = 0
+
+        try:
+            for batch in TelemetryService._chunks(events, batch_size):
+                batch_started = time.perf_counter()
+
+                unknown = {
+                    item.get('controller_id') for item in batch
+                    if isinstance(item, dict) and item.get('controller_id')
+                } - controllers.keys()
+                if unknown:
+                    controllers.update(TelemetryService._resolve_controllers(unknown))
+
+                rows = []
+                for index, item in enumerate(batch, start=offset):
+                    if not isinstance(item, dict):
+                        rejected.append({"index": index, "error": "Invalid event"})
+                        continue
+                    controller_id = item.get('controller_id')
+                    equipment = controllers.get(controller_id)
+                    if not equipment:
+                        rejected.append({"index": index, "error": f"Unknown controller: {controller_id}"})
+                        continue
+                    try:
+                        timestamp = TelemetryService._parse_timestamp(item.get('timestamp'))
+                    except ValueError:
+                        rejected.append({"index": index, "error": "Invalid timestamp"})
+                        continue
+                    if item.get('event_data') is not None and not isinstance(item['event_data'], dict):
+                        rejected.append({"index": index, "error": "event_data must be an object"})
+                        continue
+
+                    event_data = dict(item.get('event_data') or {})
+                    event_data.setdefault('equipment_id', equipment.id)
+                    event_data.setdefault('controller_id', controller_id)
+                    rows.append({
+                        'account_id': equipment.account_id,
+                        'field_id': equipment.field_id,
+                        'event_type': item.get('event_type', 'telemetry'),
+                        'event_data': event_data,
+                        'timestamp': timestamp
+                    })
+
+                if rows:
+                    db.session.execute(insert(Log), rows)
+                    RollupService.apply(rows)
+                    inserted += len(rows)
+                    error_accounts.update(row['account_id'] for row in rows if row['event_type'] == 'error')
+
+                offset += len(batch)
+                batch_latencies.append((time.perf_counter() - batch_started) * 1000)
+
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return False, {"error": str(e)}
+        StatusService.cache.invalidate(*error_accounts)
+
+        elapsed = time.perf_counter() - started
+        return True, {
+            "received": offset,
+            "inserted": inserted,
+            "rejected": rejected,
+            "batches": len(batch_latencies),
+            "duration_ms": round(elapsed * 1000, 3),
+            "rows_per_second": round(inserted / elapsed, 1) if elapsed > 0 else None,
+            "batch_latency_ms": {
+                "max": round(max(batch_latencies), 3) if batch_latencies else 0,
+                "avg": round(sum(batch_latencies) / len(batch_latencies), 3) if batch_latencies else 0
+            }
+        }
+
+
+WATER_USAGE_GRANULARITIES = ('hour', 'day', 'week', 'month')
+
+ROLLUP_MODELS = ((WaterUsageHourly, 'hour'), (WaterUsageDaily, 'day'))
+
+
+def _truncate(value: datetime, granularity: str) -> datetime:
+    """Truncate a timestamp to the start of its hour or day bucket"""
+    value = value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0) if granularity == 'day' else value
+
+
+def _as_number(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class RollupService:
+    @staticmethod
+    def apply(rows: Iterable[Dict[str, Any]], connection: Any = None) -> None:
+        """Fold freshly inserted log rows into the hourly and daily rollups.
+
+        Only irrigation_event rows count. Each rollup table gets one
+        INSERT .. ON CONFLICT DO UPDATE that adds to the existing buckets,
+        executed on `connection` when given (flush-time hooks) or the session.
+        """
+        events = [row for row in rows if row.get('event_type') == 'irrigation_event']
+        if not events:
+            return
+        executor = connection if connection is not None else db.session
+
+        for model, granularity in ROLLUP_MODELS:
+            buckets: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+            for row in events:
+                data = row.get('event_data') or {}
+                try:
+                    zone_id = int(data.get('zone_id') or 0)
+                except (TypeError, ValueError):
+                    zone_id = 0
+                key = (
+                    row['account_id'], row['field_id'], zone_id,
+                    _truncate(row.get('timestamp') or datetime.utcnow(), granularity)
+                )
+                bucket = buckets.setdefault(key, {
+                    'account_id': key[0], 'field_id': key[1], 'zone_id': key[2], 'bucket': key[3],
+                    'water_volume': 0.0, 'duration': 0.0, 'event_count': 0
+                })
+                bucket['water_volume'] += _as_number(data.get('water_volume'))
+                bucket['duration'] += _as_number(data.get('duration'))
+                bucket['event_count'] += 1
+
+            stmt = pg_insert(model).values(list(buckets.values()))
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['account_id', 'field_id', 'zone_id', 'bucket'],
+                set_={
+                    'water_volume': model.water_volume + stmt.excluded.water_volume,
+                    'duration': model.duration + stmt.excluded.duration,
+                    'event_count': model.event_count + stmt.excluded.event_count
+                }
+            )
+            executor.execute(stmt)
+
+    @staticmethod
+    def rebuild(account_id: Optional[Any] = None) -> Dict[str, int]:
+        """Recompute the rollups from raw logs, for one account or all of them.
+
+        Rollups only ever grow: pruning log partitions leaves their buckets in
+        place, so usage history outlives raw-log retention. A rebuild starts
+        from the logs that remain and therefore discards pruned months.
+        """
+        counts = {}
+        for model, granularity in ROLLUP_MODELS:
+            clear = delete(model)
+            if account_id is not None:
+                clear = clear.where(model.account_id == account_id)
+            db.session.execute(clear)
+
+            bucket = func.date_trunc(granularity, Log.timestamp)
+            zone_id = func.coalesce(Log.event_data['zone_id'].astext.cast(Integer), 0)
+            source = select(
+                Log.account_id,
+                Log.field_id,
+                zone_id,
+                bucket,
+                func.coalesce(func.sum(Log.event_data['water_volume'].astext.cast(Float)), 0),
+                func.coalesce(func.sum(Log.event_data['duration'].astext.cast(Float)), 0),
+                func.count()
+            ).where(Log.event_type == 'irrigation_event')
+            if account_id is not None:
+                source = source.where(Log.account_id == account_id)
+            source = source.group_by(Log.account_id, Log.field_id, zone_id, bucket)
+
+            result = db.session.execute(insert(model).from_select(
+                ['account_id', 'field_id', 'zone_id', 'bucket', 'water_volume', 'duration', 'event_count'],
+                source
+            ))
+            counts[model.__tablename__] = result.rowcount
+        db.session.commit()
+        return counts
+
+    @staticmethod
+    def source_for(granularity: str, start_date: Optional[str], end_date: Optional[str]) -> Optional[Any]:
+        """Pick the rollup table that can answer a report, or None for raw logs.
+
+        Rollups are usable when both range bounds fall on bucket boundaries:
+        hour boundaries for hourly reports, midnight for everything coarser.
+        """
+        model, bucket_granularity = ROLLUP_MODELS[0] if granularity == 'hour' else ROLLUP_MODELS[1]
+        for value in (start_date, end_date):
+            if not value:
+                continue
+            try:
+                parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00')).replace(tzinfo=None)
+            except ValueError:
+                return None
+            if _truncate(parsed, bucket_granularity) != parsed:
+                return None
+        return model
+
+
+@event.listens_for(Field, 'after_delete')
+def _drop_field_rollups(mapper, connection, target):
+    """Rollups have no foreign key; forget the usage of a deleted field with it"""
+    for model, _ in ROLLUP_MODELS:
+        connection.execute(delete(model).where(model.field_id == target.id))
+
+
+@event.listens_for(Log, 'after_insert')
+def _rollup_log(mapper, connection, target):
+    """Keep rollups current for Log rows added through the ORM"""
+    RollupService.apply([{
+        'account_id': target.account_id,
+        'field_id': target.field_id,
+        'event_type': target.event_type,
+        'event_data': target.event_data,
+        'timestamp': target.timestamp
+    }], connection)
+
+
+class ReportService:
+    @staticmethod
+    def water_usage(account_id: Any, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                    field_id: Optional[Any] = None, granularity: str = 'day') -> Dict[str, Any]:
+        """Aggregate irrigation_event water volume per field and time bucket in SQL.
+
+        One GROUP BY (field_id, date_trunc(granularity, timestamp)) query is
+        issued; Python only folds the grouped rows, so the cost on this side
+        depends on the number of buckets rather than the number of logs.
+        When the range aligns with rollup buckets the query reads the
+        hourly/daily rollup tables instead of scanning `logs`. Either way
+        the range is half-open: start_date <= t < end_date.
+        """
+        if granularity not in WATER_USAGE_GRANULARITIES:
+            raise ValueError(f"Invalid granularity: {granularity}")
+
+        model = RollupService.source_for(granularity, start_date, end_date)
+        if model is not None:
+            bucket = func.date_trunc(granularity, model.bucket).label('bucket')
+            volume = func.coalesce(func.sum(model.water_volume), 0).label('water_volume')
+            query = db.session.query(model.field_id, bucket, volume).filter(model.account_id == account_id)
+            if field_id:
+                query = query.filter(model.field_id == field_id)
+            if start_date:
+                query = query.filter(model.bucket >= start_date)
+            if end_date:
+                query = query.filter(model.bucket < end_date)
+            group_field = model.field_id
+        else:
+            bucket = func.date_trunc(granularity, Log.timestamp).label('bucket')
+            volume = func.coalesce(
+                func.sum(Log.event_data['water_volume'].astext.cast(Float)), 0
+            ).label('water_volume')
+            query = db.session.query(Log.field_id, bucket, volume).filter(
+                Log.account_id == account_id,
+                Log.event_type == 'irrigation_event'
+            )
+            if field_id:
+                query = query.filter(Log.field_id == field_id)
+            if start_date:
+                query = query.filter(Log.timestamp >= start_date)
+            if end_date:
+                query = query.filter(Log.timestamp < end_date)
+            group_field = Log.field_id
+
+        rows = query.group_by(group_field, bucket).order_by(bucket).all()
+
+        usage_by_field: Dict[str, float] = {}
+        usage_by_date: Dict[str, float] = {}
+        for row in rows:
+            field_key = str(row.field_id)
+            date_key = row.bucket.isoformat()
+            usage_by_field[field_key] = usage_by_field.get(field_key, 0) + row.water_volume
+            usage_by_date[date_key] = usage_by_date.get(date_key, 0) + row.water_volume
+
+        return {
+            "total_water_usage": sum(usage_by_field.values()),
+            "usage_by_field": usage_by_field,
+            "usage_by_date": usage_by_date,
+            "granularity": granularity,
+            "source": model.__tablename__ if model is not None else "logs",
+            "period_start": start_date,
+            "period_end": end_date
+        }
+
+
+LOG_PARTITION_PATTERN = re.compile(r'^logs_(\d{4})_(\d{2})$')
+
+
+def _month_start(value: datetime, offset: int = 0) -> datetime:
+    """First instant of the month `offset` months after `value`"""
+    month = value.year * 12 + value.month - 1 + offset
+    return datetime(month // 12, month % 12 + 1, 1)
+
+
+class LogPartitionService:
+    @staticmethod
+    def partitions() -> List[Tuple[str, datetime]]:
+        """List the monthly logs partitions as (name, month start), oldest first"""
+        rows = db.session.execute(text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'logs'::regclass"
+        )).scalars()
+        result = []
+        for name in rows:
+            match = LOG_PARTITION_PATTERN.match(name)
+            if match:
+                result.append((name, datetime(int(match.group(1)), int(match.group(2)), 1)))
+        return sorted(result, key=lambda item: item[1])
+
+    @staticmethod
+    def ensure_partitions(months_ahead: int = 3, now: Optional[datetime] = None) -> List[str]:
+        """Create monthly partitions from the current month to `months_ahead` months out.
+
+        Rows already sitting in logs_default for a new month are moved into
+        the new table before it is attached, so the default partition never
+        blocks the ATTACH.
+        """
+        now = now or datetime.utcnow()
+        existing = {name for name, _ in LogPartitionService.partitions()}
+        created = []
+        for offset in range(months_ahead + 1):
+            start, end = _month_start(now, offset), _month_start(now, offset + 1)
+            name = f"logs_{start:%Y_%m}"
+            if name in existing:
+                continue
+            bounds = {"start": start, "end": end}
+            db.session.execute(text(
+                f"CREATE TABLE {name} (LIKE logs INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+            ))
+            db.session.execute(text(
+                f"WITH moved AS (DELETE FROM logs_default "
+                f"WHERE timestamp >= :start AND timestamp < :end RETURNING *) "
+                f"INSERT INTO {name} SELECT * FROM moved"
+            ), bounds)
+            db.session.execute(text(
+                f"ALTER TABLE logs ATTACH PARTITION {name} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            ))
+            created.append(name)
+        db.session.commit()
+        return created
+
+    @staticmethod
+    def drop_partitions(older_than_months: int, archive: bool = False,
+                        now: Optional[datetime] = None) -> List[str]:
+        """Remove whole monthly partitions that end before the retention cutoff.
+
+        With `archive` the partition is detached and renamed to
+        logs_archive_YYYY_MM instead of dropped.
+        """
+        cutoff = _month_start(now or datetime.utcnow(), -older_than_months)
+        removed = []
+        for name, start in LogPartitionService.partitions():
+            if _month_start(start, 1) > cutoff:
+                break
+            if archive:
+                db.session.execute(text(f"ALTER TABLE logs DETACH PARTITION {name}"))
+                db.session.execute(text(f"ALTER TABLE {name} RENAME TO logs_archive_{start:%Y_%m}"))
+            else:
+                db.session.execute(text(f"DROP TABLE {name}"))
+            removed.append(name)
+        db.session.commit()
+        return removed
+
+
+class StatusCache:
+    """Per-account TTL cache for system status payloads with hit/miss counters"""
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, account_id: Any, ttl: float) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(str(account_id))
+            if entry and time.monotonic() - entry[0] < ttl:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def set(self, account_id: Any, value: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[str(account_id)] = (time.monotonic(), value)
+
+    def invalidate(self, *account_ids: Any) -> None:
+        with self._lock:
+            for account_id in account_ids:
+                self._entries.pop(str(account_id), None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 3) if total else None,
+                "entries": len(self._entries)
+            }
+
+
+class StatusService:
+    cache = StatusCache()
+
+    @staticmethod
+    def status_query(account_id: Any):
+        """Build one SELECT returning equipment, active alert and 24h error counts"""
+        equipment = select(
+            func.count().label('total'),
+            func.count().filter(Equipment.status == 'ACTIVE').label('active')
+        ).where(Equipment.account_id == account_id).cte('equipment_counts')
+        active_alerts = select(func.count()).where(
+            Alert.account_id == account_id, Alert.resolved == False  # noqa: E712 - matches the partial index
+        ).scalar_subquery()
+        recent_errors = select(func.count()).where(
+            Log.account_id == account_id,
+            Log.event_type == 'error',
+            Log.timestamp >= datetime.utcnow() - timedelta(hours=24)
+        ).scalar_subquery()
+
+        return select(
+            equipment.c.total,
+            equipment.c.active,
+            active_alerts.label('active_alerts'),
+            recent_errors.label('recent_errors')
+        )
+
+    @staticmethod
+    def query_status(account_id: Any) -> Dict[str, Any]:
+        """Collect the status payload for an account in a single round trip"""
+        row = db.session.execute(StatusService.status_query(account_id)).one()
+
+        return {
+            "status": "operational" if row.active > 0 else "degraded",
+            "equipment": {
+                "total": row.total,
+                "active": row.active,
+                "inactive": row.total - row.active
+            },
+            "alerts": {
+                "active": row.active_alerts
+            },
+            "errors_24h": row.recent_errors,
+            "last_updated": datetime.utcnow().isoformat()
+        }
+
+    @staticmethod
+    def get_status(account_id: Any, ttl: float = 5) -> Dict[str, Any]:
+        """Return the cached status for an account, querying at most once per `ttl` seconds"""
+        status = StatusService.cache.get(account_id, ttl)
+        if status is None:
+            status = StatusService.query_status(account_id)
+            StatusService.cache.set(account_id, status)
+        return status
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_status_changes(session, flush_context):
+    """Note accounts whose cached status is affected by this flush"""
+    accounts = session.info.setdefault('status_accounts', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Equipment):
+            if obj in session.new or obj in session.deleted or inspect(obj).attrs.status.history.has_changes():
+                accounts.add(obj.account_id)
+        elif isinstance(obj, Alert):
+            if obj in session.new or obj in session.deleted or inspect(obj).attrs.resolved.history.has_changes():
+                accounts.add(obj.account_id)
+        elif isinstance(obj, Log) and obj.event_type == 'error':
+            accounts.add(obj.account_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_status(session):
+    accounts = session.info.pop('status_accounts', None)
+    if accounts:
+        StatusService.cache.invalidate(*accounts)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_status_changes(session):
+    session.info.pop('status_accounts', None)
+
+
+class InMemoryHashStore:
+    """Thread-safe stand-in for the Redis hash commands the presence tracker uses"""
+
+    def __init__(self):
+        self._hashes: Dict[str, Dict[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def hset(self, name: str, key: Optional[str] = None, value: Any = None,
+             mapping: Optional[Dict[str, Any]] = None) -> int:
+        items = dict(mapping or {})
+        if key is not None:
+            items[key] = value
+        with self._lock:
+            target = self._hashes.setdefault(name, {})
+            added = len(items.keys() - target.keys())
+            target.update({k: str(v) for k, v in items.items()})
+        return added
+
+    def hgetall(self, name: str) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._hashes.get(name, {}))
+
+    def hdel(self, name: str, *keys: str) -> int:
+        with self._lock:
+            target = self._hashes.get(name, {})
+            return sum(1 for key in keys if target.pop(key, None) is not None)
+
+
+def _decode(value: Any) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class PresenceService:
+    """Absorb controller heartbeats in a last-seen hash and persist only transitions.
+
+    Heartbeats only write `controller_id -> epoch seconds` into the store (an
+    in-process hash by default, or any Redis client). `flush` compares the
+    table against `Equipment.status` and issues at most two UPDATEs, one per
+    direction, for controllers whose presence actually changed.
+    """
+    HASH_KEY = 'multi_control:presence'
+    store: Any = InMemoryHashStore()
+    _flusher: Optional[threading.Thread] = None
+    _flusher_lock = threading.Lock()
+    _warned_in_memory = False
+
+    @classmethod
+    def configure(cls, redis_url: Optional[str] = None) -> None:
+        """Switch to a shared Redis hash when a URL is configured and redis is installed"""
+        if not redis_url:
+            return
+        try:
+            import redis
+        except ImportError:
+            logging.warning("PRESENCE_REDIS_URL is set but redis is not installed; using in-memory presence")
+            return
+        cls.store = redis.Redis.from_url(redis_url)
+
+    @classmethod
+    def heartbeat(cls, controller_ids: Iterable[str], seen_at: Optional[float] = None) -> int:
+        seen_at = seen_at or time.time()
+        mapping = {str(controller_id): seen_at for controller_id in controller_ids if controller_id}
+        if mapping:
+            cls.store.hset(cls.HASH_KEY, mapping=mapping)
+        return len(mapping)
+
+    @classmethod
+    def last_seen(cls) -> Dict[str, float]:
+        return {_decode(k): float(_decode(v)) for k, v in cls.store.hgetall(cls.HASH_KEY).items()}
+
+    @classmethod
+    def flush(cls, timeout: float = 90, now: Optional[float] = None) -> Dict[str, Any]:
+        """Batch-update Equipment.status for controllers that came online or timed out.
+
+        Only controllers present in the last-seen table are touched: a
+        controller that never sent a heartbeat keeps whatever status it has,
+        and one whose last heartbeat is older than `timeout` goes INACTIVE
+        and leaves the table.
+        """
+        now = now or time.time()
+        seen = cls.last_seen()
+        online = {controller_id for controller_id, ts in seen.items() if now - ts < timeout}
+        expired = [controller_id for controller_id in seen if controller_id not in online]
+        if not seen:
+            return {"online": 0, "activated": [], "deactivated": []}
+
+        rows = db.session.query(Equipment.controller_id, Equipment.account_id, Equipment.status).filter(
+            Equipment.controller_id.in_(list(seen))
+        ).all()
+
+        activate: Set[str] = set()
+        deactivate: Set[str] = set()
+        accounts = set()
+        for row in rows:
+            if row.controller_id in online:
+                if row.status != 'ACTIVE':
+                    activate.add(row.controller_id)
+                    accounts.add(row.account_id)
+            elif row.status != 'INACTIVE':
+                deactivate.add(row.controller_id)
+                accounts.add(row.account_id)
+
+        try:
+            if activate:
+                db.session.execute(update(Equipment).where(
+                    Equipment.controller_id.in_(activate)
+                ).values(status='ACTIVE'))
+            if deactivate:
+                db.session.execute(update(Equipment).where(
+                    Equipment.controller_id.in_(deactivate)
+                ).values(status='INACTIVE'))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        if expired:
+            cls.store.hdel(cls.HASH_KEY, *expired)
+        StatusService.cache.invalidate(*accounts)
+        if not ChangeFeed.default.running:  # otherwise the equipment trigger reports these
+            for row in rows:
+                if row.controller_id in activate or row.controller_id in deactivate:
+                    ChangeBroker.default.publish(row.account_id, 'equipment_status', {
+                        "controller_id": row.controller_id,
+                        "status": 'ACTIVE' if row.controller_id in activate else 'INACTIVE'
+                    })
+        return {
+            "online": len(online),
+            "activated": sorted(activate),
+            "deactivated": sorted(deactivate)
+        }
+
+    @classmethod
+    def ensure_flusher(cls, app: Any) -> None:
+        """Start the background flush thread for this process if it is not running"""
+        interval = app.config.get('PRESENCE_FLUSH_INTERVAL', 15)
+        if app.testing or interval <= 0:
+            return
+        if isinstance(cls.store, InMemoryHashStore) and app.config.get('WEB_WORKERS', 1) > 1:
+            # Each worker would only know its own heartbeats and deactivate the rest
+            if not cls._warned_in_memory:
+                logging.warning("Presence flushing is disabled: %s workers need PRESENCE_REDIS_URL",
+                                app.config.get('WEB_WORKERS'))
+                cls._warned_in_memory = True
+            return
+        with cls._flusher_lock:
+            if cls._flusher and cls._flusher.is_alive():
+                return
+            timeout = app.config.get('PRESENCE_TIMEOUT', 90)
+
+            def run():
+                while True:
+                    time.sleep(interval)
+                    with app.app_context():
+                        try:
+                            cls.flush(timeout)
+                        except Exception as e:
+                            logging.error("Error flushing equipment presence: %s", e)
+                        finally:
+                            db.session.remove()
+
+            cls._flusher = threading.Thread(target=run, name='presence-flusher', daemon=True)
+            cls._flusher.start()
+
+
+class ChangeBroker:
+    """In-process fan-out of per-account change events.
+
+    Events go into a bounded per-account history with a global increasing
+    id. Subscribers block on one shared condition and read whatever is newer
+    than the last id they saw, so a publish wakes every listener at once
+    and reconnecting clients can resume from `Last-Event-ID`.
+
+    Ids only mean something to the process that issued them, so clients see
+    them as `<epoch>-<id>` with a random epoch per broker; `resume_after`
+    treats an id from another worker or an earlier run as "from now".
+    """
+    default: 'ChangeBroker'
+
+    def __init__(self, history_size: int = 256):
+        self.history_size = history_size
+        self.epoch = uuid.uuid4().hex[:12]
+        self._history: Dict[str, deque] = {}
+        self._condition = threading.Condition()
+        self._last_id = 0
+
+    def publish(self, account_id: Any, event_type: str, data: Dict[str, Any]) -> int:
+        with self._condition:
+            self._last_id += 1
+            history = self._history.setdefault(str(account_id), deque(maxlen=self.history_size))
+            history.append({"id": self._last_id, "event": event_type, "data": data})
+            self._condition.notify_all()
+            return self._last_id
+
+    def last_id(self) -> int:
+        with self._condition:
+            return self._last_id
+
+    def event_id(self, last_id: int) -> str:
+        """Client-facing form of an event id"""
+        return f"{self.epoch}-{last_id}"
+
+    def resume_after(self, event_id: Optional[str]) -> int:
+        """Local id to resume after for a client-supplied event id; raises ValueError if malformed"""
+        if not event_id:
+            return self.last_id()
+        epoch, _, last_id = event_id.rpartition('-')
+        last_id = int(last_id)
+        if epoch != self.epoch:
+            return self.last_id()
+        return min(last_id, self.last_id())
+
+    def _since(self, account_id: str, after_id: int) -> List[Dict[str, Any]]:
+        return [item for item in self._history.get(account_id, ()) if item["id"] > after_id]
+
+    def wait(self, account_id: Any, after_id: int, timeout: float) -> List[Dict[str, Any]]:
+        """Return events newer than `after_id`, blocking up to `timeout` seconds for one"""
+        account_id = str(account_id)
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            events = self._since(account_id, after_id)
+            while not events:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+                events = self._since(account_id, after_id)
+            return events
+
+
+ChangeBroker.default = ChangeBroker()
+
+FIELD_LIVE_ATTRIBUTES = ('pressure', 'flow_rate', 'current_zone')
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_change_events(session, flush_context):
+    """Queue live-update events for the change broker until the transaction commits"""
+    events = session.info.setdefault('change_events', [])
+    for obj in session.dirty:
+        if isinstance(obj, Field):
+            state = inspect(obj)
+            changed = {name: getattr(obj, name) for name in FIELD_LIVE_ATTRIBUTES
+                       if state.attrs[name].history.has_changes()}
+            if changed:
+                events.append((obj.account_id, 'field', {"field_id": obj.id, **changed}))
+        elif isinstance(obj, Equipment) and inspect(obj).attrs.status.history.has_changes():
+            events.append((obj.account_id, 'equipment_status', {
+                "controller_id": obj.controller_id,
+                "status": obj.status
+            }))
+    for obj in session.new:
+        if isinstance(obj, Alert):
+            events.append((obj.account_id, 'alert', {
+                "id": obj.id,
+                "field_id": obj.field_id,
+                "alert_type": obj.alert_type,
+                "message": obj.message
+            }))
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_change_events(session):
+    events = session.info.pop('change_events', [])
+    if ChangeFeed.default.running:
+        return  # the NOTIFY triggers deliver these to every worker, this one included
+    for account_id, event_type, data in events:
+        ChangeBroker.default.publish(account_id, event_type, data)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_change_events(session):
+    session.info.pop('change_events', None)
+
+
+class ChangeFeed:
+    """One LISTEN connection per worker, fanned out to in-process subscribers.
+
+    Subscribers are callables taking the decoded notification
+    (`table`, `op`, `account_id`, `id`, `data`); they run on the listener
+    thread and must not block.
+    """
+    default: 'ChangeFeed'
+
+    def __init__(self, channel: str = CHANGE_FEED_CHANNEL):
+        self.channel = channel
+        self._subscribers: Dict[int, Tuple[Any, Optional[Set[str]]]] = {}
+        self._lock = threading.Lock()
+        self._next_token = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._ready = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._ready.is_set() and self._thread is not None and self._thread.is_alive()
+
+    @staticmethod
+    def install_triggers() -> None:
+        db.session.execute(text(CHANGE_FEED_SQL))
+        db.session.commit()
+
+    def subscribe(self, callback: Any, tables: Optional[Iterable[str]] = None) -> int:
+        with self._lock:
+            self._next_token += 1
+            self._subscribers[self._next_token] = (callback, set(tables) if tables else None)
+            return self._next_token
+
+    def unsubscribe(self, token: int) -> None:
+        with self._lock:
+            self._subscribers.pop(token, None)
+
+    def dispatch(self, payload: str) -> None:
+        try:
+            change = json.loads(payload)
+        except ValueError:
+            logging.warning("Ignoring malformed change notification: %s", payload)
+            return
+        with self._lock:
+            subscribers = list(self._subscribers.values())
+        for callback, tables in subscribers:
+            if tables is not None and change.get('table') not in tables:
+                continue
+            try:
+                callback(change)
+            except Exception as e:
+                logging.error("Change feed subscriber failed: %s", e)
+
+    def start(self, app: Any) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen, args=(app,), name='change-feed', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._ready.clear()
+
+    def wait_ready(self, timeout: float) -> bool:
+        return self._ready.wait(timeout)
+
+    def _listen(self, app: Any) -> None:
+        backoff = 1
+        while not self._stop.is_set():
+            connection = None
+            try:
+                with app.app_context():
+                    connection = db.engine.raw_connection()
+                connection.detach()  # LISTEN state must never go back into the pool
+                raw = connection.driver_connection
+                raw.autocommit = True
+                raw.cursor().execute(f"LISTEN {self.channel}")
+                self._ready.set()
+                backoff = 1
+                while not self._stop.is_set():
+                    if not select_module.select([raw], [], [], 1.0)[0]:
+                        continue
+                    raw.poll()
+                    while raw.notifies:
+                        self.dispatch(raw.notifies.pop(0).payload)
+            except Exception as e:
+                logging.error("Change feed listener error, reconnecting in %ss: %s", backoff, e)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30)
+            finally:
+                self._ready.clear()
+                if connection is not None:
+                    connection.close()
+
+
+ChangeFeed.default = ChangeFeed()
+
+
+def _bridge_change(change: Dict[str, Any]) -> None:
+    """Feed notifications into the SSE broker and status cache of this worker"""
+    table, account_id, data = change.get('table'), change.get('account_id'), change.get('data') or {}
+    if table in ('equipment', 'alerts') or (table == 'logs' and data.get('event_type') == 'error'):
+        StatusService.cache.invalidate(account_id)
+
+    if table == 'fields' and change.get('op') == 'update':
+        ChangeBroker.default.publish(account_id, 'field', {"field_id": change['id'], **data})
+    elif table == 'equipment':
+        ChangeBroker.default.publish(account_id, 'equipment_status', data)
+    elif table == 'alerts' and change.get('op') == 'insert':
+        ChangeBroker.default.publish(account_id, 'alert', {
+            "id": change['id'], "field_id": data.get('field_id'),
+            "alert_type": data.get('alert_type'), "message": data.get('message')
+        })
+
+
+ChangeFeed.default.subscribe(_bridge_change, tables=('fields', 'equipment', 'alerts', 'logs'))
+
+
+class GeometryService:
+    """Persist parsed field/zone shapes and answer spatial lookups from per-account R-trees.
+
+    Each worker keeps one index per account, rebuilt from `geometries` on
+    first use after a local change or once GEOMETRY_INDEX_TTL has passed
+    (which bounds staleness for changes made by other workers).
+    """
+    _indexes: Dict[str, Tuple[float, Dict[str, RTree]]] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def extract(owner: Any, owner_type: str, kind: str, digest: str) -> Dict[str, Any]:
+        """Parse an uploaded blob and upsert the owner's geometry row.
+
+        Zones take their `area` from the parsed polygons. Raises
+        GeometryError when the file has no usable polygons; the caller commits.
+        """
+        with get_blob_store().open(digest) as blob:
+            polygons = parse_geometry(blob.read(), kind)
+        bbox = bbox_of(polygons)
+        area = area_m2(polygons)
+
+        geometry = Geometry.query.filter_by(owner_type=owner_type, owner_id=owner.id).first()
+        if not geometry:
+            geometry = Geometry(account_id=owner.account_id, owner_type=owner_type, owner_id=owner.id)
+            db.session.add(geometry)
+        geometry.source = kind
+        geometry.digest = digest
+        geometry.geojson = to_geojson(polygons)
+        geometry.simplified = simplified_levels(polygons)
+        geometry.min_lon, geometry.min_lat, geometry.max_lon, geometry.max_lat = bbox
+        geometry.area = area
+        if owner_type == 'zone':
+            owner.area = area
+
+        return {"polygons": len(polygons), "bbox": list(bbox), "area_m2": round(area, 2)}
+
+    @staticmethod
+    def clear(owner: Any, owner_type: str) -> None:
+        """Forget the owner's shape after an upload that could not be parsed replaced it.
+
+        The index is invalidated on commit like any other geometry change;
+        the caller commits.
+        """
+        geometry = Geometry.query.filter_by(owner_type=owner_type, owner_id=owner.id).first()
+        if geometry:
+            db.session.delete(geometry)
+        if owner_type == 'zone':
+            owner.area = None
+
+    @classmethod
+    def invalidate(cls, *account_ids: Any) -> None:
+        with cls._lock:
+            for account_id in account_ids:
+                cls._indexes.pop(str(account_id), None)
+
+    @classmethod
+    def index(cls, account_id: Any, ttl: float = 300) -> Dict[str, RTree]:
+        key = str(account_id)
+        with cls._lock:
+            cached = cls._indexes.get(key)
+        if cached and time.monotonic() - cached[0] < ttl:
+            return cached[1]
+
+        entries: Dict[str, List[Tuple[Any, Dict[str, Any]]]] = {'field': [], 'zone': []}
+        for geometry in Geometry.query.options(undefer(Geometry.geojson)).filter_by(account_id=account_id):
+            bbox = (geometry.min_lon, geometry.min_lat, geometry.max_lon, geometry.max_lat)
+            entries.setdefault(geometry.owner_type, []).append((bbox, {
+                "id": geometry.owner_id,
+                "bbox": bbox,
+                "area_m2": geometry.area,
+                "polygons": from_geojson(geometry.geojson)
+            }))
+        trees = {owner_type: RTree(items) for owner_type, items in entries.items()}
+        with cls._lock:
+            cls._indexes[key] = (time.monotonic(), trees)
+        return trees
+
+    @classmethod
+    def locate_zones(cls, account_id: Any, lon: float, lat: float, ttl: float = 300) -> List[Dict[str, Any]]:
+        """Zones whose polygons contain the point"""
+        candidates = cls.index(account_id, ttl)['zone'].query_point(lon, lat)
+        return [
+            {"zone_id": item["id"], "area_m2": item["area_m2"]}
+            for item in candidates if contains(item["polygons"], lon, lat)
+        ]
+
+    @classmethod
+    def nearby_fields(cls, account_id: Any, lon: float, lat: float, radius_m: float,
+                      ttl: float = 300) -> List[Dict[str, Any]]:
+        """Fields whose outline lies within `radius_m` of the point, nearest first"""
+        dlat = radius_m / METRES_PER_DEGREE
+        dlon = dlat / max(math.cos(math.radians(lat)), 1e-6)
+        candidates = cls.index(account_id, ttl)['field'].query((lon - dlon, lat - dlat, lon + dlon, lat + dlat))
+        result = []
+        for item in candidates:
+            distance = 0.0 if contains(item["polygons"], lon, lat) else distance_to_bbox_m(item["bbox"], lon, lat)
+            if distance <= radius_m:
+                result.append({"field_id": item["id"], "distance_m": round(distance, 1), "area_m2": item["area_m2"]})
+        return sorted(result, key=lambda entry: entry["distance_m"])
+
+    @staticmethod
+    def _outline_query(account_id: Any, owner_type: Optional[str] = None):
+        query = Geometry.query.filter_by(account_id=account_id)
+        if owner_type:
+            query = query.filter_by(owner_type=owner_type)
+        return query.order_by(Geometry.owner_type, Geometry.owner_id)
+
+    @classmethod
+    def outlines_etag(cls, account_id: Any, level: str, encoding: str, owner_type: Optional[str] = None) -> str:
+        """Validator for an outline collection, computed without loading any shape data"""
+        rows = cls._outline_query(account_id, owner_type).options(load_only(
+            Geometry.owner_type, Geometry.owner_id, Geometry.digest, Geometry.updated_at
+        ))
+        key = hashlib.sha1(f"{level}:{encoding}".encode())
+        for row in rows:
+            key.update(f"|{row.owner_type}:{row.owner_id}:{row.digest}:{row.updated_at.isoformat()}".encode())
+        return key.hexdigest()
+
+    @classmethod
+    def outlines(cls, account_id: Any, level: str, encoding: str = 'geojson',
+                 owner_type: Optional[str] = None) -> Dict[str, Any]:
+        """Field/zone outlines as a GeoJSON FeatureCollection at a precomputed simplification level.
+
+        With encoding='polyline' each ring is a Google-encoded polyline string
+        at the level's precision instead of a coordinate array.
+        """
+        column = Geometry.geojson if level == FULL_LEVEL else Geometry.simplified
+        precision = FULL_PRECISION if level == FULL_LEVEL else SIMPLIFY_LEVELS[level][1]
+        features = []
+        for geometry in cls._outline_query(account_id, owner_type).options(undefer(column)):
+            if level == FULL_LEVEL:
+                coordinates = to_geojson(from_geojson(geometry.geojson), precision)["coordinates"]
+            elif geometry.simplified and level in geometry.simplified:
+                coordinates = geometry.simplified[level]
+            else:
+                # Rows parsed before levels were precomputed
+                coordinates = to_geojson(
+                    simplify(from_geojson(geometry.geojson), SIMPLIFY_LEVELS[level][0]), precision
+                )["coordinates"]
+            if encoding == 'polyline':
+                coordinates = [[encode_polyline(ring, precision) for ring in polygon] for polygon in coordinates]
+            features.append({
+                "type": "Feature",
+                "id": f"{geometry.owner_type}:{geometry.owner_id}",
+                "bbox": [round(value, precision) for value in
+                         (geometry.min_lon, geometry.min_lat, geometry.max_lon, geometry.max_lat)],
+                "properties": {
+                    "owner_type": geometry.owner_type,
+                    "owner_id": geometry.owner_id,
+                    "area_m2": round(geometry.area, 1)
+                },
+                "geometry": {"type": "MultiPolygon", "coordinates": coordinates}
+            })
+        collection = {"type": "FeatureCollection", "level": level, "features": features}
+        if encoding == 'polyline':
+            collection.update({"encoding": "polyline", "precision": precision})
+        return collection
+
+
+@event.listens_for(Field, 'after_delete')
+@event.listens_for(Zone, 'after_delete')
+def _delete_owner_geometry(mapper, connection, target):
+    owner_type = 'field' if isinstance(target, Field) else 'zone'
+    connection.execute(delete(Geometry).where(
+        Geometry.owner_type == owner_type, Geometry.owner_id == target.id
+    ))
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_geometry_changes(session, flush_context):
+    accounts = session.info.setdefault('geometry_accounts', set())
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Geometry):
+            accounts.add(obj.account_id)
+    for obj in session.deleted:
+        if isinstance(obj, (Geometry, Field, Zone)):
+            accounts.add(obj.account_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_geometry_indexes(session):
+    accounts = session.info.pop('geometry_accounts', None)
+    if accounts:
+        GeometryService.invalidate(*accounts)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_geometry_changes(session):
+    session.info.pop('geometry_accounts', None)
+
+
+class _ChunkReader(io.RawIOBase):
+    """Seekable read-only stream over a firmware's chunk blobs, one chunk open at a time"""
+
+    def __init__(self, store, chunks: Iterable[FirmwareChunk]):
+        self.store = store
+        self.chunks = sorted(chunks, key=lambda chunk: chunk.offset)
+        self.starts = [chunk.offset for chunk in self.chunks]
+        self.size = self.chunks[-1].offset + self.chunks[-1].size if self.chunks else 0
+        self.position = 0
+        self.current = None  # (chunk index, open blob)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.size}[whence]
+        self.position = max(base + offset, 0)
+        return self.position
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer).cast('B')
+        filled = 0
+        while filled < len(view) and self.position < self.size:
+            index = bisect.bisect_right(self.starts, self.position) - 1
+            chunk = self.chunks[index]
+            if self.current is None or self.current[0] != index:
+                self._close_current()
+                self.current = (index, self.store.open(chunk.digest))
+            blob = self.current[1]
+            blob.seek(self.position - chunk.offset)
+            end = min(len(view), filled + chunk.offset + chunk.size - self.position)
+            count = blob.readinto(view[filled:end])
+            if not count:
+                raise IOError(f"Chunk {chunk.digest} is shorter than recorded")
+            self.position += count
+            filled += count
+        return filled
+
+    def _close_current(self) -> None:
+        if self.current is not None:
+            self.current[1].close()
+            self.current = None
+
+    def close(self) -> None:
+        self._close_current()
+        super().close()
+
+
+class FirmwareStorageService:
+    """Firmware images stored as fixed-size, content-addressed chunks.
+
+    Chunks are blob store entries keyed by their own sha256, so an image
+    uploaded to several accounts (or sharing blocks with another release)
+    is stored once, and only once: downloads and Range requests are served
+    straight from the chunks through a seekable reader. Legacy inline images
+    are moved into chunks by the `chunk_firmware` CLI; until then they are
+    not served.
+    """
+
+    @staticmethod
+    def store(firmware: Firmware, stream, chunk_size: int = 256 * 1024) -> None:
+        """Split a readable binary stream into chunks and record them on `firmware`; the caller commits"""
+        store = get_blob_store()
+        image_hash = hashlib.sha256()
+        chunks = []
+        offset = 0
+        while True:
+            data = stream.read(chunk_size)
+            if not data:
+                break
+            image_hash.update(data)
+            digest, size = store.put_bytes(data)
+            chunks.append(FirmwareChunk(seq=len(chunks), offset=offset, size=size, digest=digest))
+            offset += size
+
+        firmware.chunks = chunks
+        firmware.chunk_size = chunk_size
+        firmware.sha256 = image_hash.hexdigest()
+        firmware.file_size = offset
+
+    @classmethod
+    def ensure_chunked(cls, firmware: Firmware, chunk_size: int = 256 * 1024) -> bool:
+        """Move a legacy inline image into chunks. Returns True if the row changed; the caller commits"""
+        if firmware.sha256:
+            return False
+        if firmware.file_data is None:
+            raise FileNotFoundError(f"Firmware {firmware.id} has no image")
+        cls.store(firmware, io.BytesIO(firmware.file_data), chunk_size)
+        firmware.file_data = None
+        return True
+
+    @staticmethod
+    def open(firmware: Firmware) -> _ChunkReader:
+        """Seekable binary stream over the whole image"""
+        if not firmware.sha256:
+            raise FileNotFoundError(f"Firmware {firmware.id} has not been chunked")
+        return _ChunkReader(get_blob_store(), firmware.chunks)
+
+    @staticmethod
+    def manifest(firmware: Firmware) -> Dict[str, Any]:
+        return {
+            "firmware_id": firmware.id,
+            "version": firmware.version,
+            "size": firmware.file_size,
+            "sha256": firmware.sha256,
+            "chunk_size": firmware.chunk_size,
+            "chunks": [
+                {"offset": chunk.offset, "size": chunk.size, "sha256": chunk.digest}
+                for chunk in firmware.chunks
+            ]
+        }
+
+
+# Per-target advisory lock (key | target id) so a delta is only ever built by one worker
+DELTA_LOCK_KEY = 0x6d636466 << 32
+
+
+class FirmwareDeltaService:
+    """Binary deltas between releases of the same equipment's firmware, built once and cached.
+
+    Deltas are stored in the blob store and recorded in `firmware_deltas`;
+    a pair whose delta is not at least `max_ratio` smaller than the target
+    image is recorded with no digest so it is never recomputed. Downloads
+    never build one: a miss is queued with `build_later` and served the full
+    image meanwhile.
+    """
+    _building: Set[Tuple[int, int]] = set()
+    _building_lock = threading.Lock()
+
+    @staticmethod
+    def previous_release(firmware: Firmware) -> Optional[Firmware]:
+        return Firmware.query.filter(
+            Firmware.equipment_id == firmware.equipment_id,
+            Firmware.release_date < firmware.release_date
+        ).order_by(Firmware.release_date.desc()).first()
+
+    @staticmethod
+    def source_for(target: Firmware, version: str) -> Optional[Firmware]:
+        """The older release of the same equipment a controller reports it is running"""
+        return Firmware.query.filter(
+            Firmware.equipment_id == target.equipment_id,
+            Firmware.version == version,
+            Firmware.id != target.id,
+            Firmware.release_date <= target.release_date
+        ).order_by(Firmware.release_date.desc()).first()
+
+    @staticmethod
+    def cached(source: Firmware, target: Firmware) -> Optional[FirmwareDelta]:
+        return FirmwareDelta.query.filter_by(source_id=source.id, target_id=target.id).first()
+
+    @classmethod
+    def get_or_create(cls, source: Firmware, target: Firmware, max_ratio: float = 0.5) -> FirmwareDelta:
+        delta_row = cls.cached(source, target)
+        if delta_row:
+            return delta_row
+
+        # Whoever waited on the lock finds the row the holder committed
+        db.session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": DELTA_LOCK_KEY | target.id})
+        delta_row = cls.cached(source, target)
+        if delta_row:
+            db.session.commit()
+            return delta_row
+
+        with FirmwareStorageService.open(source) as f:
+            old = f.read()
+        with FirmwareStorageService.open(target) as f:
+            new = f.read()
+
+        delta = make_delta(old, new)
+        apply_delta(old, delta)  # never cache a delta that does not reproduce the target
+        digest = None
+        if len(delta) <= len(new) * max_ratio:
+            digest, _ = get_blob_store().put_bytes(delta)
+
+        # Another worker may have built the same pair meanwhile; either row is equivalent
+        db.session.execute(pg_insert(FirmwareDelta).values(
+            source_id=source.id, target_id=target.id, digest=digest, size=len(delta), created_at=datetime.utcnow()
+        ).on_conflict_do_nothing(constraint='uix_firmware_deltas_pair'))
+        db.session.commit()
+        return FirmwareDelta.query.filter_by(source_id=source.id, target_id=target.id).one()
+
+    @classmethod
+    def build_later(cls, app: Any, source: Firmware, target: Firmware) -> None:
+        """Build a missing delta off the request thread; inline under tests"""
+        pair = (source.id, target.id)
+        max_ratio = app.config.get('FIRMWARE_DELTA_MAX_RATIO', 0.5)
+        if app.testing:
+            cls.get_or_create(source, target, max_ratio)
+            return
+        with cls._building_lock:
+            if pair in cls._building:
+                return
+            cls._building.add(pair)
+
+        def run():
+            with app.app_context():
+                try:
+                    cls.get_or_create(db.session.get(Firmware, pair[0]), db.session.get(Firmware, pair[1]),
+                                      max_ratio)
+                except Exception as e:
+                    logging.error("Error building firmware delta %s -> %s: %s", pair[0], pair[1], e)
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+                    with cls._building_lock:
+                        cls._building.discard(pair)
+
+        threading.Thread(target=run, name='firmware-delta', daemon=True).start()
+
+
+# Serializes rollout ticks across workers so the global download cap holds
+ROLLOUT_LOCK_KEY = 0x6d63726f
+ROLLOUT_TARGET_STATUSES = ('pending', 'downloading', 'succeeded', 'failed', 'skipped')
+
+
+class RolloutService:
+    """Staged firmware rollouts.
+
+    Targets are split into waves of `wave_size` equipment. A wave only
+    starts once every target in the previous one has finished, and within a
+    wave at most `max_concurrency` downloads run at a time, further capped by
+    a global limit shared by every rollout. When the failed share of finished
+    targets passes `error_threshold` the rollout pauses for an operator.
+    Request handlers only create rows; `tick` does all the dispatching.
+    """
+    _worker: Optional[threading.Thread] = None
+    _worker_lock = threading.Lock()
+
+    @staticmethod
+    def resolve_targets(account_id: Any, field_ids: Optional[List[int]] = None,
+                        equipment_ids: Optional[List[int]] = None) -> List[int]:
+        """Equipment ids for a rollout: an explicit list, the equipment of some fields, or the whole account"""
+        query = db.session.query(Equipment.id).filter(Equipment.account_id == account_id)
+        if equipment_ids:
+            query = query.filter(Equipment.id.in_(equipment_ids))
+        elif field_ids:
+            query = query.filter(Equipment.field_id.in_(field_ids))
+        return [equipment_id for (equipment_id,) in query.order_by(Equipment.id)]
+
+    @staticmethod
+    def create(firmware: Firmware, account_id: Any, equipment_ids: List[int], wave_size: int,
+               max_concurrency: int, error_threshold: float, min_samples: int) -> FirmwareRollout:
+        rollout = FirmwareRollout(
+            account_id=account_id, firmware_id=firmware.id, status='running', wave_size=wave_size,
+            max_concurrency=max_concurrency, error_threshold=error_threshold, min_samples=min_samples
+        )
+        db.session.add(rollout)
+        db.session.flush()
+        db.session.execute(insert(FirmwareRolloutTarget), [
+            {'rollout_id': rollout.id, 'equipment_id': equipment_id, 'wave': index // wave_size,
+             'status': 'pending', 'attempts': 0}
+            for index, equipment_id in enumerate(equipment_ids)
+        ])
+        db.session.commit()
+        return rollout
+
+    @staticmethod
+    def counts(rollout_id: int) -> Dict[str, int]:
+        counts = dict.fromkeys(ROLLOUT_TARGET_STATUSES, 0)
+        rows = db.session.query(FirmwareRolloutTarget.status, func.count()).filter(
+            FirmwareRolloutTarget.rollout_id == rollout_id
+        ).group_by(FirmwareRolloutTarget.status)
+        counts.update(dict(rows))
+        return counts
+
+    @classmethod
+    def progress(cls, rollout: FirmwareRollout) -> Dict[str, Any]:
+        counts = cls.counts(rollout.id)
+        current_wave = db.session.query(func.min(FirmwareRolloutTarget.wave)).filter(
+            FirmwareRolloutTarget.rollout_id == rollout.id,
+            FirmwareRolloutTarget.status.in_(('pending', 'downloading'))
+        ).scalar()
+        return {
+            "id": rollout.id,
+            "account_id": rollout.account_id,
+            "firmware_id": rollout.firmware_id,
+            "status": rollout.status,
+            "paused_reason": rollout.paused_reason,
+            "wave_size": rollout.wave_size,
+            "max_concurrency": rollout.max_concurrency,
+            "error_threshold": rollout.error_threshold,
+            "current_wave": current_wave,
+            "targets": counts,
+            "created_at": rollout.created_at.isoformat(),
+            "completed_at": rollout.completed_at.isoformat() if rollout.completed_at else None
+        }
+
+    @classmethod
+    def tick(cls, max_downloads: int, target_timeout: float, now: Optional[datetime] = None) -> Dict[int, int]:
+        """Advance every running rollout once. Returns {rollout_id: downloads started}"""
+        now = now or datetime.utcnow()
+        db.session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ROLLOUT_LOCK_KEY})
+
+        db.session.execute(update(FirmwareRolloutTarget).where(
+            FirmwareRolloutTarget.status == 'downloading',
+            FirmwareRolloutTarget.started_at < now - timedelta(seconds=target_timeout)
+        ).values(status='failed', error='timeout', finished_at=now))
+
+        # Downloads of paused rollouts still occupy the network, so they count against the cap
+        budget = max_downloads - db.session.query(func.count(FirmwareRolloutTarget.id)).filter(
+            FirmwareRolloutTarget.status == 'downloading'
+        ).scalar()
+
+        started = {}
+        for rollout in FirmwareRollout.query.filter_by(status='running').order_by(FirmwareRollout.id):
+            counts = cls.counts(rollout.id)
+            finished = counts['succeeded'] + counts['failed']
+            if finished >= rollout.min_samples and counts['failed'] > finished * rollout.error_threshold:
+                rollout.status = 'paused'
+                rollout.paused_reason = f"{counts['failed']} of {finished} updates failed"
+                continue
+            if counts['pending'] + counts['downloading'] == 0:
+                rollout.status = 'completed'
+                rollout.completed_at = now
+                continue
+
+            slots = min(rollout.max_concurrency - counts['downloading'], budget)
+            if slots <= 0:
+                continue
+            wave = db.session.query(func.min(FirmwareRolloutTarget.wave)).filter(
+                FirmwareRolloutTarget.rollout_id == rollout.id,
+                FirmwareRolloutTarget.status.in_(('pending', 'downloading'))
+            ).scalar()
+            targets = db.session.query(FirmwareRolloutTarget, Equipment).join(
+                Equipment, Equipment.id == FirmwareRolloutTarget.equipment_id
+            ).filter(
+                FirmwareRolloutTarget.rollout_id == rollout.id,
+                FirmwareRolloutTarget.wave == wave,
+                FirmwareRolloutTarget.status == 'pending',
+                Equipment.status == 'ACTIVE'
+            ).order_by(FirmwareRolloutTarget.id).limit(slots).all()
+
+            if not targets and counts['downloading'] == 0:
+                # Only offline equipment is left in this wave; skip it rather than stall the rollout
+                db.session.execute(update(FirmwareRolloutTarget).where(
+                    FirmwareRolloutTarget.rollout_id == rollout.id,
+                    FirmwareRolloutTarget.wave == wave,
+                    FirmwareRolloutTarget.status == 'pending'
+                ).values(status='skipped', error='offline', finished_at=now))
+                continue
+
+            for target, equipment in targets:
+                target.status = 'downloading'
+                target.started_at = now
+                target.attempts += 1
+                db.session.add(Log(
+                    account_id=equipment.account_id,
+                    field_id=equipment.field_id,
+                    event_type='firmware_update',
+                    event_data={
+                        'equipment_id': equipment.id,
+                        'controller_id': equipment.controller_id,
+                        'firmware_id': rollout.firmware_id,
+                        'firmware_version': rollout.firmware.version,
+                        'sha256': rollout.firmware.sha256,
+                        'rollout_id': rollout.id,
+                        'status': 'initiated'
+                    },
+                    timestamp=now
+                ))
+            budget -= len(targets)
+            started[rollout.id] = len(targets)
+
+        db.session.commit()
+        return started
+
+    @staticmethod
+    def report(equipment: Equipment, firmware_id: int, succeeded: bool,
+               error: Optional[str] = None) -> Optional[FirmwareRolloutTarget]:
+        """Record a controller's update result against its in-flight rollout target; the caller commits"""
+        target = FirmwareRolloutTarget.query.join(FirmwareRollout).filter(
+            FirmwareRolloutTarget.equipment_id == equipment.id,
+            FirmwareRolloutTarget.status == 'downloading',
+            FirmwareRollout.firmware_id == firmware_id
+        ).first()
+        if target:
+            target.status = 'succeeded' if succeeded else 'failed'
+            target.error = None if succeeded else (error or 'failed')[:255]
+            target.finished_at = datetime.utcnow()
+        return target
+
+    @staticmethod
+    def set_status(rollout: FirmwareRollout, status: str) -> Tuple[bool, Dict[str, Any]]:
+        allowed = {
+            'paused': ('running',),
+            'running': ('paused',),
+            'cancelled': ('running', 'paused'),
+        }
+        if rollout.status not in allowed[status]:
+            return False, {"error": f"Cannot change a {rollout.status} rollout to {status}"}
+        rollout.status = status
+        rollout.paused_reason = 'paused by operator' if status == 'paused' else None
+        if status == 'cancelled':
+            db.session.execute(update(FirmwareRolloutTarget).where(
+                FirmwareRolloutTarget.rollout_id == rollout.id,
+                FirmwareRolloutTarget.status == 'pending'
+            ).values(status='skipped', error='cancelled', finished_at=datetime.utcnow()))
+        db.session.commit()
+        return True, {"message": f"Rollout {status}", "status": status}
+
+    @classmethod
+    def ensure_worker(cls, app: Any) -> None:
+        """Start the background rollout thread for this process if it is not running"""
+        interval = app.config.get('ROLLOUT_TICK_INTERVAL', 10)
+        if app.testing or interval <= 0:
+            return
+        with cls._worker_lock:
+            if cls._worker and cls._worker.is_alive():
+                return
+            max_downloads = app.config.get('ROLLOUT_MAX_CONCURRENT_DOWNLOADS', 50)
+            target_timeout = app.config.get('ROLLOUT_TARGET_TIMEOUT', 1800)
+
+            def run():
+                while True:
+                    time.sleep(interval)
+                    with app.app_context():
+                        try:
+                            cls.tick(max_downloads, target_timeout)
+                        except Exception as e:
+                            logging.error("Error advancing firmware rollouts: %s", e)
+                            db.session.rollback()
+                        finally:
+                            db.session.remove()
+
+            cls._worker = threading.Thread(target=run, name='firmware-rollouts', daemon=True)
+            cls._worker.start()
+
+
+SIM_SYNC_COLUMNS = (
+    'iccid', 'msisdn', 'status', 'speed_class', 'group_id', 'online', 'tags', 'controller_id', 'modified_at'
+)
+
+
+class SimSyncService:
+    """Mirror the Soracom subscriber list into `sims`, writing only rows that changed.
+
+    The list is fetched as one paginated listing per status filter, with the
+    listings running concurrently on the pooled Soracom client. Each
+    subscriber is reduced to the fields we keep and hashed; only rows whose
+    hash differs from the stored one are upserted, in batches.
+    """
+    _thread: Optional[threading.Thread] = None
+    _thread_lock = threading.Lock()
+
+    @staticmethod
+    def normalize(subscriber: Dict[str, Any], controller_tag: str = 'controller_id') -> Dict[str, Any]:
+        tags = subscriber.get('tags') or {}
+        modified = subscriber.get('lastModifiedAt')
+        row = {
+            'imsi': subscriber['imsi'],
+            'iccid': subscriber.get('iccid'),
+            'msisdn': subscriber.get('msisdn'),
+            'status': subscriber.get('status'),
+            'speed_class': subscriber.get('speedClass'),
+            'group_id': subscriber.get('groupId'),
+            'online': (subscriber.get('sessionStatus') or {}).get('online'),
+            'tags': tags,
+            'controller_id': tags.get(controller_tag),
+            'modified_at': datetime.utcfromtimestamp(modified / 1000) if modified else None,
+        }
+        row['content_hash'] = hashlib.sha256(
+            json.dumps(row, sort_keys=True, default=str).encode()
+        ).hexdigest()
+        return row
+
+    @classmethod
+    def sync(cls, client: Any, statuses: Iterable[str] = (), page_size: int = 100, batch_size: int = 500,
+             controller_tag: str = 'controller_id') -> SimSyncRun:
+        run = SimSyncRun(status='running', started_at=datetime.utcnow())
+        db.session.add(run)
+        db.session.commit()
+        started = time.perf_counter()
+
+        def fetch(status: str) -> List[Dict[str, Any]]:
+            params = {'status_filter': status} if status else None
+            return [subscriber for page in client.iter_pages('/subscribers', params, page_size) for subscriber in page]
+
+        errors: List[str] = []
+        remote: Dict[str, Dict[str, Any]] = {}
+        try:
+            partitions = client.map(fetch, list(statuses) or [''])
+            errors = [f"{status or 'all'}: {result}" for status, result in partitions.items()
+                      if isinstance(result, SoracomError)]
+
+            for result in partitions.values():
+                if isinstance(result, SoracomError):
+                    continue
+                for subscriber in result:
+                    row = cls.normalize(subscriber, controller_tag)
+                    # A SIM whose status changed mid-sync can show up under two filters; keep the newer copy
+                    seen = remote.get(row['imsi'])
+                    if not seen or (row['modified_at'] or datetime.min) >= (seen['modified_at'] or datetime.min):
+                        remote[row['imsi']] = row
+
+            stored = dict(db.session.query(SimCard.imsi, SimCard.content_hash))
+            synced_at = datetime.utcnow()
+            changed = [dict(row, synced_at=synced_at) for imsi, row in remote.items()
+                       if stored.get(imsi) != row['content_hash']]
+            for start in range(0, len(changed), batch_size):
+                statement = pg_insert(SimCard).values(changed[start:start + batch_size])
+                db.session.execute(statement.on_conflict_do_update(
+                    index_elements=[SimCard.imsi],
+                    set_={column: statement.excluded[column]
+                          for column in SIM_SYNC_COLUMNS + ('content_hash', 'synced_at')}
+                ))
+            run.changed = len(changed)
+            run.status = 'partial' if errors else 'succeeded'
+        except Exception as e:
+            db.session.rollback()
+            errors.append(str(e))
+            run.status = 'failed'
+
+        run.fetched = len(remote)
+        run.error = '\n'.join(errors) or None
+        run.finished_at = datetime.utcnow()
+        run.duration_ms = int((time.perf_counter() - started) * 1000)
+        db.session.add(run)
+        db.session.commit()
+        logging.info("SIM sync %s: %s fetched, %s changed in %s ms",
+                     run.status, run.fetched, run.changed, run.duration_ms)
+        return run
+
+    @staticmethod
+    def metrics(limit: int = 10) -> Dict[str, Any]:
+        runs = SimSyncRun.query.order_by(SimSyncRun.started_at.desc()).limit(limit).all()
+        durations = [run.duration_ms for run in runs if run.duration_ms is not None]
+        return {
+            "last_duration_ms": durations[0] if durations else None,
+            "avg_duration_ms": round(sum(durations) / len(durations)) if durations else None,
+            "max_duration_ms": max(durations) if durations else None,
+            "runs": [{
+                "id": run.id,
+                "status": run.status,
+                "started_at": run.started_at.isoformat(),
+                "duration_ms": run.duration_ms,
+                "fetched": run.fetched,
+                "changed": run.changed,
+                "error": run.error
+            } for run in runs]
+        }
+
+    @classmethod
+    def start_background(cls, app: Any) -> bool:
+        """Run one sync in a daemon thread; returns False if one is already running in this process"""
+        with cls._thread_lock:
+            if cls._thread and cls._thread.is_alive():
+                return False
+
+            def run():
+                with app.app_context():
+                    try:
+                        cls.sync(
+                            get_soracom_client(app),
+                            statuses=app.config.get('SORACOM_SYNC_STATUSES', ()),
+                            page_size=app.config.get('SORACOM_SYNC_PAGE_SIZE', 100),
+                            batch_size=app.config.get('SORACOM_SYNC_BATCH_SIZE', 500),
+                            controller_tag=app.config.get('SORACOM_CONTROLLER_TAG', 'controller_id')
+                        )
+                    except Exception as e:
+                        logging.error("Error syncing SIM inventory: %s", e)
+                    finally:
+                        db.session.remove()
+
+            cls._thread = threading.Thread(target=run, name='sim-sync', daemon=True)
+            cls._thread.start()
+            return True
+
+
+USAGE_COUNTERS = {
+    'upload_bytes': 'uploadByteSizeTotal',
+    'download_bytes': 'downloadByteSizeTotal',
+    'upload_packets': 'uploadPacketSizeTotal',
+    'download_packets': 'downloadPacketSizeTotal',
+}
+
+
+class CellularUsageService:
+    """Hourly SIM data usage pulled from Soracom air stats, reported per controller.
+
+    Ingestion works in whole hours and overwrites each (imsi, hour) it
+    fetches, so re-running a window (Soracom stats arrive late) is safe.
+    """
+
+    @staticmethod
+    def hourly_rows(imsi: str, stats: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Fold Soracom 5-minute stats into per-hour rows"""
+        hours: Dict[datetime, Dict[str, Any]] = {}
+        for entry in stats or ():
+            bucket = datetime.utcfromtimestamp(entry['unixtime'] - entry['unixtime'] % 3600)
+            row = hours.setdefault(bucket, {'imsi': imsi, 'bucket': bucket, **dict.fromkeys(USAGE_COUNTERS, 0)})
+            for traffic in (entry.get('dataTrafficStatsMap') or {}).values():
+                for column, key in USAGE_COUNTERS.items():
+                    row[column] += traffic.get(key) or 0
+        return list(hours.values())
+
+    @classmethod
+    def ingest(cls, client: Any, start: datetime, end: datetime, batch_size: int = 200,
+               imsis: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Fetch [start, end) for every known SIM, `batch_size` SIMs at a time, and upsert the hours"""
+        start = start.replace(minute=0, second=0, microsecond=0)
+        end = end.replace(minute=0, second=0, microsecond=0)
+        if imsis is None:
+            imsis = [imsi for (imsi,) in db.session.query(SimCard.imsi).filter(
+                SimCard.status != 'terminated'
+            ).order_by(SimCard.imsi)]
+        params = {
+            'from': int((start - datetime(1970, 1, 1)).total_seconds()),
+            'to': int((end - datetime(1970, 1, 1)).total_seconds()) - 1,
+            'period': 'minutes'
+        }
+
+        rows_written, errors = 0, {}
+        for offset in range(0, len(imsis), batch_size):
+            batch = imsis[offset:offset + batch_size]
+            results = client.map(
+                lambda imsi: client.request('GET', f'/stats/air/subscribers/{imsi}', params=params), batch
+            )
+            rows = []
+            for imsi, result in results.items():
+                if isinstance(result, SoracomError):
+                    errors[imsi] = str(result)
+                else:
+                    rows.extend(cls.hourly_rows(imsi, result))
+            if rows:
+                statement = pg_insert(SimUsageHourly).values(rows)
+                db.session.execute(statement.on_conflict_do_update(
+                    index_elements=[SimUsageHourly.imsi, SimUsageHourly.bucket],
+                    set_={column: statement.excluded[column] for column in USAGE_COUNTERS}
+                ))
+                db.session.commit()
+                rows_written += len(rows)
+
+        return {"sims": len(imsis), "rows": rows_written, "errors": errors,
+                "start": start.isoformat(), "end": end.isoformat()}
+
+    @staticmethod
+    def _account_usage(account_id: Any, start: datetime, end: datetime):
+        return select(
+            SimCard.controller_id, Equipment.id.label('equipment_id'), SimUsageHourly.bucket,
+            (SimUsageHourly.upload_bytes + SimUsageHourly.download_bytes).label('total_bytes'),
+            SimUsageHourly.upload_bytes, SimUsageHourly.download_bytes
+        ).select_from(SimUsageHourly).join(
+            SimCard, SimCard.imsi == SimUsageHourly.imsi
+        ).join(
+            Equipment, Equipment.controller_id == SimCard.controller_id
+        ).where(
+            Equipment.account_id == account_id,
+            SimUsageHourly.bucket >= start,
+            SimUsageHourly.bucket < end
+        )
+
+    @classmethod
+    def report(cls, account_id: Any, start: datetime, end: datetime,
+               anomaly_factor: float = 3.0) -> Dict[str, Any]:
+        """Per-controller totals; controllers above `anomaly_factor` x the account median are flagged"""
+        usage = cls._account_usage(account_id, start, end).subquery()
+        per_controller = select(
+            usage.c.controller_id,
+            usage.c.equipment_id,
+            func.sum(usage.c.upload_bytes).label('upload_bytes'),
+            func.sum(usage.c.download_bytes).label('download_bytes'),
+            func.sum(usage.c.total_bytes).label('total_bytes'),
+            func.max(usage.c.total_bytes).label('peak_hour_bytes'),
+            func.count().label('hours')
+        ).group_by(usage.c.controller_id, usage.c.equipment_id).cte('per_controller')
+        median = select(
+            func.percentile_cont(0.5).within_group(per_controller.c.total_bytes)
+        ).scalar_subquery()
+        rows = db.session.execute(
+            select(per_controller, median.label('median_bytes')).order_by(per_controller.c.total_bytes.desc())
+        ).all()
+
+        median_bytes = float(rows[0].median_bytes) if rows else 0.0
+        return {
+            "account_id": account_id,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "median_bytes": median_bytes,
+            "controllers": [{
+                "controller_id": row.controller_id,
+                "equipment_id": row.equipment_id,
+                "upload_bytes": int(row.upload_bytes),
+                "download_bytes": int(row.download_bytes),
+                "total_bytes": int(row.total_bytes),
+                "peak_hour_bytes": int(row.peak_hour_bytes),
+                "avg_hour_bytes": round(int(row.total_bytes) / row.hours),
+                "anomalous": median_bytes > 0 and int(row.total_bytes) > median_bytes * anomaly_factor
+            } for row in rows]
+        }
+
+    @classmethod
+    def series(cls, account_id: Any, controller_id: str, start: datetime, end: datetime,
+               granularity: str = 'hour') -> List[Dict[str, Any]]:
+        usage = cls._account_usage(account_id, start, end).where(
+            SimCard.controller_id == controller_id
+        ).subquery()
+        bucket = func.date_trunc(granularity, usage.c.bucket).label('bucket')
+        rows = db.session.execute(select(
+            bucket,
+            func.sum(usage.c.upload_bytes).label('upload_bytes'),
+            func.sum(usage.c.download_bytes).label('download_bytes')
+        ).group_by(bucket).order_by(bucket)).all()
+        return [{
+            "bucket": row.bucket.isoformat(),
+            "upload_bytes": int(row.upload_bytes),
+            "download_bytes": int(row.download_bytes)
+        } for row in rows]
+
+
+class IrrigationPlanService:
+    @staticmethod
+    def field_zones(field_id: int) -> Dict[int, ZoneDemand]:
+        """Flow demand of every zone wired to the field's equipment"""
+        rows = db.session.query(Zone.id, Zone.equipment_id, Zone.application_rate, Zone.area) \
+            .join(Equipment, Equipment.id == Zone.equipment_id) \
+            .filter(Equipment.field_id == field_id).all()
+        return {row.id: ZoneDemand(row.equipment_id, zone_flow(row.application_rate, row.area)) for row in rows}
+
+    @staticmethod
+    def foreign_zones(field_id: int, schedule: Dict[str, Any]) -> List[int]:
+        """Zone ids of a schedule that are not wired to equipment on the field"""
+        zone_ids = {zone_id for _, _, zone_id, _ in compile_schedule(schedule).steps}
+        if not zone_ids:
+            return []
+        own = {zone_id for (zone_id,) in db.session.query(Zone.id)
+               .join(Equipment, Equipment.id == Zone.equipment_id)
+               .filter(Equipment.field_id == field_id, Zone.id.in_(zone_ids))}
+        return sorted(zone_ids - own)
+
+    @staticmethod
+    def check_plan(field: Field, schedule: Dict[str, Any], plan_id: Optional[int] = None,
+                   horizon: timedelta = DEFAULT_HORIZON, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Check a plan schedule against the field's other plans and its flow capacity.
+
+        Raises ScheduleError if the schedule itself does not compile. Other
+        plans with schedules that no longer compile are left out.
+        """
+        compiled = compile_schedule(schedule)
+        others = []
+        plans = IrrigationPlan.query.options(load_only(IrrigationPlan.id, IrrigationPlan.schedule)) \
+            .filter(IrrigationPlan.field_id == field.id, IrrigationPlan.id != plan_id).all()
+        for plan in plans:
+            try:
+                others.append((plan.id, compile_schedule(plan.schedule)))
+            except ScheduleError:
+                continue
+
+        start = (now or datetime.utcnow()).replace(second=0, microsecond=0)
+        check = PlanCheck(others, IrrigationPlanService.field_zones(field.id), field.flow_rate, start, horizon)
+        return solve_plan(schedule, compiled, check, plan_id)
+
+
+IRRIGATION_LOCK_KEY = 0x6d637273
+
+
+class IrrigationScheduler:
+    """Runs irrigation plans from an in-memory timer queue.
+
+    Every plan's schedule is compiled once into its next run time and kept
+    in a FireQueue, so a tick costs O(log n) per due entry however many
+    plans exist. A due run expands into timed zone_on/zone_off steps. Steps
+    are dispatched in batches as `irrigation_command` Log rows, `current_zone`
+    updates and live `irrigation` events. Commands are not water usage: the
+    rollups only count the `irrigation_event` rows controllers report.
+
+    Plans are reloaded incrementally. A tick reads rows whose updated_at moved
+    past the watermark, plus any ids passed to `notify`. Queued runs carry the
+    plan version they were computed from and are dropped when stale. Steps of
+    a run already under way always complete, so no zone is left on. Only the
+    process holding the IRRIGATION_LOCK_KEY advisory lock runs the queue.
+    """
+    default: 'IrrigationScheduler'
+    WATERMARK_SLACK = timedelta(seconds=60)  # rows committed late still get picked up
+
+    def __init__(self):
+        self.queue = FireQueue()
+        self.plans: Dict[int, Tuple[datetime, CompiledSchedule, int]] = {}  # id -> (version, schedule, field_id)
+        self.watermark: Optional[datetime] = None
+        self.leader = False
+        self._changed: Set[int] = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def notify(self, plan_id: int) -> None:
+        """Reload a plan on the next tick (after create, update or delete)"""
+        with self._lock:
+            self._changed.add(plan_id)
+        self._wake.set()
+
+    def _schedule(self, plan_id: int, version: datetime, schedule: Any, field_id: int, now: datetime,
+                  resume: bool = False) -> None:
+        try:
+            compiled = compile_schedule(schedule)
+        except ScheduleError as e:
+            logging.warning("Irrigation plan %s has an invalid schedule: %s", plan_id, e)
+            self.plans.pop(plan_id, None)
+            return
+        self.plans[plan_id] = (version, compiled, field_id)
+        run = compiled.next_run(now - timedelta(seconds=compiled.duration))
+        if run is not None and run <= now:
+            if resume:
+                # A run was under way when the queue was (re)built: finish its remaining steps
+                self._push_steps(plan_id, field_id, compiled, run, not_before=now)
+            run = compiled.next_run(now)
+        if run is not None:
+            self.queue.push(run, ('run', plan_id, version))
+
+    def _push_steps(self, plan_id: int, field_id: int, compiled: CompiledSchedule, run: datetime,
+                    not_before: Optional[datetime] = None) -> None:
+        for offset, action, zone_id, minutes in compiled.steps:
+            when = run + timedelta(seconds=offset)
+            if not_before is None or when >= not_before:
+                self.queue.push(when, ('step', plan_id, (field_id, zone_id, action, minutes, run)))
+
+    def load(self, now: datetime) -> int:
+        """Build the queue from every plan; done once when this process becomes the leader"""
+        self.queue = FireQueue()
+        self.plans = {}
+        rows = db.session.query(
+            IrrigationPlan.id, IrrigationPlan.updated_at, IrrigationPlan.schedule, IrrigationPlan.field_id
+        ).yield_per(1000)
+        for plan_id, version, schedule, field_id in rows:
+            self._schedule(plan_id, version, schedule, field_id, now, resume=True)
+            if self.watermark is None or version > self.watermark:
+                self.watermark = version
+        self.watermark = self.watermark or now
+        return len(self.plans)
+
+    def refresh(self, now: datetime) -> int:
+        """Apply plan changes since the last tick; returns how many plans were rescheduled"""
+        with self._lock:
+            changed, self._changed = self._changed, set()
+        query = db.session.query(
+            IrrigationPlan.id, IrrigationPlan.updated_at, IrrigationPlan.schedule, IrrigationPlan.field_id
+        )
+        rows = query.filter(IrrigationPlan.updated_at >= self.watermark - self.WATERMARK_SLACK).all()
+        seen = {row.id for row in rows}
+        if changed - seen:
+            rows += query.filter(IrrigationPlan.id.in_(changed - seen)).all()
+
+        rescheduled = 0
+        for plan_id, version, schedule, field_id in rows:
+            self.watermark = max(self.watermark, version)
+            known = self.plans.get(plan_id)
+            if known is None or known[0] != version:
+                self._schedule(plan_id, version, schedule, field_id, now)
+                rescheduled += 1
+        for plan_id in changed - {row.id for row in rows}:
+            self.plans.pop(plan_id, None)  # deleted; its queued run is now stale
+        return rescheduled
+
+    def _pop_due(self, now: datetime) -> Tuple[List[Tuple], List[Tuple]]:
+        steps, runs = [], []
+        while (due := self.queue.pop_due(now)) is not None:
+            when, (kind, plan_id, payload) = due
+            (steps if kind == 'step' else runs).append((when, plan_id, payload))
+        return steps, runs
+
+    def tick(self, now: Optional[datetime] = None, batch_size: int = 500) -> int:
+        """Fire everything due by `now`; returns the number of zone commands dispatched"""
+        now = now or datetime.utcnow()
+        if self.watermark is None:
+            self.load(now)
+        else:
+            self.refresh(now)
+
+        commands, runs = self._pop_due(now)
+        for offset in range(0, len(runs), batch_size):
+            self._start_runs(runs[offset:offset + batch_size], now)
+        # First steps of the runs just started are usually due already; their next runs are not
+        commands += self._pop_due(now)[0]
+        commands.sort(key=lambda command: command[0])
+
+        for offset in range(0, len(commands), batch_size):
+            self._dispatch(commands[offset:offset + batch_size], now)
+        return len(commands)
+
+    def _start_runs(self, runs: List[Tuple[datetime, int, datetime]], now: datetime) -> None:
+        # One lookup per batch catches plans deleted by other workers since they were queued
+        existing = dict(db.session.query(IrrigationPlan.id, IrrigationPlan.updated_at).filter(
+            IrrigationPlan.id.in_({plan_id for _, plan_id, _ in runs})
+        ))
+        for when, plan_id, version in runs:
+            known = self.plans.get(plan_id)
+            if known is None or known[0] != version:
+                continue  # superseded by a newer version, which queued its own run
+            if plan_id not in existing:
+                self.plans.pop(plan_id, None)
+                continue
+            _, compiled, field_id = known
+            self._push_steps(plan_id, field_id, compiled, when)
+            following = compiled.next_run(max(when, now))
+            if following is not None:
+                self.queue.push(following, ('run', plan_id, version))
+
+    def _dispatch(self, commands: List[Tuple[datetime, int, Tuple]], now: datetime) -> None:
+        zone_ids = {payload[1] for _, _, payload in commands}
+        zones = {row.id: row for row in db.session.query(
+            Zone.id, Zone.name, Zone.account_id, Equipment.id.label('equipment_id'), Equipment.controller_id
+        ).join(Equipment, Equipment.id == Zone.equipment_id).filter(Zone.id.in_(zone_ids))}
+        fields = {field_id for (field_id,) in db.session.query(Field.id).filter(
+            Field.id.in_({payload[0] for _, _, payload in commands})
+        )}
+
+        rows, events = [], []
+        current_zone: Dict[int, Tuple[str, Optional[str]]] = {}  # field -> ('set' | 'clear_if', zone name)
+        for when, plan_id, (field_id, zone_id, action, minutes, run) in commands:
+            zone = zones.get(zone_id)
+            if zone is None or field_id not in fields:
+                continue  # zone or field deleted since the plan was compiled
+            data = {
+                'plan_id': plan_id,
+                'zone_id': zone_id,
+                'zone_name': zone.name,
+                'equipment_id': zone.equipment_id,
+                'controller_id': zone.controller_id,
+                'action': action,
+                'duration_minutes': minutes,
+                'run_started_at': run.isoformat(),
+                'scheduled_for': when.isoformat()
+            }
+            rows.append({'account_id': zone.account_id, 'field_id': field_id,
+                         'event_type': 'irrigation_command', 'event_data': data, 'timestamp': when})
+            events.append((zone.account_id, field_id, data))
+            # Commands are in time order; only each field's final state is written
+            if action == 'zone_on':
+                current_zone[field_id] = ('set', zone.name)
+            elif current_zone.get(field_id) == ('set', zone.name):
+                current_zone[field_id] = ('set', None)
+            elif field_id not in current_zone or current_zone[field_id][0] == 'clear_if':
+                current_zone[field_id] = ('clear_if', zone.name)
+
+        if rows:
+            db.session.execute(insert(Log), rows)
+        updates = {'set': [], 'clear_if': []}
+        for field_id, (kind, name) in current_zone.items():
+            updates[kind].append({'field': field_id, 'zone': name})
+        if updates['set']:
+            db.session.execute(text("UPDATE fields SET current_zone = :zone WHERE id = :field"), updates['set'])
+        if updates['clear_if']:
+            db.session.execute(text(
+                "UPDATE fields SET current_zone = NULL WHERE id = :field AND current_zone = :zone"
+            ), updates['clear_if'])
+        db.session.commit()
+
+        for account_id, field_id, data in events:
+            ChangeBroker.default.publish(account_id, 'irrigation', data)
+            if not ChangeFeed.default.running:  # otherwise the fields trigger reports these
+                ChangeBroker.default.publish(account_id, 'field', {
+                    "field_id": field_id,
+                    "current_zone": data['zone_name'] if data['action'] == 'zone_on' else None
+                })
+
+    def _try_lead(self, connection: Any) -> bool:
+        if not self.leader:
+            self.leader = bool(connection.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": IRRIGATION_LOCK_KEY}
+            ).scalar())
+            connection.commit()
+            if self.leader:
+                self.watermark = None  # rebuild the queue from scratch on taking over
+        return self.leader
+
+    def run(self, app: Any, interval: float, batch_size: int) -> None:
+        """Tick until the process exits, sleeping until the next due entry or `interval` seconds"""
+        with app.app_context():
+            lock_connection = db.engine.connect()  # holds the leader lock for the life of the process
+        while True:
+            with app.app_context():
+                try:
+                    if self._try_lead(lock_connection):
+                        self.tick(datetime.utcnow(), batch_size)
+                except Exception as e:
+                    logging.error("Error running irrigation plans: %s", e)
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+            timeout = interval
+            next_due = self.queue.next_due() if self.leader else None
+            if next_due is not None:
+                timeout = min(interval, max(0.0, (next_due - datetime.utcnow()).total_seconds()))
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+    def ensure_worker(self, app: Any) -> None:
+        """Start this process's scheduler thread if it is not running"""
+        interval = app.config.get('IRRIGATION_SCHEDULER_INTERVAL', 30)
+        if app.testing or interval <= 0:
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self.run, args=(app, interval, app.config.get('IRRIGATION_LOG_BATCH_SIZE', 500)),
+                name='irrigation-scheduler', daemon=True
+            )
+            self._thread.start()
+
+
+IrrigationScheduler.default = IrrigationScheduler()
+
+
+ALERT_LOCK_KEY = 0x6d63616c
+
+AlertKey = Tuple[int, int, str]  # account_id, field_id, alert_type
+
+
+class AlertIngestService:
+    """Coalescing, rate-limited front door for alerts.
+
+    `submit` only touches memory: it spends one token from the account's
+    bucket (refilled at `rate` per second up to `burst`) and folds repeats of
+    the same (account, field, alert_type) into one pending entry. `flush`
+    writes everything pending in one transaction: a key with an unresolved
+    alert seen within `window` bumps that row's occurrence_count and
+    last_seen, any other key becomes a new alert. The worker thread flushes
+    every ALERT_FLUSH_INTERVAL seconds, or early once `batch_size` keys are
+    pending; without it callers flush inline.
+
+    Buckets and pending entries live in this process only, so with several
+    workers an account may send up to `rate` x workers alerts per second;
+    coalescing across workers still happens in the database.
+    """
+
+    def __init__(self, window: float = 3600, rate: float = 5, burst: int = 100, batch_size: int = 500):
+        self.configure(window, rate, burst, batch_size)
+        self.rate_limited = 0
+        self.dropped = 0  # occurrences whose field was gone or moved to another account by flush time
+        self._pending: Dict[AlertKey, Dict[str, Any]] = {}
+        self._buckets: Dict[int, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def configure(self, window: float, rate: float, burst: int, batch_size: int) -> None:
+        self.window = timedelta(seconds=window)
+        self.rate = rate
+        self.burst = burst
+        self.batch_size = batch_size
+
+    @staticmethod
+    def alert_key(account_id: Any, field_id: Any, alert_type: Any) -> AlertKey:
+        return int(account_id), int(field_id), str(alert_type)
+
+    def _take_token(self, account_id: int, now: float) -> Optional[float]:
+        """Spend one of the account's tokens, or return the seconds until one is available"""
+        if self.rate <= 0:
+            return None
+        tokens, updated = self._buckets.get(account_id, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._buckets[account_id] = (tokens, now)
+            return (1 - tokens) / self.rate
+        self._buckets[account_id] = (tokens - 1, now)
+        return None
+
+    def submit(self, account_id: Any, field_id: Any, alert_type: Any, message: Optional[str],
+               seen_at: Optional[datetime] = None) -> Optional[float]:
+        """Queue one occurrence of an alert.
+
+        Returns None when accepted, or the seconds to wait before retrying
+        when the account is over its rate limit.
+        """
+        key = self.alert_key(account_id, field_id, alert_type)
+        seen_at = seen_at or datetime.utcnow()
+        with self._lock:
+            retry_after = self._take_token(key[0], time.monotonic())
+            if retry_after is not None:
+                self.rate_limited += 1
+                return retry_after
+            self._merge(key, {'count': 1, 'first_seen': seen_at, 'last_seen': seen_at, 'message': message})
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()
+        return None
+
+    def _merge(self, key: AlertKey, entry: Dict[str, Any]) -> None:
+        current = self._pending.get(key)
+        if current is None:
+            self._pending[key] = entry
+            return
+        current['count'] += entry['count']
+        current['first_seen'] = min(current['first_seen'], entry['first_seen'])
+        if entry['last_seen'] >= current['last_seen']:
+            current['last_seen'], current['message'] = entry['last_seen'], entry['message']
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def flush(self) -> Dict[AlertKey, int]:
+        """Write pending occurrences; returns the id of the alert each key was stored in.
+
+        Flushes in this process run one at a time, so once flush returns,
+        everything submitted before it was called is committed, whichever
+        thread wrote it. On failure the occurrences go back into the queue
+        for the next flush.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return {}
+            try:
+                return self._write(pending)
+            except Exception:
+                db.session.rollback()
+                with self._lock:
+                    for key, entry in pending.items():
+                        self._merge(key, entry)
+                raise
+
+    @staticmethod
+    def open_alert_id(key: AlertKey) -> Optional[int]:
+        """Id of the newest unresolved alert stored for a key"""
+        return db.session.scalar(select(Alert.id).where(
+            Alert.account_id == key[0], Alert.field_id == key[1], Alert.alert_type == key[2],
+            Alert.resolved == False  # noqa: E712 - matches the partial index
+        ).order_by(Alert.last_seen.desc()).limit(1))
+
+    def _write(self, pending: Dict[AlertKey, Dict[str, Any]]) -> Dict[AlertKey, int]:
+        # Serialises flushes across workers so two of them cannot both open the same alert
+        db.session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ALERT_LOCK_KEY})
+        owned = set(db.session.execute(select(Field.account_id, Field.id).where(
+            Field.id.in_({key[1] for key in pending})
+        )).all())
+        orphans = [key for key in pending if (key[0], key[1]) not in owned]
+        if orphans:
+            self.dropped += sum(pending[key]['count'] for key in orphans)
+            logging.warning("Dropping alerts for fields missing from their account: %s",
+                            sorted({(key[0], key[1]) for key in orphans}))
+        pending = {key: entry for key, entry in pending.items() if (key[0], key[1]) in owned}
+        if not pending:
+            db.session.commit()
+            return {}
+
+        oldest = min(entry['first_seen'] for entry in pending.values()) - self.window
+        rows = db.session.execute(select(
+            Alert.id, Alert.account_id, Alert.field_id, Alert.alert_type, Alert.last_seen
+        ).where(
+            tuple_(Alert.account_id, Alert.field_id, Alert.alert_type).in_(list(pending)),
+            Alert.resolved == False,  # noqa: E712 - matches the partial index
+            Alert.last_seen >= oldest
+        ).order_by(Alert.last_seen)).all()
+
+        stored: Dict[AlertKey, int] = {}
+        for row in rows:
+            key = (row.account_id, row.field_id, row.alert_type)
+            if row.last_seen >= pending[key]['first_seen'] - self.window:
+                stored[key] = row.id  # rows come oldest first, so the latest open alert wins
+        if stored:
+            db.session.execute(text(
+                "UPDATE alerts SET occurrence_count = occurrence_count + :count, "
+                "message = CASE WHEN :last_seen >= last_seen THEN :message ELSE message END, "
+                "last_seen = GREATEST(last_seen, :last_seen) WHERE id = :id"
+            ), [{
+                "id": alert_id, "count": pending[key]['count'],
+                "last_seen": pending[key]['last_seen'], "message": pending[key]['message']
+            } for key, alert_id in stored.items()])
+
+        new_keys = [key for key in pending if key not in stored]
+        if new_keys:
+            inserted = db.session.execute(
+                insert(Alert).returning(Alert.id, Alert.account_id, Alert.field_id, Alert.alert_type),
+                [{
+                    "account_id": key[0], "field_id": key[1], "alert_type": key[2], "resolved": False,
+                    "message": pending[key]['message'], "occurrence_count": pending[key]['count'],
+                    "created_at": pending[key]['first_seen'], "last_seen": pending[key]['last_seen']
+                } for key in new_keys]
+            ).all()
+            for row in inserted:
+                stored[(row.account_id, row.field_id, row.alert_type)] = row.id
+        db.session.commit()
+
+        # Bulk statements bypass the session events that normally report new alerts
+        if new_keys:
+            StatusService.cache.invalidate(*{key[0] for key in new_keys})
+            if not ChangeFeed.default.running:
+                for key in new_keys:
+                    ChangeBroker.default.publish(key[0], 'alert', {
+                        "id": stored[key], "field_id": key[1], "alert_type": key[2],
+                        "message": pending[key]['message']
+                    })
+        return stored
+
+    def run(self, app: Any, interval: float) -> None:
+        while True:
+            self._wake.wait(interval)
+            self._wake.clear()
+            with app.app_context():
+                try:
+                    self.flush()
+                except Exception as e:
+                    logging.error("Error writing alerts: %s", e)
+                finally:
+                    db.session.remove()
+
+    def ensure_worker(self, app: Any) -> bool:
+        """Start this process's flush thread; returns False when alerts must be flushed inline"""
+        interval = app.config.get('ALERT_FLUSH_INTERVAL', 2)
+        if app.testing or interval <= 0:
+            return False
+        with self._lock:
+            if not (self._thread and self._thread.is_alive()):
+                self._thread = threading.Thread(target=self.run, args=(app, interval),
+                                                name='alert-ingest', daemon=True)
+                self._thread.start()
+        return True
+
+
+AlertIngestService.default = AlertIngestService()
@@ -1,22 +1,25 @@
 from app.extensions import db
 from .models import create_task_model
 from app.models.user_app import UserApp
+from app.services.tenancy import shared_tenancy
 from sqlalchemy import text, inspect
 from datetime import datetime
 
 def install_task_manager(account_id):
     """Install the task manager app for a specific account"""
     try:
-        # Create the task model for this account
-        TaskModel = create_task_model(account_id)
-        
-        # Create the table if it doesn't exist
-        inspector = inspect(db.engine)
-        table_name = f"tasks_{account_id}"
-        
-        if not inspector.has_table(table_name):
-            # The TaskStatus enum already exists, so we can create the table directly
-            TaskModel.__table__.create(db.engine)
+        # Shared tenancy keeps every account in the tasks table: no DDL per install
+        if not shared_tenancy():
+            # Create the task model for this account
+            TaskModel = create_task_model(account_id)
+
+            # Create the table if it doesn't exist
+            inspector = inspect(db.engine)
+            table_name = f"tasks_{account_id}"
+
+            if not inspector.has_table(table_name):
+                # The TaskStatus enum already exists, so we can create the table directly
+                TaskModel.__table__.create(db.engine)
             
         # Mark the app as installed in user_apps table
         user_app = UserApp.query.filter_by(
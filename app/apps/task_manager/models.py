@@ -1,6 +1,9 @@
 from uuid import uuid4
+from sqlalchemy import DDL, event
 from sqlalchemy.dialects.postgresql import UUID, ENUM
 from app.extensions import db
+from app.utils.model_registry import ModelRegistry
+from app.services.tenancy import shared_tenancy, bind_tenant, partition_ddl
 from datetime import datetime
 from enum import Enum
 
@@ -18,7 +21,7 @@ class Task(db.Model):
     status = db.Column(ENUM('PENDING', 'COMPLETED', name='taskstatus', create_type=False), default='PENDING', nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
-def create_task_model(account_id):
+def build_task_model(account_id):
     """Dynamically create a Task model for a specific account"""
     table_name = f"tasks_{account_id}"
     
@@ -29,4 +32,44 @@ def create_task_model(account_id):
             "__tablename__": table_name,
             "__table_args__": {"extend_existing": True}
         }
-    ) 
\ No newline at end of file
+    )
+
+
+class SharedTask(Task):
+    """Every account's tasks in one table, hash-partitioned on account_id (TENANCY_MODE=shared)"""
+    __tablename__ = 'tasks'
+    __table_args__ = {'postgresql_partition_by': 'HASH (account_id)'}
+
+    account_id = db.Column(db.Integer, primary_key=True)
+
+    @db.declared_attr.directive
+    def __mapper_args__(cls):
+        return {'polymorphic_on': cls.__table__.c.account_id, 'primary_key': [cls.__table__.c.id]}
+
+
+# The status column does not create its enum type (per-account tables assume it exists)
+event.listen(SharedTask.__table__, 'before_create', DDL(
+    "DO $$ BEGIN CREATE TYPE taskstatus AS ENUM ('PENDING', 'COMPLETED'); "
+    "EXCEPTION WHEN duplicate_object THEN NULL; END $$"
+))
+event.listen(SharedTask.__table__, 'after_create', DDL(partition_ddl('tasks')))
+
+
+def build_shared_task_model(account_id):
+    return type(
+        f"SharedTasks_{account_id}",
+        (SharedTask,),
+        {"__mapper_args__": {"polymorphic_identity": int(account_id)}}
+    )
+
+
+task_models = ModelRegistry(build_task_model)
+shared_task_models = ModelRegistry(build_shared_task_model)
+
+
+def create_task_model(account_id):
+    """Return the account's Task model, building it only on first use"""
+    if shared_tenancy():
+        bind_tenant(account_id)
+        return shared_task_models.get(account_id)
+    return task_models.get(account_id)
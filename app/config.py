@@ -38,6 +38,21 @@ class Config:
     SORACOM_API_KEY = os.getenv("SORACOM_API_KEY")
     SORACOM_TOKEN = os.getenv("SORACOM_TOKEN")
     SORACOM_BASE_URL = os.getenv("SORACOM_BASE_URL", "https://api-sandbox.soracom.io/v1")
+    SORACOM_CONNECT_TIMEOUT = float(os.getenv("SORACOM_CONNECT_TIMEOUT", 3.05))  # seconds
+    SORACOM_READ_TIMEOUT = float(os.getenv("SORACOM_READ_TIMEOUT", 10))  # seconds
+    SORACOM_MAX_RETRIES = int(os.getenv("SORACOM_MAX_RETRIES", 3))  # idempotent calls only
+    SORACOM_RETRY_BACKOFF = float(os.getenv("SORACOM_RETRY_BACKOFF", 0.5))  # seconds, doubled per attempt
+    SORACOM_POOL_SIZE = int(os.getenv("SORACOM_POOL_SIZE", 20))  # keep-alive connections and bulk workers
+    SORACOM_CACHE_TTL = float(os.getenv("SORACOM_CACHE_TTL", 60))  # seconds subscriber reads are cached
+    SORACOM_SYNC_STATUSES = [s for s in os.getenv(  # listed concurrently, one paginated listing per status
+        "SORACOM_SYNC_STATUSES", "active,inactive,ready,instock,shipped,suspended,terminated"
+    ).split(",") if s]
+    SORACOM_SYNC_PAGE_SIZE = int(os.getenv("SORACOM_SYNC_PAGE_SIZE", 100))
+    SORACOM_SYNC_BATCH_SIZE = int(os.getenv("SORACOM_SYNC_BATCH_SIZE", 500))  # rows per upsert
+    SORACOM_CONTROLLER_TAG = os.getenv("SORACOM_CONTROLLER_TAG", "controller_id")  # subscriber tag naming the controller
+    SORACOM_USAGE_BATCH_SIZE = int(os.getenv("SORACOM_USAGE_BATCH_SIZE", 200))  # SIMs fetched per ingestion batch
+    SORACOM_USAGE_LOOKBACK_HOURS = int(os.getenv("SORACOM_USAGE_LOOKBACK_HOURS", 3))  # re-read to pick up late stats
+    CELLULAR_USAGE_ANOMALY_FACTOR = float(os.getenv("CELLULAR_USAGE_ANOMALY_FACTOR", 3))  # x account median flags a controller
     
     # Stripe Configuration
     STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
@@ -49,3 +64,51 @@ class Config:
     APP_STORAGE_PATH = os.getenv("APP_STORAGE_PATH", "app/apps")
     UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", "uploads")
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    DYNAMIC_MODEL_WARN_AFTER = int(os.getenv("DYNAMIC_MODEL_WARN_AFTER", 10000))  # account classes per model registry before a warning is logged
+    BLOB_BACKEND = os.getenv("BLOB_BACKEND", "local")
+    BLOB_STORAGE_PATH = os.getenv("BLOB_STORAGE_PATH", os.path.join(UPLOAD_FOLDER, "blobs"))
+    GEOMETRY_INDEX_TTL = float(os.getenv("GEOMETRY_INDEX_TTL", 300))  # seconds before a worker rebuilds its spatial index
+    GEOMETRY_CACHE_MAX_AGE = int(os.getenv("GEOMETRY_CACHE_MAX_AGE", 60))  # seconds map clients may reuse outlines before revalidating
+    FIRMWARE_CHUNK_SIZE = int(os.getenv("FIRMWARE_CHUNK_SIZE", 256 * 1024))  # bytes per stored firmware chunk
+    FIRMWARE_CACHE_MAX_AGE = int(os.getenv("FIRMWARE_CACHE_MAX_AGE", 86400))  # images are immutable per sha256
+    FIRMWARE_DELTA_MAX_RATIO = float(os.getenv("FIRMWARE_DELTA_MAX_RATIO", 0.5))  # serve deltas only when at most this share of the image
+
+    # Multi Control Telemetry
+    TELEMETRY_BATCH_SIZE = int(os.getenv("TELEMETRY_BATCH_SIZE", 1000))  # rows per INSERT
+    LOG_PARTITION_MONTHS_AHEAD = int(os.getenv("LOG_PARTITION_MONTHS_AHEAD", 3))
+    LOG_RETENTION_MONTHS = int(os.getenv("LOG_RETENTION_MONTHS", 24))
+    LOG_REPORT_LOOKBACK_DAYS = int(os.getenv("LOG_REPORT_LOOKBACK_DAYS", 30))  # window of the health report's recent_errors, bounding the scan to recent partitions; 0 = all history
+    STATUS_CACHE_TTL = float(os.getenv("STATUS_CACHE_TTL", 5))  # seconds
+
+    # Equipment presence (controller heartbeats)
+    PRESENCE_TIMEOUT = float(os.getenv("PRESENCE_TIMEOUT", 90))  # seconds without a heartbeat before INACTIVE
+    PRESENCE_FLUSH_INTERVAL = float(os.getenv("PRESENCE_FLUSH_INTERVAL", 15))  # seconds, 0 disables the flusher
+    PRESENCE_REDIS_URL = os.getenv("PRESENCE_REDIS_URL")  # shared last-seen table, required with several workers
+    WEB_WORKERS = int(os.getenv("WEB_CONCURRENCY", 1))  # server worker processes (gunicorn reads the same variable)
+
+    # Firmware rollouts
+    ROLLOUT_TICK_INTERVAL = float(os.getenv("ROLLOUT_TICK_INTERVAL", 10))  # seconds, 0 disables the worker
+    ROLLOUT_MAX_CONCURRENT_DOWNLOADS = int(os.getenv("ROLLOUT_MAX_CONCURRENT_DOWNLOADS", 50))  # across all rollouts
+    ROLLOUT_TARGET_TIMEOUT = float(os.getenv("ROLLOUT_TARGET_TIMEOUT", 1800))  # seconds before a silent download counts as failed
+
+    # Irrigation plan execution
+    IRRIGATION_SCHEDULER_INTERVAL = float(os.getenv("IRRIGATION_SCHEDULER_INTERVAL", 30))  # max seconds between ticks, 0 disables the worker
+    IRRIGATION_LOG_BATCH_SIZE = int(os.getenv("IRRIGATION_LOG_BATCH_SIZE", 500))  # zone commands per insert/commit
+    IRRIGATION_CHECK_HORIZON_DAYS = int(os.getenv("IRRIGATION_CHECK_HORIZON_DAYS", 7))  # days of plan runs compared for flow conflicts
+
+    # Alert ingestion
+    ALERT_DEDUP_WINDOW = float(os.getenv("ALERT_DEDUP_WINDOW", 3600))  # seconds a repeat folds into the open alert of its type
+    ALERT_RATE_LIMIT = float(os.getenv("ALERT_RATE_LIMIT", 5))  # alerts per second per account and worker process, 0 disables the limit
+    ALERT_RATE_BURST = int(os.getenv("ALERT_RATE_BURST", 100))  # alerts an account may send at once
+    ALERT_BATCH_SIZE = int(os.getenv("ALERT_BATCH_SIZE", 500))  # pending alerts that trigger an early write
+    ALERT_FLUSH_INTERVAL = float(os.getenv("ALERT_FLUSH_INTERVAL", 2))  # seconds between writes, 0 writes each alert inline
+
+    # Live updates (/multi_controls/events/)
+    CHANGE_HISTORY_SIZE = int(os.getenv("CHANGE_HISTORY_SIZE", 256))  # events kept per account for resume
+    SSE_KEEPALIVE = float(os.getenv("SSE_KEEPALIVE", 15))  # seconds between keepalive comments
+    LONG_POLL_TIMEOUT = float(os.getenv("LONG_POLL_TIMEOUT", 25))  # max seconds a poll request waits
+    CHANGE_FEED_ENABLED = os.getenv("CHANGE_FEED_ENABLED", "false").lower() == "true"  # LISTEN/NOTIFY across workers
+
+    # Per-account apps (multi_control, task_manager)
+    TENANCY_MODE = os.getenv("TENANCY_MODE", "table")  # 'table': <app>_<account_id> tables, 'shared': one partitioned table
+    TENANCY_RLS = os.getenv("TENANCY_RLS", "false").lower() == "true"  # set app.account_id per transaction for RLS policies
@@ -0,0 +1,92 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from flask import current_app
+
+CHUNK_SIZE = 64 * 1024
+
+
+class LocalBlobBackend:
+    """Content-addressed blobs on the local filesystem.
+
+    Blobs live at <root>/<aa>/<bb>/<sha256>. Writes stream into a temporary
+    file while hashing and are renamed into place, so identical uploads are
+    stored once and readers never see a partial blob.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(os.path.join(root, 'tmp'), exist_ok=True)
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def put_stream(self, stream, chunk_size=CHUNK_SIZE):
+        """Store a readable binary stream and return (sha256 hex digest, size in bytes)"""
+        sha256 = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=os.path.join(self.root, 'tmp'))
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                while True:
+                    chunk = stream.read(chunk_size)
+                    if not chunk:
+                        break
+                    sha256.update(chunk)
+                    temp.write(chunk)
+                    size += len(chunk)
+
+            digest = sha256.hexdigest()
+            target = self.path(digest)
+            if os.path.exists(target):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(temp_path, target)
+            return digest, size
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def put_bytes(self, data):
+        return self.put_stream(BytesIO(data))
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def open(self, digest):
+        return open(self.path(digest), 'rb')
+
+    def size(self, digest):
+        return os.path.getsize(self.path(digest))
+
+    def delete(self, digest):
+        try:
+            os.remove(self.path(digest))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def copy_to(self, digest, fileobj):
+        with self.open(digest) as source:
+            shutil.copyfileobj(source, fileobj, CHUNK_SIZE)
+
+
+# Backends are constructed as backend(root); register others (e.g. S3) here
+BLOB_BACKENDS = {
+    'local': LocalBlobBackend,
+}
+
+
+def get_blob_store(app=None):
+    """Return the configured blob backend for an app, creating it on first use"""
+    app = app or current_app
+    store = app.extensions.get('blob_store')
+    if store is None:
+        backend = BLOB_BACKENDS[app.config.get('BLOB_BACKEND', 'local')]
+        store = backend(app.config.get('BLOB_STORAGE_PATH', os.path.join('uploads', 'blobs')))
+        app.extensions['blob_store'] = store
+    return store
@@ -1,18 +1,193 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
 from flask import current_app
 
+# Retrying these is safe: the request either never reached Soracom or did not change anything
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+
+
+class SoracomError(Exception):
+    """Soracom answered with an error status, or could not be reached after all retries"""
+
+    def __init__(self, status_code, body):
+        super().__init__(f"Soracom API error {status_code}: {body}")
+        self.status_code = status_code
+        self.body = body
+
+
+class TTLCache:
+    """Small thread-safe cache of read-only responses, keyed by endpoint"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() - entry[0] < self.ttl:
+                return entry[1]
+            self._entries.pop(key, None)
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+
+    def invalidate(self, prefix=""):
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+
+class SoracomClient:
+    """Soracom API client sharing one keep-alive connection pool per process.
+
+    Every call has a connect/read timeout. Connection failures, timeouts and
+    429/5xx answers are retried with exponential backoff (honouring
+    Retry-After) for idempotent methods only. Bulk helpers fan out over a
+    thread pool no larger than the connection pool, and subscriber reads are
+    cached for `cache_ttl` seconds.
+    """
+
+    def __init__(self, base_url, api_key=None, token=None, timeout=(3.05, 10), max_retries=3,
+                 backoff=0.5, pool_size=20, cache_ttl=60):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.cache = TTLCache(cache_ttl)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "X-Soracom-API-Key": api_key or "",
+            "X-Soracom-Token": token or "",
+            "Content-Type": "application/json"
+        })
+
+    def _delay(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return self.backoff * (2 ** attempt) * (0.5 + random.random() / 2)
+
+    def send(self, method, endpoint, data=None, params=None):
+        """Issue one request and return the raw response, retrying transient failures"""
+        method = method.upper()
+        retries = self.max_retries if method in IDEMPOTENT_METHODS else 0
+        url = f"{self.base_url}{endpoint}"
+        for attempt in range(retries + 1):
+            try:
+                response = self.session.request(method, url, json=data, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == retries:
+                    raise SoracomError(503, {"message": f"Soracom unreachable: {e}"})
+                logging.warning("Soracom %s %s failed (%s), retrying", method, endpoint, e)
+                time.sleep(self._delay(attempt))
+                continue
+            if response.status_code in RETRY_STATUSES and attempt < retries:
+                logging.warning("Soracom %s %s returned %s, retrying", method, endpoint, response.status_code)
+                time.sleep(self._delay(attempt, response))
+                continue
+            return response
+
+    @staticmethod
+    def _body(response):
+        try:
+            return response.json() if response.content else None
+        except ValueError:
+            return response.text
+
+    def request(self, method, endpoint, data=None, params=None):
+        """Return the decoded JSON body, raising SoracomError for error statuses"""
+        response = self.send(method, endpoint, data, params)
+        if response.status_code >= 400:
+            raise SoracomError(response.status_code, self._body(response))
+        if method.upper() not in ("GET", "HEAD"):
+            # A write may change anything cached below this path (e.g. /subscribers/<imsi>/...)
+            self.cache.invalidate("/".join(endpoint.split("/")[:3]))
+        return self._body(response)
+
+    def get_cached(self, endpoint, params=None):
+        key = endpoint if not params else f"{endpoint}?{sorted(params.items())}"
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        body = self.request("GET", endpoint, params=params)
+        self.cache.set(key, body)
+        return body
+
+    def get_subscriber(self, imsi, cached=True):
+        endpoint = f"/subscribers/{imsi}"
+        return self.get_cached(endpoint) if cached else self.request("GET", endpoint)
+
+    def map(self, fn, items, max_workers=None):
+        """Apply fn to every item concurrently, returning {item: result or SoracomError} in input order"""
+        items = list(items)
+        workers = max(1, min(max_workers or self.pool_size, self.pool_size, len(items) or 1))
+
+        def call(item):
+            try:
+                return fn(item)
+            except SoracomError as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="soracom") as pool:
+            return dict(zip(items, pool.map(call, items)))
+
+    def get_subscribers(self, imsis, cached=True, max_workers=None):
+        return self.map(lambda imsi: self.get_subscriber(imsi, cached), imsis, max_workers)
+
+    def iter_pages(self, endpoint, params=None, limit=100):
+        """Yield each page of a paginated list endpoint, following x-soracom-next-key"""
+        params = dict(params or {}, limit=limit)
+        while True:
+            response = self.send("GET", endpoint, params=params)
+            if response.status_code >= 400:
+                raise SoracomError(response.status_code, self._body(response))
+            yield self._body(response) or []
+            next_key = response.headers.get("x-soracom-next-key")
+            if not next_key:
+                return
+            params["last_evaluated_key"] = next_key
+
+    def close(self):
+        self.session.close()
+
+
+def get_soracom_client(app=None):
+    """Return the process-wide Soracom client for an app, creating it on first use"""
+    app = app or current_app
+    client = app.extensions.get("soracom_client")
+    if client is None:
+        client = SoracomClient(
+            app.config["SORACOM_BASE_URL"],
+            api_key=app.config.get("SORACOM_API_KEY"),
+            token=app.config.get("SORACOM_TOKEN"),
+            timeout=(app.config.get("SORACOM_CONNECT_TIMEOUT", 3.05), app.config.get("SORACOM_READ_TIMEOUT", 10)),
+            max_retries=app.config.get("SORACOM_MAX_RETRIES", 3),
+            backoff=app.config.get("SORACOM_RETRY_BACKOFF", 0.5),
+            pool_size=app.config.get("SORACOM_POOL_SIZE", 20),
+            cache_ttl=app.config.get("SORACOM_CACHE_TTL", 60)
+        )
+        app.extensions["soracom_client"] = client
+    return client
+
+
 def soracom_request(method, endpoint, data=None):
     """Helper function to send authenticated requests to Soracom API"""
-    headers = {
-        "X-Soracom-API-Key": current_app.config["SORACOM_API_KEY"],
-        "X-Soracom-Token": current_app.config["SORACOM_TOKEN"],
-        "Content-Type": "application/json"
-    }
-    url = f"{current_app.config['SORACOM_BASE_URL']}{endpoint}"
-
-    response = requests.request(method, url, headers=headers, json=data)
-    
-    if response.status_code >= 400:
-        return {"error": response.json()}, response.status_code
-
-    return response.json()
+    try:
+        return get_soracom_client().request(method, endpoint, data)
+    except SoracomError as e:
+        return {"error": e.body}, e.status_code
@@ -0,0 +1,144 @@
+"""Shared-table tenancy for the per-account apps.
+
+In the default `table` mode every account gets its own physical table
+(multi_controls_<id>, tasks_<id>). With TENANCY_MODE=shared all accounts
+live in one table per app, hash-partitioned on account_id, and each account
+is a single-table-inheritance subclass whose queries are filtered by
+account_id. With TENANCY_RLS enabled the session also sets app.account_id
+at the start of every transaction, so Postgres row-level security
+(see enable_rls) rejects cross-tenant rows even for hand-written SQL.
+"""
+import logging
+import re
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session
+from app.extensions import db
+
+SHARED_TABLE_PARTITIONS = 16
+TENANT_SETTING = "app.account_id"
+
+# shared table -> (per-account table prefix, copied columns)
+SHARED_TENANT_TABLES = {
+    "multi_controls": ("multi_controls_", ("id", "title", "description", "status", "created_at")),
+    "tasks": ("tasks_", ("id", "title", "description", "status", "created_at")),
+}
+
+
+def shared_tenancy():
+    return has_app_context() and current_app.config.get("TENANCY_MODE", "table") == "shared"
+
+
+def partition_ddl(table):
+    """Create the hash partitions of a shared tenant table if they are missing.
+
+    Free of % placeholders, since DDL() applies Python string formatting.
+    """
+    return (
+        f"DO $$ BEGIN FOR remainder IN 0..{SHARED_TABLE_PARTITIONS - 1} LOOP EXECUTE "
+        f"'CREATE TABLE IF NOT EXISTS ' || quote_ident('{table}_p' || remainder) || "
+        f"' PARTITION OF {table} FOR VALUES WITH (MODULUS {SHARED_TABLE_PARTITIONS}, REMAINDER ' || remainder || ')'; "
+        f"END LOOP; END $$"
+    )
+
+
+def bind_tenant(account_id):
+    """Scope the current session's transactions to one account for row-level security"""
+    if not current_app.config.get("TENANCY_RLS"):
+        return
+    account_id = str(int(account_id))
+    if db.session.info.get("tenant_account_id") == account_id:
+        return
+    db.session.info["tenant_account_id"] = account_id
+    if db.session.in_transaction():
+        _set_tenant(db.session.connection(), account_id)
+
+
+def _set_tenant(connection, account_id):
+    connection.execute(text("SELECT set_config(:name, :value, true)"), {"name": TENANT_SETTING, "value": account_id})
+
+
+@event.listens_for(Session, "after_begin")
+def _apply_tenant(session, transaction, connection):
+    account_id = session.info.get("tenant_account_id")
+    if account_id is not None:
+        _set_tenant(connection, account_id)
+
+
+class TenancyService:
+    @staticmethod
+    def account_tables(shared_table):
+        """Per-account tables of a shared table as [(account_id, table name)]"""
+        prefix, _ = SHARED_TENANT_TABLES[shared_table]
+        pattern = re.compile(rf"^{prefix}(\d+)$")
+        names = inspect(db.engine).get_table_names()
+        return sorted((int(match.group(1)), name) for name in names if (match := pattern.match(name)))
+
+    @staticmethod
+    def migrate_account_tables(shared_table, drop_source=False, limit=None):
+        """Copy every per-account table into the shared table, one transaction per account.
+
+        Rows already present (same id) are skipped, so an interrupted run can
+        simply be repeated. Source tables are only dropped on request.
+        """
+        _, columns = SHARED_TENANT_TABLES[shared_table]
+        column_list = ", ".join(columns)
+        summary = {"tables": 0, "rows": 0, "failed": {}}
+
+        for account_id, source in TenancyService.account_tables(shared_table)[:limit]:
+            try:
+                with db.engine.begin() as connection:
+                    # Satisfies the RLS policy's WITH CHECK when it is forced on the table owner
+                    _set_tenant(connection, str(account_id))
+                    copied = connection.execute(text(
+                        f"INSERT INTO {shared_table} (account_id, {column_list}) "
+                        f"SELECT :account_id, {column_list} FROM {source} ON CONFLICT DO NOTHING"
+                    ), {"account_id": account_id}).rowcount
+                    if drop_source:
+                        connection.execute(text(f"DROP TABLE {source}"))
+                summary["tables"] += 1
+                summary["rows"] += copied
+            except Exception as e:
+                logging.error("Failed to migrate %s into %s: %s", source, shared_table, e)
+                summary["failed"][source] = str(e)
+        return summary
+
+    @staticmethod
+    def enable_rls(shared_table):
+        """Only expose rows whose account_id matches app.account_id, including to the table owner.
+
+        Superusers and roles with BYPASSRLS are never subject to policies.
+        """
+        with db.engine.begin() as connection:
+            connection.execute(text(f"ALTER TABLE {shared_table} ENABLE ROW LEVEL SECURITY"))
+            connection.execute(text(f"ALTER TABLE {shared_table} FORCE ROW LEVEL SECURITY"))
+            connection.execute(text(f"DROP POLICY IF EXISTS tenant_isolation ON {shared_table}"))
+            connection.execute(text(
+                f"CREATE POLICY tenant_isolation ON {shared_table} "
+                f"USING (account_id = NULLIF(current_setting('{TENANT_SETTING}', true), '')::integer) "
+                f"WITH CHECK (account_id = NULLIF(current_setting('{TENANT_SETTING}', true), '')::integer)"
+            ))
+
+    @staticmethod
+    def disable_rls(shared_table):
+        with db.engine.begin() as connection:
+            connection.execute(text(f"DROP POLICY IF EXISTS tenant_isolation ON {shared_table}"))
+            connection.execute(text(f"ALTER TABLE {shared_table} NO FORCE ROW LEVEL SECURITY"))
+            connection.execute(text(f"ALTER TABLE {shared_table} DISABLE ROW LEVEL SECURITY"))
+
+    @staticmethod
+    def catalog_stats():
+        """Size of the system catalogs that grow with every table"""
+        row = db.session.execute(text(
+            "SELECT (SELECT count(*) FROM pg_class) AS relations, "
+            "(SELECT count(*) FROM pg_attribute) AS attributes, "
+            "(SELECT sum(pg_total_relation_size(c.oid)) FROM pg_class c "
+            " WHERE c.relname IN ('pg_class', 'pg_attribute', 'pg_type', 'pg_depend', 'pg_index', 'pg_constraint')"
+            " AND c.relnamespace = 'pg_catalog'::regnamespace) AS catalog_bytes"
+        )).one()
+        return {
+            "relations": row.relations,
+            "attributes": row.attributes,
+            "catalog_bytes": int(row.catalog_bytes),
+            "metadata_tables": len(db.metadata.tables)
+        }
@@ -0,0 +1,79 @@
+import logging
+import threading
+from flask import current_app, has_app_context
+
+DEFAULT_WARN_AFTER = 10000
+
+
+class ModelRegistry:
+    """Process-wide cache of per-account model classes.
+
+    Building a declarative class with type() maps it and registers it with
+    db.Model's class registry, so doing it per request is slow and leaks one
+    mapper per call. Here each account's class is built once by `factory`;
+    `bootstrap` (e.g. creating a shared enum type) runs once before the first
+    build.
+
+    Classes are never evicted: SQLAlchemy has no public way to unmap a class,
+    and a class handed to one request may still be in use by another. A
+    process therefore holds one mapper per account it has served; past
+    `warn_after` accounts (DYNAMIC_MODEL_WARN_AFTER by default) this is
+    logged once so the growth is visible.
+    """
+
+    def __init__(self, factory, warn_after=None, bootstrap=None):
+        self.factory = factory
+        self._warn_after = warn_after
+        self.bootstrap = bootstrap
+        self.hits = self.misses = 0
+        self._models = {}
+        self._bootstrapped = False
+        self._warned = False
+        self._lock = threading.RLock()
+
+    def get(self, account_id):
+        key = str(account_id)
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self.hits += 1
+                return model
+
+            if not self._bootstrapped and self.bootstrap is not None:
+                self.bootstrap()
+            self._bootstrapped = True
+            model = self.factory(key)
+            self._models[key] = model
+            self.misses += 1
+            if len(self._models) > self.warn_after and not self._warned:
+                self._warned = True
+                logging.warning("%s model registry holds %s account classes (DYNAMIC_MODEL_WARN_AFTER=%s)",
+                                getattr(self.factory, '__name__', 'dynamic'), len(self._models), self.warn_after)
+            return model
+
+    @property
+    def warn_after(self):
+        # Registries are created at import time, before any app is configured
+        if self._warn_after is not None:
+            return self._warn_after
+        if has_app_context():
+            return current_app.config.get('DYNAMIC_MODEL_WARN_AFTER', DEFAULT_WARN_AFTER)
+        return DEFAULT_WARN_AFTER
+
+    def clear(self):
+        """Forget the cached classes so the next lookups rebuild them (tests and benchmarks only)"""
+        with self._lock:
+            self._models.clear()
+            self._bootstrapped = False
+            self._warned = False
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._models), "warn_after": self.warn_after,
+                    "hits": self.hits, "misses": self.misses}
+
+    def __len__(self):
+        return len(self._models)
+
+    def __contains__(self, account_id):
+        return str(account_id) in self._models
@@ -220,5 +220,195 @@ def delete_item(item_id):
     click.echo("2. Add any necessary authentication decorators")
     click.echo("3. Customize the endpoints as needed")
 
+@cli.command()
+@click.option('--account-id', type=int, help='Only rebuild rollups for this account')
+def rebuild_rollups(account_id):
+    """Backfill or rebuild the water usage rollup tables from raw logs.
+
+    Rollups are never decremented when logs are pruned, so a rebuild after
+    prune_log_partitions discards the usage history of the dropped months.
+    """
+    from app import create_app
+    from app.apps.multi_control.services import RollupService
+
+    with create_app().app_context():
+        counts = RollupService.rebuild(account_id)
+
+    for table, rows in counts.items():
+        click.echo(f"{table}: {rows} buckets")
+
+@cli.command()
+@click.option('--months-ahead', type=int, help='Months of future partitions to create')
+def ensure_log_partitions(months_ahead):
+    """Create upcoming monthly partitions of the logs table."""
+    from app import create_app
+    from app.apps.multi_control.services import LogPartitionService
+
+    app = create_app()
+    with app.app_context():
+        if months_ahead is None:
+            months_ahead = app.config['LOG_PARTITION_MONTHS_AHEAD']
+        created = LogPartitionService.ensure_partitions(months_ahead)
+
+    click.echo(f"Created partitions: {', '.join(created) or 'none'}")
+
+@cli.command()
+@click.option('--older-than-months', type=int, help='Retention window in months')
+@click.option('--archive/--drop', default=False, help='Detach partitions instead of dropping them')
+def prune_log_partitions(older_than_months, archive):
+    """Drop or archive logs partitions older than the retention window.
+
+    Water usage rollups for the removed months are kept, so reports over that
+    period keep working from the hourly/daily tables.
+    """
+    from app import create_app
+    from app.apps.multi_control.services import LogPartitionService
+
+    app = create_app()
+    with app.app_context():
+        if older_than_months is None:
+            older_than_months = app.config['LOG_RETENTION_MONTHS']
+        removed = LogPartitionService.drop_partitions(older_than_months, archive=archive)
+
+    action = 'Archived' if archive else 'Dropped'
+    click.echo(f"{action} partitions: {', '.join(removed) or 'none'}")
+
+@cli.command()
+def chunk_firmware():
+    """Move inline firmware images into chunked blob storage; they are not served until then."""
+    from app import create_app
+    from app.extensions import db
+    from app.apps.multi_control.models import Firmware
+    from app.apps.multi_control.services import FirmwareStorageService
+
+    app = create_app()
+    moved = 0
+    with app.app_context():
+        pending = [fw_id for (fw_id,) in db.session.query(Firmware.id).filter(
+            Firmware.sha256.is_(None), Firmware.file_data.isnot(None)
+        )]
+        for fw_id in pending:
+            firmware = db.session.get(Firmware, fw_id)
+            FirmwareStorageService.ensure_chunked(firmware, app.config['FIRMWARE_CHUNK_SIZE'])
+            db.session.commit()
+            db.session.expunge(firmware)
+            moved += 1
+
+    click.echo(f"Chunked {moved} firmware images")
+
+@cli.command()
+@click.option('--interval', type=float, help='Seconds between ticks')
+@click.option('--once', is_flag=True, help='Advance rollouts once and exit')
+def run_rollout_worker(interval, once):
+    """Advance staged firmware rollouts in a dedicated process."""
+    import time
+    from app import create_app
+    from app.extensions import db
+    from app.apps.multi_control.services import RolloutService
+
+    app = create_app()
+    interval = interval or app.config['ROLLOUT_TICK_INTERVAL'] or 10
+    while True:
+        with app.app_context():
+            try:
+                started = RolloutService.tick(
+                    app.config['ROLLOUT_MAX_CONCURRENT_DOWNLOADS'], app.config['ROLLOUT_TARGET_TIMEOUT']
+                )
+                if started:
+                    click.echo(f"Started downloads: {started}")
+            finally:
+                db.session.remove()
+        if once:
+            break
+        time.sleep(interval)
+
+@cli.command()
+@click.option('--interval', type=float, default=None, help='Max seconds between ticks; defaults to IRRIGATION_SCHEDULER_INTERVAL')
+def run_irrigation_scheduler(interval):
+    """Run irrigation plans; only one process at a time holds the scheduler lock and dispatches."""
+    from app import create_app
+    from app.apps.multi_control.services import IrrigationScheduler
+
+    app = create_app()
+    interval = interval or app.config['IRRIGATION_SCHEDULER_INTERVAL'] or 30
+    click.echo(f"Running irrigation plans (waking at least every {interval}s)")
+    IrrigationScheduler.default.run(app, interval, app.config['IRRIGATION_LOG_BATCH_SIZE'])
+
+@cli.command()
+def sync_sims():
+    """Sync the Soracom SIM inventory into the sims table."""
+    from app import create_app
+    from app.apps.multi_control.services import SimSyncService
+    from app.services.soracom_service import get_soracom_client
+
+    app = create_app()
+    with app.app_context():
+        run = SimSyncService.sync(
+            get_soracom_client(app),
+            statuses=app.config['SORACOM_SYNC_STATUSES'],
+            page_size=app.config['SORACOM_SYNC_PAGE_SIZE'],
+            batch_size=app.config['SORACOM_SYNC_BATCH_SIZE'],
+            controller_tag=app.config['SORACOM_CONTROLLER_TAG']
+        )
+        click.echo(f"SIM sync {run.status}: {run.fetched} fetched, {run.changed} changed in {run.duration_ms} ms")
+        if run.error:
+            click.echo(run.error)
+
+@cli.command()
+@click.option('--hours', type=int, default=None, help='Completed hours to (re)ingest; defaults to SORACOM_USAGE_LOOKBACK_HOURS')
+def ingest_sim_usage(hours):
+    """Pull hourly Soracom data usage for every known SIM."""
+    from datetime import datetime, timedelta
+    from app import create_app
+    from app.apps.multi_control.services import CellularUsageService
+    from app.services.soracom_service import get_soracom_client
+
+    app = create_app()
+    with app.app_context():
+        end = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        start = end - timedelta(hours=hours or app.config['SORACOM_USAGE_LOOKBACK_HOURS'])
+        result = CellularUsageService.ingest(
+            get_soracom_client(app), start, end, batch_size=app.config['SORACOM_USAGE_BATCH_SIZE']
+        )
+        click.echo(f"Ingested {result['rows']} hourly rows for {result['sims']} SIMs ({start} - {end})")
+        for imsi, error in result['errors'].items():
+            click.echo(f"{imsi}: {error}")
+
+@cli.command()
+@click.option('--table', 'tables', type=click.Choice(['multi_controls', 'tasks']), multiple=True,
+              help='Shared table to fill; defaults to both')
+@click.option('--drop-source/--keep-source', default=False, help='Drop each per-account table once copied')
+@click.option('--limit', type=int, default=None, help='Only migrate this many accounts per table')
+def migrate_tenant_tables(tables, drop_source, limit):
+    """Copy <app>_<account_id> tables into the shared tables used by TENANCY_MODE=shared."""
+    from app import create_app
+    from app.services.tenancy import TenancyService
+
+    app = create_app()
+    with app.app_context():
+        for table in tables or ('multi_controls', 'tasks'):
+            summary = TenancyService.migrate_account_tables(table, drop_source=drop_source, limit=limit)
+            click.echo(f"{table}: {summary['rows']} rows from {summary['tables']} tables")
+            for source, error in summary['failed'].items():
+                click.echo(f"  {source} failed: {error}")
+
+@cli.command()
+@click.option('--table', 'tables', type=click.Choice(['multi_controls', 'tasks']), multiple=True,
+              help='Shared table to change; defaults to both')
+@click.option('--enable/--disable', default=True, help='Create or drop the tenant isolation policy')
+def tenant_rls(tables, enable):
+    """Turn row-level security on the shared tenant tables on or off (pair with TENANCY_RLS=true)."""
+    from app import create_app
+    from app.services.tenancy import TenancyService
+
+    app = create_app()
+    with app.app_context():
+        for table in tables or ('multi_controls', 'tasks'):
+            if enable:
+                TenancyService.enable_rls(table)
+            else:
+                TenancyService.disable_rls(table)
+            click.echo(f"Row-level security {'enabled' if enable else 'disabled'} on {table}")
+
 if __name__ == '__main__':
     cli() 
\ No newline at end of file
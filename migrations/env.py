@@ -12,8 +12,10 @@ from app.models.app_model import App
 from app.models.user_app import UserApp
 from app.apps.multi_control.models import (
     Field, Equipment, Zone, IrrigationPlan,
-    Alert, Log, Firmware
+    Alert, Log, Firmware, FirmwareChunk, FirmwareDelta, FirmwareRollout, FirmwareRolloutTarget, Geometry,
+    SimCard, SimSyncRun, SimUsageHourly, WaterUsageHourly, WaterUsageDaily, SharedMultiControl
 )
+from app.apps.task_manager.models import SharedTask
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,45 @@
+"""field_zone_geometries
+
+Revision ID: 0a6e5c8f7b92
+Revises: f4a09d6b3e21
+Create Date: 2026-10-17 19:38:51.007342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0a6e5c8f7b92'
+down_revision = 'f4a09d6b3e21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('geometries',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('owner_type', sa.String(length=10), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('source', sa.String(length=3), nullable=False),
+    sa.Column('geojson', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('min_lon', sa.Float(), nullable=False),
+    sa.Column('min_lat', sa.Float(), nullable=False),
+    sa.Column('max_lon', sa.Float(), nullable=False),
+    sa.Column('max_lat', sa.Float(), nullable=False),
+    sa.Column('area', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('owner_type', 'owner_id', name='uix_geometries_owner')
+    )
+    with op.batch_alter_table('geometries', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_geometries_account_id'), ['account_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('geometries', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_geometries_account_id'))
+
+    op.drop_table('geometries')
@@ -0,0 +1,29 @@
+"""geometry_simplified_levels
+
+Revision ID: 2b7d9e0c4f16
+Revises: 0a6e5c8f7b92
+Create Date: 2026-10-17 20:12:06.418529
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '2b7d9e0c4f16'
+down_revision = '0a6e5c8f7b92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('geometries', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('digest', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('simplified', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('geometries', schema=None) as batch_op:
+        batch_op.drop_column('simplified')
+        batch_op.drop_column('digest')
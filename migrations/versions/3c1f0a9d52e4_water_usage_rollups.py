@@ -0,0 +1,44 @@
+"""water_usage_rollups
+
+Revision ID: 3c1f0a9d52e4
+Revises: 7899a2e478ce
+Create Date: 2026-10-17 16:40:12.418202
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1f0a9d52e4'
+down_revision = '7899a2e478ce'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table_name in ('water_usage_hourly', 'water_usage_daily'):
+        op.create_table(table_name,
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.Column('field_id', sa.Integer(), nullable=False),
+        sa.Column('zone_id', sa.Integer(), nullable=False),
+        sa.Column('bucket', sa.DateTime(), nullable=False),
+        sa.Column('water_volume', sa.Float(), nullable=False),
+        sa.Column('duration', sa.Float(), nullable=False),
+        sa.Column('event_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('account_id', 'field_id', 'zone_id', 'bucket', name=f'uix_{table_name}_bucket')
+        )
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            batch_op.create_index(batch_op.f(f'ix_{table_name}_account_id'), ['account_id'], unique=False)
+            batch_op.create_index(batch_op.f(f'ix_{table_name}_field_id'), ['field_id'], unique=False)
+
+
+def downgrade():
+    for table_name in ('water_usage_daily', 'water_usage_hourly'):
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            batch_op.drop_index(batch_op.f(f'ix_{table_name}_field_id'))
+            batch_op.drop_index(batch_op.f(f'ix_{table_name}_account_id'))
+
+        op.drop_table(table_name)
@@ -0,0 +1,45 @@
+"""chunked_firmware_storage
+
+Revision ID: 5c3e8a1f9d24
+Revises: 2b7d9e0c4f16
+Create Date: 2026-10-17 20:41:33.570912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c3e8a1f9d24'
+down_revision = '2b7d9e0c4f16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('firmware_chunks',
+    sa.Column('firmware_id', sa.Integer(), nullable=False),
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('offset', sa.BigInteger(), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('digest', sa.String(length=64), nullable=False),
+    sa.ForeignKeyConstraint(['firmware_id'], ['firmware.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('firmware_id', 'seq')
+    )
+    with op.batch_alter_table('firmware_chunks', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_firmware_chunks_digest'), ['digest'], unique=False)
+
+    with op.batch_alter_table('firmware', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('sha256', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('chunk_size', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('firmware', schema=None) as batch_op:
+        batch_op.drop_column('chunk_size')
+        batch_op.drop_column('sha256')
+
+    with op.batch_alter_table('firmware_chunks', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_firmware_chunks_digest'))
+
+    op.drop_table('firmware_chunks')
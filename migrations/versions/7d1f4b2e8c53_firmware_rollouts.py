@@ -0,0 +1,70 @@
+"""firmware_rollouts
+
+Revision ID: 7d1f4b2e8c53
+Revises: 5c3e8a1f9d24
+Create Date: 2026-10-17 21:05:47.281364
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d1f4b2e8c53'
+down_revision = '5c3e8a1f9d24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('firmware_rollouts',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('firmware_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('wave_size', sa.Integer(), nullable=False),
+    sa.Column('max_concurrency', sa.Integer(), nullable=False),
+    sa.Column('error_threshold', sa.Float(), nullable=False),
+    sa.Column('min_samples', sa.Integer(), nullable=False),
+    sa.Column('paused_reason', sa.String(length=255), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('completed_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['firmware_id'], ['firmware.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('firmware_rollouts', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_firmware_rollouts_account_id'), ['account_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_firmware_rollouts_firmware_id'), ['firmware_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_firmware_rollouts_status'), ['status'], unique=False)
+
+    op.create_table('firmware_rollout_targets',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('rollout_id', sa.Integer(), nullable=False),
+    sa.Column('equipment_id', sa.Integer(), nullable=False),
+    sa.Column('wave', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('error', sa.String(length=255), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['equipment_id'], ['equipment.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['rollout_id'], ['firmware_rollouts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('firmware_rollout_targets', schema=None) as batch_op:
+        batch_op.create_index('ix_firmware_rollout_targets_equipment_status', ['equipment_id', 'status'], unique=False)
+        batch_op.create_index('ix_firmware_rollout_targets_rollout_status', ['rollout_id', 'status', 'wave'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('firmware_rollout_targets', schema=None) as batch_op:
+        batch_op.drop_index('ix_firmware_rollout_targets_rollout_status')
+        batch_op.drop_index('ix_firmware_rollout_targets_equipment_status')
+
+    op.drop_table('firmware_rollout_targets')
+    with op.batch_alter_table('firmware_rollouts', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_firmware_rollouts_status'))
+        batch_op.drop_index(batch_op.f('ix_firmware_rollouts_firmware_id'))
+        batch_op.drop_index(batch_op.f('ix_firmware_rollouts_account_id'))
+
+    op.drop_table('firmware_rollouts')
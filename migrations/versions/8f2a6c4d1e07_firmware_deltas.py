@@ -0,0 +1,40 @@
+"""firmware_deltas
+
+Revision ID: 8f2a6c4d1e07
+Revises: 7d1f4b2e8c53
+Create Date: 2026-10-17 21:38:12.604193
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f2a6c4d1e07'
+down_revision = '7d1f4b2e8c53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('firmware_deltas',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('source_id', sa.Integer(), nullable=False),
+    sa.Column('target_id', sa.Integer(), nullable=False),
+    sa.Column('digest', sa.String(length=64), nullable=True),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['source_id'], ['firmware.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['target_id'], ['firmware.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('source_id', 'target_id', name='uix_firmware_deltas_pair')
+    )
+    with op.batch_alter_table('firmware_deltas', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_firmware_deltas_target_id'), ['target_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('firmware_deltas', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_firmware_deltas_target_id'))
+
+    op.drop_table('firmware_deltas')
@@ -0,0 +1,109 @@
+"""partition_logs_by_month
+
+Revision ID: 9e4b27c1d8f0
+Revises: 3c1f0a9d52e4
+Create Date: 2026-10-17 17:05:44.902113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4b27c1d8f0'
+down_revision = '3c1f0a9d52e4'
+branch_labels = None
+depends_on = None
+
+
+LOG_INDEXES = ('account_id', 'event_type', 'field_id')
+
+# Months of partitions created beyond the current one; later months are
+# added by `python manage.py ensure_log_partitions`.
+MONTHS_AHEAD = 3
+
+
+def _rename_existing(suffix):
+    op.execute(f"ALTER TABLE logs RENAME TO logs{suffix}")
+    op.execute(f"ALTER TABLE logs{suffix} RENAME CONSTRAINT logs_pkey TO logs{suffix}_pkey")
+    op.execute(f"ALTER TABLE logs{suffix} RENAME CONSTRAINT logs_field_id_fkey TO logs{suffix}_field_id_fkey")
+    op.execute(f"ALTER SEQUENCE logs_id_seq RENAME TO logs{suffix}_id_seq")
+    for column in LOG_INDEXES:
+        op.execute(f"ALTER INDEX ix_logs_{column} RENAME TO ix_logs{suffix}_{column}")
+
+
+def _copy_and_drop(suffix):
+    op.execute(
+        "INSERT INTO logs (id, account_id, user_id, field_id, event_type, event_data, timestamp) "
+        f"SELECT id, account_id, user_id, field_id, event_type, event_data, timestamp FROM logs{suffix}"
+    )
+    op.execute("SELECT setval('logs_id_seq', COALESCE((SELECT MAX(id) FROM logs), 0) + 1, false)")
+    op.drop_table(f'logs{suffix}')
+
+
+def upgrade():
+    _rename_existing('_unpartitioned')
+
+    op.execute("""
+        CREATE TABLE logs (
+            id SERIAL NOT NULL,
+            account_id INTEGER NOT NULL,
+            user_id INTEGER,
+            field_id INTEGER NOT NULL REFERENCES fields (id) ON DELETE CASCADE,
+            event_type VARCHAR(100),
+            event_data JSONB,
+            timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """)
+    with op.batch_alter_table('logs', schema=None) as batch_op:
+        for column in LOG_INDEXES:
+            batch_op.create_index(batch_op.f(f'ix_logs_{column}'), [column], unique=False)
+
+    # One partition per month from the oldest existing row through MONTHS_AHEAD
+    op.execute(f"""
+        DO $$
+        DECLARE
+            month_start DATE;
+        BEGIN
+            FOR month_start IN
+                SELECT generate_series(
+                    date_trunc('month', COALESCE((SELECT MIN(timestamp) FROM logs_unpartitioned), now())),
+                    date_trunc('month', now()) + interval '{MONTHS_AHEAD} months',
+                    interval '1 month'
+                )::date
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF logs FOR VALUES FROM (%L) TO (%L)',
+                    'logs_' || to_char(month_start, 'YYYY_MM'),
+                    month_start,
+                    month_start + interval '1 month'
+                );
+            END LOOP;
+        END $$
+    """)
+    op.execute("CREATE TABLE logs_default PARTITION OF logs DEFAULT")
+
+    _copy_and_drop('_unpartitioned')
+
+
+def downgrade():
+    _rename_existing('_partitioned')
+
+    op.create_table('logs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('field_id', sa.Integer(), nullable=False),
+    sa.Column('event_type', sa.String(length=100), nullable=True),
+    sa.Column('event_data', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    sa.Column('timestamp', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['field_id'], ['fields.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('logs', schema=None) as batch_op:
+        for column in LOG_INDEXES:
+            batch_op.create_index(batch_op.f(f'ix_logs_{column}'), [column], unique=False)
+
+    _copy_and_drop('_partitioned')
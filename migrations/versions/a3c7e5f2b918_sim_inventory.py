@@ -0,0 +1,59 @@
+"""sim_inventory
+
+Revision ID: a3c7e5f2b918
+Revises: 8f2a6c4d1e07
+Create Date: 2026-10-17 22:04:55.917260
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c7e5f2b918'
+down_revision = '8f2a6c4d1e07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sims',
+    sa.Column('imsi', sa.String(length=15), nullable=False),
+    sa.Column('iccid', sa.String(length=22), nullable=True),
+    sa.Column('msisdn', sa.String(length=20), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('speed_class', sa.String(length=30), nullable=True),
+    sa.Column('group_id', sa.String(length=64), nullable=True),
+    sa.Column('online', sa.Boolean(), nullable=True),
+    sa.Column('tags', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    sa.Column('controller_id', sa.String(length=50), nullable=True),
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('modified_at', sa.DateTime(), nullable=True),
+    sa.Column('synced_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('imsi')
+    )
+    with op.batch_alter_table('sims', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_sims_controller_id'), ['controller_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_sims_iccid'), ['iccid'], unique=False)
+
+    op.create_table('sim_sync_runs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('duration_ms', sa.Integer(), nullable=True),
+    sa.Column('fetched', sa.Integer(), nullable=False),
+    sa.Column('changed', sa.Integer(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('sim_sync_runs')
+    with op.batch_alter_table('sims', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_sims_iccid'))
+        batch_op.drop_index(batch_op.f('ix_sims_controller_id'))
+
+    op.drop_table('sims')
@@ -0,0 +1,38 @@
+"""alert_occurrences
+
+Revision ID: a8d2f6c4e017
+Revises: f1c5a7e3b924
+Create Date: 2026-10-18 03:22:41.905317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8d2f6c4e017'
+down_revision = 'f1c5a7e3b924'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('alerts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('occurrence_count', sa.Integer(), server_default='1', nullable=False))
+        batch_op.add_column(sa.Column('last_seen', sa.DateTime(), nullable=True))
+
+    op.execute("UPDATE alerts SET last_seen = created_at")
+
+    with op.batch_alter_table('alerts', schema=None) as batch_op:
+        batch_op.alter_column('last_seen', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_index(
+            'ix_alerts_dedup', ['account_id', 'field_id', 'alert_type', 'last_seen'], unique=False,
+            postgresql_where=sa.text('resolved = false')
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('alerts', schema=None) as batch_op:
+        batch_op.drop_index('ix_alerts_dedup')
+        batch_op.drop_column('last_seen')
+        batch_op.drop_column('occurrence_count')
@@ -0,0 +1,44 @@
+"""multi_control_composite_indexes
+
+Revision ID: b52d8e6a0f17
+Revises: 9e4b27c1d8f0
+Create Date: 2026-10-17 17:31:08.224519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b52d8e6a0f17'
+down_revision = '9e4b27c1d8f0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('equipment', schema=None) as batch_op:
+        batch_op.create_index('ix_equipment_account_status', ['account_id', 'status'], unique=False)
+
+    with op.batch_alter_table('alerts', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_alerts_account_unresolved', ['account_id', 'created_at'], unique=False,
+            postgresql_where=sa.text('resolved = false')
+        )
+
+    # Created on the partitioned parent; Postgres cascades them to every partition
+    with op.batch_alter_table('logs', schema=None) as batch_op:
+        batch_op.create_index('ix_logs_account_event_timestamp', ['account_id', 'event_type', 'timestamp'], unique=False)
+        batch_op.create_index('ix_logs_account_timestamp', ['account_id', 'timestamp', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('logs', schema=None) as batch_op:
+        batch_op.drop_index('ix_logs_account_timestamp')
+        batch_op.drop_index('ix_logs_account_event_timestamp')
+
+    with op.batch_alter_table('alerts', schema=None) as batch_op:
+        batch_op.drop_index('ix_alerts_account_unresolved')
+
+    with op.batch_alter_table('equipment', schema=None) as batch_op:
+        batch_op.drop_index('ix_equipment_account_status')
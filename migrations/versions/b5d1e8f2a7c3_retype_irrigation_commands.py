@@ -0,0 +1,52 @@
+"""retype_irrigation_commands
+
+Revision ID: b5d1e8f2a7c3
+Revises: c3e9b7d15a42
+Create Date: 2026-10-18 14:07:53.118204
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d1e8f2a7c3'
+down_revision = 'c3e9b7d15a42'
+branch_labels = None
+depends_on = None
+
+# zone_on/zone_off commands the irrigation scheduler logged as irrigation_event
+SCHEDULER_COMMANDS = """
+    event_type = '{event_type}' AND event_data ? 'run_started_at'
+    AND event_data->>'action' IN ('zone_on', 'zone_off')
+"""
+
+
+def upgrade():
+    # The commands carried no volume or duration, so they only inflated event_count;
+    # take them back out of the buckets they were folded into.
+    for table, granularity in (('water_usage_hourly', 'hour'), ('water_usage_daily', 'day')):
+        op.execute(f"""
+            UPDATE {table} AS rollup SET event_count = rollup.event_count - commands.n
+            FROM (
+                SELECT account_id, field_id, COALESCE((event_data->>'zone_id')::int, 0) AS zone_id,
+                       date_trunc('{granularity}', timestamp) AS bucket, count(*) AS n
+                FROM logs WHERE {SCHEDULER_COMMANDS.format(event_type='irrigation_event')}
+                GROUP BY 1, 2, 3, 4
+            ) AS commands
+            WHERE rollup.account_id = commands.account_id AND rollup.field_id = commands.field_id
+              AND rollup.zone_id = commands.zone_id AND rollup.bucket = commands.bucket
+        """)
+        op.execute(f"DELETE FROM {table} WHERE event_count <= 0 AND water_volume = 0 AND duration = 0")
+
+    op.execute(f"""
+        UPDATE logs SET event_type = 'irrigation_command'
+        WHERE {SCHEDULER_COMMANDS.format(event_type='irrigation_event')}
+    """)
+
+
+def downgrade():
+    # Rollups are left as they are; `flask rebuild_rollups` recounts them if needed
+    op.execute(f"""
+        UPDATE logs SET event_type = 'irrigation_event'
+        WHERE {SCHEDULER_COMMANDS.format(event_type='irrigation_command')}
+    """)
@@ -0,0 +1,28 @@
+"""change_feed_statement_logs_trigger
+
+Revision ID: c3e9b7d15a42
+Revises: a8d2f6c4e017
+Create Date: 2026-10-18 09:41:12.206318
+
+"""
+from alembic import op
+
+from app.apps.multi_control.change_feed import INSTALL_SQL
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e9b7d15a42'
+down_revision = 'a8d2f6c4e017'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases migrated before the logs trigger became statement-level still
+    # fire it per row; the install is idempotent and replaces it.
+    op.execute(INSTALL_SQL)
+
+
+def downgrade():
+    # The per-row logs trigger is not restored; d7a3f91c2b60 owns the feed's teardown.
+    pass
@@ -0,0 +1,32 @@
+"""sim_usage_hourly
+
+Revision ID: c4e9a1d7f230
+Revises: a3c7e5f2b918
+Create Date: 2026-10-17 23:12:08.441905
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e9a1d7f230'
+down_revision = 'a3c7e5f2b918'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sim_usage_hourly',
+    sa.Column('imsi', sa.String(length=15), nullable=False),
+    sa.Column('bucket', sa.DateTime(), nullable=False),
+    sa.Column('upload_bytes', sa.BigInteger(), nullable=False),
+    sa.Column('download_bytes', sa.BigInteger(), nullable=False),
+    sa.Column('upload_packets', sa.BigInteger(), nullable=False),
+    sa.Column('download_packets', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('imsi', 'bucket')
+    )
+
+
+def downgrade():
+    op.drop_table('sim_usage_hourly')
@@ -0,0 +1,25 @@
+"""multi_control_change_feed
+
+Revision ID: d7a3f91c2b60
+Revises: b52d8e6a0f17
+Create Date: 2026-10-17 18:12:37.551930
+
+"""
+from alembic import op
+
+from app.apps.multi_control.change_feed import INSTALL_SQL, UNINSTALL_SQL
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a3f91c2b60'
+down_revision = 'b52d8e6a0f17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(INSTALL_SQL)
+
+
+def downgrade():
+    op.execute(UNINSTALL_SQL)
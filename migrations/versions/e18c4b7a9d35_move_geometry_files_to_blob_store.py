@@ -0,0 +1,73 @@
+"""move_geometry_files_to_blob_store
+
+Revision ID: e18c4b7a9d35
+Revises: d7a3f91c2b60
+Create Date: 2026-10-17 18:47:20.130774
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from flask import current_app
+from app.services.blob_store import get_blob_store
+
+
+# revision identifiers, used by Alembic.
+revision = 'e18c4b7a9d35'
+down_revision = 'd7a3f91c2b60'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ('fields', 'zones')
+KINDS = ('kml', 'shp')
+
+
+def upgrade():
+    store = get_blob_store(current_app)
+    connection = op.get_bind()
+
+    for table in TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for kind in KINDS:
+                batch_op.add_column(sa.Column(f'{kind}_blob', sa.String(length=64), nullable=True))
+
+        # Row by row with a server-side cursor so only one file is in memory at a time
+        for kind in KINDS:
+            rows = connection.execution_options(stream_results=True, yield_per=100).execute(sa.text(
+                f"SELECT id, {kind}_file FROM {table} WHERE {kind}_file IS NOT NULL"
+            ))
+            for row_id, data in rows:
+                digest, _ = store.put_bytes(bytes(data))
+                op.execute(sa.text(
+                    f"UPDATE {table} SET {kind}_blob = :digest WHERE id = :id"
+                ).bindparams(digest=digest, id=row_id))
+
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for kind in KINDS:
+                batch_op.drop_column(f'{kind}_file')
+
+
+def downgrade():
+    store = get_blob_store(current_app)
+    connection = op.get_bind()
+
+    for table in TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for kind in KINDS:
+                batch_op.add_column(sa.Column(f'{kind}_file', sa.LargeBinary(), nullable=True))
+
+        for kind in KINDS:
+            rows = connection.execute(sa.text(
+                f"SELECT id, {kind}_blob FROM {table} WHERE {kind}_blob IS NOT NULL"
+            )).all()
+            for row_id, digest in rows:
+                if not store.exists(digest):
+                    continue
+                with store.open(digest) as blob:
+                    op.execute(sa.text(
+                        f"UPDATE {table} SET {kind}_file = :data WHERE id = :id"
+                    ).bindparams(data=blob.read(), id=row_id))
+
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for kind in KINDS:
+                batch_op.drop_column(f'{kind}_blob')
@@ -0,0 +1,58 @@
+"""shared_tenant_tables
+
+Revision ID: e6b0d3a8c512
+Revises: c4e9a1d7f230
+Create Date: 2026-10-18 00:21:37.604118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6b0d3a8c512'
+down_revision = 'c4e9a1d7f230'
+branch_labels = None
+depends_on = None
+
+
+# Shared tables used when TENANCY_MODE=shared; per-account tables are moved
+# in with `python manage.py migrate_tenant_tables`.
+PARTITIONS = 16
+ENUMS = {'controlstatus': ('ACTIVE', 'INACTIVE'), 'taskstatus': ('PENDING', 'COMPLETED')}
+
+
+def _create_shared(table, status_type):
+    op.create_table(table,
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('title', sa.String(length=255), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('status', postgresql.ENUM(*ENUMS[status_type], name=status_type, create_type=False), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('account_id', 'id'),
+    postgresql_partition_by='HASH (account_id)'
+    )
+    for remainder in range(PARTITIONS):
+        op.execute(
+            f"CREATE TABLE {table}_p{remainder} PARTITION OF {table} "
+            f"FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {remainder})"
+        )
+
+
+def upgrade():
+    for name, values in ENUMS.items():
+        labels = ', '.join(f"'{value}'" for value in values)
+        op.execute(
+            f"DO $$ BEGIN CREATE TYPE {name} AS ENUM ({labels}); "
+            "EXCEPTION WHEN duplicate_object THEN NULL; END $$"
+        )
+    _create_shared('multi_controls', 'controlstatus')
+    _create_shared('tasks', 'taskstatus')
+
+
+def downgrade():
+    # Partitions are dropped with their parent; the enum types stay in use by per-account tables
+    op.drop_table('tasks')
+    op.drop_table('multi_controls')
@@ -0,0 +1,28 @@
+"""irrigation_plan_updated_at
+
+Revision ID: f1c5a7e3b924
+Revises: e6b0d3a8c512
+Create Date: 2026-10-18 01:47:12.380551
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c5a7e3b924'
+down_revision = 'e6b0d3a8c512'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('irrigation_plans', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), server_default=sa.text("(now() at time zone 'utc')"), nullable=False))
+        batch_op.create_index(batch_op.f('ix_irrigation_plans_updated_at'), ['updated_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('irrigation_plans', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_irrigation_plans_updated_at'))
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,52 @@
+"""blob_size_metadata
+
+Revision ID: f4a09d6b3e21
+Revises: e18c4b7a9d35
+Create Date: 2026-10-17 19:10:05.662318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from flask import current_app
+from app.services.blob_store import get_blob_store
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4a09d6b3e21'
+down_revision = 'e18c4b7a9d35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    store = get_blob_store(current_app)
+    connection = op.get_bind()
+
+    for table in ('fields', 'zones'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('kml_size', sa.BigInteger(), nullable=True))
+            batch_op.add_column(sa.Column('shp_size', sa.BigInteger(), nullable=True))
+
+        for kind in ('kml', 'shp'):
+            rows = connection.execute(sa.text(
+                f"SELECT id, {kind}_blob FROM {table} WHERE {kind}_blob IS NOT NULL"
+            )).all()
+            for row_id, digest in rows:
+                if store.exists(digest):
+                    op.execute(sa.text(
+                        f"UPDATE {table} SET {kind}_size = :size WHERE id = :id"
+                    ).bindparams(size=store.size(digest), id=row_id))
+
+    with op.batch_alter_table('firmware', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('file_size', sa.BigInteger(), nullable=True))
+    op.execute("UPDATE firmware SET file_size = octet_length(file_data) WHERE file_data IS NOT NULL")
+
+
+def downgrade():
+    with op.batch_alter_table('firmware', schema=None) as batch_op:
+        batch_op.drop_column('file_size')
+
+    for table in ('zones', 'fields'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('shp_size')
+            batch_op.drop_column('kml_size')
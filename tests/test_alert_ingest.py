@@ -0,0 +1,127 @@
+import json
+from datetime import datetime, timedelta
+import pytest
+from app.extensions import db
+from app.apps.multi_control.models import Field, Alert
+from app.apps.multi_control.services import AlertIngestService
+
+NOW = datetime(2026, 10, 18, 12, 0)
+
+
+def test_repeats_coalesce_in_memory():
+    ingest = AlertIngestService(rate=0)
+    for minute in range(1000):
+        ingest.submit(1, 7, 'pressure_low', f'reading {minute}', NOW + timedelta(minutes=minute % 60))
+    ingest.submit(1, 7, 'flow_high', 'spike', NOW)
+    assert ingest.pending() == 2
+    entry = ingest._pending[(1, 7, 'pressure_low')]
+    assert entry['count'] == 1000
+    assert (entry['first_seen'], entry['last_seen']) == (NOW, NOW + timedelta(minutes=59))
+    assert entry['message'] == 'reading 959'  # latest of the ones seen last
+
+
+def test_token_bucket_limits_each_account():
+    ingest = AlertIngestService(rate=1, burst=3)
+    results = [ingest.submit(1, 7, f'type_{i}', 'x') for i in range(5)]
+    assert results[:3] == [None, None, None]
+    assert all(0 < retry_after <= 1 for retry_after in results[3:])
+    assert ingest.rate_limited == 2
+    # Other accounts have their own bucket
+    assert ingest.submit(2, 8, 'type_0', 'x') is None
+
+    tokens, updated = ingest._buckets[1]
+    ingest._buckets[1] = (tokens, updated - 2)  # as if two seconds had passed
+    assert ingest.submit(1, 7, 'type_5', 'x') is None
+
+
+@pytest.fixture
+def field(app):
+    field = Field(account_id=1, name='Orchard')
+    db.session.add(field)
+    db.session.commit()
+    return field
+
+
+def test_flush_folds_repeats_into_the_open_alert(field):
+    ingest = AlertIngestService(window=3600, rate=0)
+    for _ in range(3):
+        ingest.submit(1, field.id, 'pressure_low', 'first', NOW)
+    first = ingest.flush()[(1, field.id, 'pressure_low')]
+
+    ingest.submit(1, field.id, 'pressure_low', 'again', NOW + timedelta(minutes=30))
+    assert ingest.flush()[(1, field.id, 'pressure_low')] == first
+    alert = db.session.get(Alert, first)
+    assert (alert.occurrence_count, alert.message) == (4, 'again')
+    assert (alert.created_at, alert.last_seen) == (NOW, NOW + timedelta(minutes=30))
+
+    # Outside the window, or once resolved, a repeat opens a new alert
+    ingest.submit(1, field.id, 'pressure_low', 'later', NOW + timedelta(hours=2))
+    later = ingest.flush()[(1, field.id, 'pressure_low')]
+    assert later != first
+    db.session.get(Alert, later).resolved = True
+    db.session.commit()
+    ingest.submit(1, field.id, 'pressure_low', 'reopened', NOW + timedelta(hours=2, minutes=1))
+    assert ingest.flush()[(1, field.id, 'pressure_low')] not in (first, later)
+    assert Alert.query.count() == 3
+
+
+def test_alerts_for_missing_fields_are_dropped_and_counted(field):
+    ingest = AlertIngestService(rate=0)
+    ingest.submit(1, field.id + 1000, 'pressure_low', 'orphan')
+    ingest.submit(2, field.id, 'pressure_low', 'other account')
+    ingest.submit(2, field.id, 'pressure_low', 'other account')
+    ingest.submit(1, field.id, 'pressure_low', 'kept')
+    assert list(ingest.flush()) == [(1, field.id, 'pressure_low')]
+    assert ingest.pending() == 0
+    assert ingest.dropped == 3
+    assert Alert.query.count() == 1
+
+
+@pytest.mark.parametrize('queued', [False, True])
+def test_create_alert_checks_the_field_before_queueing(app, field, monkeypatch, queued):
+    client = app.test_client()
+    monkeypatch.setattr(AlertIngestService.default, 'ensure_worker', lambda app: queued)
+    body = {'field_id': field.id, 'account_id': 2, 'alert_type': 'pressure_low', 'message': 'low'}
+    assert client.post('/multi_controls/alerts/', json=body).status_code == 404
+    missing = {**body, 'account_id': 1, 'field_id': field.id + 1000}
+    assert client.post('/multi_controls/alerts/', json=missing).status_code == 404
+    assert client.post('/multi_controls/alerts/', json={**body, 'field_id': 'north'}).status_code == 400
+    assert AlertIngestService.default.pending() == 0
+
+    response = client.post('/multi_controls/alerts/', json={**body, 'account_id': 1})
+    assert response.status_code == (202 if queued else 201)
+    AlertIngestService.default.flush()
+
+
+def test_create_alert_route_coalesces_and_rate_limits(app, field):
+    client = app.test_client()
+    AlertIngestService.default.configure(3600, 1, 2, 500)
+    AlertIngestService.default._buckets.clear()
+    try:
+        body = {'field_id': field.id, 'account_id': 1, 'alert_type': 'pressure_low', 'message': 'low'}
+        ids = [json.loads(client.post('/multi_controls/alerts/', json=body).data)['id'] for _ in range(2)]
+        assert ids[0] == ids[1]
+
+        response = client.post('/multi_controls/alerts/', json=body)
+        assert response.status_code == 429 and response.headers['Retry-After'] == '1'
+
+        alerts = json.loads(client.get('/multi_controls/alerts/?account_id=1').data)
+        assert [alert['occurrence_count'] for alert in alerts] == [2]
+    finally:
+        AlertIngestService.default.configure(
+            app.config['ALERT_DEDUP_WINDOW'], app.config['ALERT_RATE_LIMIT'],
+            app.config['ALERT_RATE_BURST'], app.config['ALERT_BATCH_SIZE']
+        )
+        AlertIngestService.default._buckets.clear()
+
+
+def test_inline_create_finds_an_alert_another_request_flushed(field):
+    ingest = AlertIngestService(rate=0)
+    ingest.submit(1, field.id, 'pressure_low', 'mine')
+    # A concurrent request's flush picks up this key before ours runs
+    flushed = ingest.flush()
+    key = (1, field.id, 'pressure_low')
+    assert ingest.flush() == {}
+    assert ingest.open_alert_id(key) == flushed[key]
+    assert ingest.open_alert_id((1, field.id, 'flow_high')) is None
+
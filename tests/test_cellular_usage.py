@@ -0,0 +1,133 @@
+import json
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import pytest
+from app.extensions import db
+from app.apps.multi_control.models import Field, Equipment, SimCard, SimUsageHourly
+from app.apps.multi_control.services import CellularUsageService
+from app.services.soracom_service import SoracomClient
+
+EPOCH = datetime(1970, 1, 1)
+START = datetime(2026, 10, 1, 0, 0)
+END = START + timedelta(hours=6)
+
+
+class FakeAirStats(BaseHTTPRequestHandler):
+    """GET /v1/stats/air/subscribers/<imsi>: one entry per five minutes at each SIM's fixed rate"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        imsi = url.path.rsplit('/', 1)[-1]
+        self.server.requests.append(imsi)
+        if imsi in self.server.failing:
+            body, code = {'message': 'unavailable'}, 500
+        else:
+            rate = self.server.rates.get(imsi, 0)
+            start, end = int(query['from'][0]), int(query['to'][0])
+            body, code = [{
+                'unixtime': t,
+                'dataTrafficStatsMap': {
+                    's1.standard': {'uploadByteSizeTotal': rate, 'downloadByteSizeTotal': 2 * rate,
+                                    'uploadPacketSizeTotal': 1, 'downloadPacketSizeTotal': 1}
+                }
+            } for t in range(start - start % 300, end + 1, 300)], 200
+
+        payload = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+@pytest.fixture
+def soracom():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeAirStats)
+    server.daemon_threads = True
+    server.requests = []
+    server.failing = set()
+    server.rates = {f'44010000000000{i}': 100 for i in range(5)}
+    server.rates['440100000000004'] = 10000
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(soracom):
+    return SoracomClient(f'http://127.0.0.1:{soracom.server_port}/v1', api_key='key', token='token',
+                         max_retries=0, pool_size=4)
+
+
+@pytest.fixture
+def fleet(app):
+    field = Field(account_id=1, name='Cellular Field')
+    db.session.add(field)
+    db.session.flush()
+    for i in range(5):
+        db.session.add(Equipment(account_id=1, field_id=field.id, name=f'Cellular {i}', controller_id=f'USAGE-{i}'))
+        db.session.add(SimCard(imsi=f'44010000000000{i}', status='active', controller_id=f'USAGE-{i}',
+                               content_hash='x', synced_at=datetime.utcnow()))
+    db.session.commit()
+
+
+def test_hourly_rows_fold_five_minute_stats():
+    unixtime = int((START - EPOCH).total_seconds())
+    stats = [{'unixtime': unixtime + 300 * i, 'dataTrafficStatsMap': {
+        's1.standard': {'uploadByteSizeTotal': 10, 'downloadByteSizeTotal': 20},
+        's1.fast': {'uploadByteSizeTotal': 1}
+    }} for i in range(15)]
+    rows = CellularUsageService.hourly_rows('440100000000000', stats)
+    assert [(row['bucket'], row['upload_bytes'], row['download_bytes']) for row in rows] == [
+        (START, 132, 240), (START + timedelta(hours=1), 33, 60)
+    ]
+
+
+def test_ingest_is_batched_and_idempotent(fleet, soracom, client):
+    result = CellularUsageService.ingest(client, START, END, batch_size=2)
+    assert (result['sims'], result['rows'], result['errors']) == (5, 30, {})
+    assert len(soracom.requests) == 5
+
+    CellularUsageService.ingest(client, START + timedelta(minutes=30), END, batch_size=2)
+    assert SimUsageHourly.query.count() == 30
+    row = db.session.get(SimUsageHourly, ('440100000000000', START + timedelta(hours=1)))
+    assert (row.upload_bytes, row.download_bytes) == (1200, 2400)
+
+
+def test_failed_sims_are_reported(fleet, soracom, client):
+    soracom.failing.add('440100000000002')
+    result = CellularUsageService.ingest(client, START, END)
+    assert list(result['errors']) == ['440100000000002']
+    assert result['rows'] == 24
+
+
+def test_report_flags_runaway_controller(app, fleet, client):
+    CellularUsageService.ingest(client, START, END)
+
+    test_client = app.test_client()
+    response = test_client.get(
+        f'/multi_controls/reports/cellular-usage?account_id=1&start_date={START.isoformat()}&end_date={END.isoformat()}'
+    )
+    assert response.status_code == 200
+    report = json.loads(response.data)
+    assert report['median_bytes'] == 6 * 12 * 300
+    top = report['controllers'][0]
+    assert (top['controller_id'], top['total_bytes'], top['anomalous']) == ('USAGE-4', 6 * 12 * 30000, True)
+    assert not any(row['anomalous'] for row in report['controllers'][1:])
+
+    response = test_client.get(
+        f'/multi_controls/reports/cellular-usage/USAGE-0?account_id=1&granularity=day'
+        f'&start_date={START.isoformat()}&end_date={END.isoformat()}'
+    )
+    series = json.loads(response.data)['series']
+    assert series == [{'bucket': START.isoformat(), 'upload_bytes': 7200, 'download_bytes': 14400}]
+    assert test_client.get('/multi_controls/reports/cellular-usage?account_id=1&start_date=soon').status_code == 400
@@ -0,0 +1,112 @@
+import os
+import threading
+import time
+import pytest
+from sqlalchemy import text
+from app.extensions import db
+from app.apps.multi_control.models import Field, Equipment, Alert, Log
+from app.apps.multi_control.services import ChangeFeed
+
+# Scale with CHANGE_FEED_SUBSCRIBERS / CHANGE_FEED_CHANGES for a heavier local run
+SUBSCRIBERS = int(os.getenv('CHANGE_FEED_SUBSCRIBERS', 500))
+CHANGES = int(os.getenv('CHANGE_FEED_CHANGES', 50))
+
+
+@pytest.fixture
+def feed(app):
+    ChangeFeed.install_triggers()
+    feed = ChangeFeed()
+    feed.start(app)
+    assert feed.wait_ready(10)
+    yield feed
+    feed.stop()
+
+
+@pytest.fixture
+def field(app):
+    field = Field(account_id=1, name="Feed Field")
+    db.session.add(field)
+    db.session.commit()
+    return field
+
+
+def test_change_feed_fans_out_to_many_subscribers(feed, field):
+    received = [0] * SUBSCRIBERS
+    latencies = []
+    done = threading.Event()
+    lock = threading.Lock()
+
+    def make_subscriber(index):
+        def on_change(change):
+            with lock:
+                received[index] += 1
+                if index == 0:
+                    latencies.append(time.perf_counter() - change_sent[change['data']['alert_type']])
+                if sum(received) == SUBSCRIBERS * CHANGES:
+                    done.set()
+        return on_change
+
+    change_sent = {}
+    for index in range(SUBSCRIBERS):
+        feed.subscribe(make_subscriber(index), tables=('alerts',))
+
+    started = time.perf_counter()
+    for i in range(CHANGES):
+        change_sent[f'load_{i}'] = time.perf_counter()
+        db.session.add(Alert(account_id=1, field_id=field.id, alert_type=f'load_{i}', message='load test'))
+        db.session.commit()
+
+    assert done.wait(30), f"only {sum(received)} of {SUBSCRIBERS * CHANGES} deliveries arrived"
+    elapsed = time.perf_counter() - started
+    assert all(count == CHANGES for count in received)
+    print(
+        f"\n{SUBSCRIBERS} subscribers x {CHANGES} changes: {SUBSCRIBERS * CHANGES / elapsed:.0f} deliveries/s, "
+        f"max latency {max(latencies) * 1000:.1f} ms"
+    )
+
+
+def test_bulk_log_insert_notifies_once_per_transaction(feed, field):
+    changes = []
+    feed.subscribe(changes.append, tables=('logs',))
+
+    db.session.execute(Log.__table__.insert(), [
+        {'account_id': 1, 'field_id': field.id, 'event_type': 'telemetry', 'event_data': {}}
+        for _ in range(200)
+    ])
+    db.session.commit()
+
+    deadline = time.monotonic() + 5
+    while not changes and time.monotonic() < deadline:
+        time.sleep(0.05)
+    time.sleep(0.2)
+    assert len(changes) == 1
+    assert changes[0]['table'] == 'logs'
+    assert changes[0]['data'] == {'event_type': 'telemetry'}
+
+
+def test_logs_trigger_fires_per_statement(feed):
+    # tgtype bit 0 is set for FOR EACH ROW triggers
+    levels = dict(db.session.execute(text(
+        "SELECT tgname, tgtype & 1 FROM pg_trigger WHERE tgname LIKE '%_change_feed' AND NOT tgisinternal"
+    )).all())
+    assert levels.pop('logs_change_feed') == 0
+    assert levels and all(level == 1 for level in levels.values())
+
+
+def test_equipment_update_only_notifies_on_status_change(feed, field):
+    changes = []
+    feed.subscribe(changes.append, tables=('equipment',))
+    equipment = Equipment(account_id=1, field_id=field.id, name="Feed Controller", controller_id="FEED001")
+    db.session.add(equipment)
+    db.session.commit()
+
+    equipment.name = "Renamed"
+    db.session.commit()
+    equipment.status = 'ACTIVE'
+    db.session.commit()
+
+    deadline = time.monotonic() + 5
+    while len(changes) < 2 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    time.sleep(0.2)
+    assert [(c['op'], c['data']['status']) for c in changes] == [('insert', 'INACTIVE'), ('update', 'ACTIVE')]
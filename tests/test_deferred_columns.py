@@ -0,0 +1,66 @@
+import tracemalloc
+from datetime import datetime
+from sqlalchemy.orm import load_only
+from app.extensions import db
+from app.apps.multi_control.models import Field, Equipment, Firmware
+
+FIRMWARE_ROWS = 20
+FIRMWARE_IMAGE = b"\x00" * (512 * 1024)
+
+
+def fetched_bytes(query):
+    """Approximate payload size of the rows a query pulls from the driver"""
+    total = 0
+    for row in db.session.execute(query.statement):
+        for value in row:
+            if isinstance(value, (bytes, memoryview)):
+                total += len(value)
+            elif value is not None:
+                total += len(str(value))
+    return total
+
+
+def peak_memory(load):
+    db.session.expunge_all()
+    tracemalloc.start()
+    try:
+        load()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_firmware_listing_skips_images(app):
+    field = Field(account_id=1, name="Bench Field")
+    db.session.add(field)
+    db.session.flush()
+    equipment = Equipment(account_id=1, field_id=field.id, name="Bench Controller", controller_id="BENCH001")
+    db.session.add(equipment)
+    db.session.flush()
+    for i in range(FIRMWARE_ROWS):
+        db.session.add(Firmware(
+            account_id=1, equipment_id=equipment.id, version=f"1.0.{i}",
+            release_date=datetime.utcnow(), file_data=FIRMWARE_IMAGE
+        ))
+    db.session.commit()
+
+    eager = Firmware.query.options(load_only(Firmware.id, Firmware.file_data))
+    listing = Firmware.query.options(load_only(
+        Firmware.id, Firmware.version, Firmware.equipment_id, Firmware.release_date,
+        Firmware.changelog, Firmware.file_size
+    ))
+
+    eager_bytes, listing_bytes = fetched_bytes(eager), fetched_bytes(listing)
+    eager_peak = peak_memory(lambda: [fw.file_data for fw in eager.all()])
+    listing_peak = peak_memory(lambda: listing.all())
+    print(
+        f"\nfirmware listing: {eager_bytes} -> {listing_bytes} bytes fetched, "
+        f"peak {eager_peak} -> {listing_peak} bytes"
+    )
+
+    assert listing_bytes * 100 < eager_bytes
+    assert listing_peak * 10 < eager_peak
+
+    firmware = Firmware.query.first()
+    assert 'file_data' not in firmware.__dict__
+    assert firmware.file_size == len(FIRMWARE_IMAGE)
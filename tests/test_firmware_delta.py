@@ -0,0 +1,87 @@
+import lzma
+import os
+import random
+import struct
+import time
+import pytest
+from app.apps.multi_control.delta import DeltaError, make_delta, apply_delta
+
+
+def sample_image(seed, functions=400, patched=False):
+    """Synthetic firmware: incompressible function bodies joined by absolute call instructions.
+
+    The patched build inserts a function mid-image and edits another, so every
+    call target after the insertion point shifts, as it does in a real relink.
+    """
+    rng = random.Random(seed)
+    bodies = [rng.randbytes(rng.randint(200, 3000)) for _ in range(functions)]
+    if patched:
+        bodies.insert(functions // 2, random.Random(seed + 1).randbytes(1500))
+        body = bytearray(bodies[10])
+        body[100:140] = random.Random(seed + 2).randbytes(40)
+        bodies[10] = bytes(body)
+
+    calls_per_function = 8
+    addresses, position = [], 0
+    for body in bodies:
+        addresses.append(position)
+        position += len(body) + 5 * calls_per_function
+    call_rng = random.Random(seed + 3)
+    image = bytearray()
+    for body in bodies:
+        image += body
+        for _ in range(calls_per_function):
+            image += b'\xe8' + struct.pack('<I', addresses[call_rng.randrange(len(addresses))])
+    return bytes(image)
+
+
+@pytest.mark.parametrize('old, new', [
+    (b'', b'firmware'),
+    (b'firmware', b''),
+    (b'firmware image v1', b'firmware image v1'),
+    (bytes(4096), bytes(4096) + b'tail'),
+])
+def test_round_trip_edge_cases(old, new):
+    assert apply_delta(old, make_delta(old, new)) == new
+
+
+def test_round_trip_random_edits():
+    rng = random.Random(7)
+    for _ in range(50):
+        old = rng.randbytes(rng.randint(0, 4000))
+        new = bytearray(old)
+        for _ in range(rng.randint(0, 10)):
+            at = rng.randint(0, len(new))
+            new[at:at + rng.randint(0, 50)] = rng.randbytes(rng.randint(0, 60))
+        assert apply_delta(old, make_delta(old, bytes(new))) == bytes(new)
+
+
+def test_delta_rejects_wrong_source():
+    delta = make_delta(b'version one', b'version two')
+    with pytest.raises(DeltaError):
+        apply_delta(b'version 1.5', delta)
+    with pytest.raises(DeltaError):
+        apply_delta(b'version one', delta[:-4])
+
+
+@pytest.mark.parametrize('functions', [400, 2500])
+def test_delta_size_benchmark(functions):
+    old = sample_image(functions, functions)
+    new = sample_image(functions, functions, patched=True)
+
+    started = time.perf_counter()
+    delta = make_delta(old, new)
+    elapsed = time.perf_counter() - started
+    compressed = len(lzma.compress(new))
+    print(
+        f"\n{len(new)} byte image: full {compressed} bytes compressed, delta {len(delta)} bytes "
+        f"({len(delta) / compressed:.1%}), built in {elapsed:.2f}s"
+    )
+
+    assert apply_delta(old, delta) == new
+    assert len(delta) * 20 < compressed
+
+
+def test_unrelated_images_do_not_shrink():
+    old, new = os.urandom(50000), os.urandom(50000)
+    assert len(make_delta(old, new)) > len(new) * 0.5
@@ -0,0 +1,114 @@
+import struct
+import pytest
+from app.apps.multi_control.geometry import (
+    GeometryError, RTree, SIMPLIFY_LEVELS, parse_kml, parse_shp, bbox_of, area_m2, contains,
+    simplify, simplified_levels, encode_polyline
+)
+
+SQUARE_KML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<kml xmlns="http://www.opengis.net/kml/2.2">
+  <Placemark>
+    <Polygon>
+      <outerBoundaryIs><LinearRing><coordinates>
+        -120.0,36.0 -119.99,36.0 -119.99,36.01 -120.0,36.01 -120.0,36.0
+      </coordinates></LinearRing></outerBoundaryIs>
+      <innerBoundaryIs><LinearRing><coordinates>
+        -119.996,36.004 -119.994,36.004 -119.994,36.006 -119.996,36.006 -119.996,36.004
+      </coordinates></LinearRing></innerBoundaryIs>
+    </Polygon>
+  </Placemark>
+</kml>"""
+
+
+def build_shp(rings):
+    """Build a minimal single-record polygon .shp file"""
+    points = [point for ring in rings for point in ring]
+    parts, start = [], 0
+    for ring in rings:
+        parts.append(start)
+        start += len(ring)
+    xs, ys = [x for x, _ in points], [y for _, y in points]
+    content = (
+        struct.pack('<i', 5) + struct.pack('<4d', min(xs), min(ys), max(xs), max(ys))
+        + struct.pack('<2i', len(parts), len(points)) + struct.pack(f'<{len(parts)}i', *parts)
+        + b''.join(struct.pack('<2d', x, y) for x, y in points)
+    )
+    record = struct.pack('>2i', 1, len(content) // 2) + content
+    header = (
+        struct.pack('>i', 9994) + b'\0' * 20 + struct.pack('>i', (100 + len(record)) // 2)
+        + struct.pack('<2i', 1000, 5) + b'\0' * 64
+    )
+    return header + record
+
+
+def test_parse_kml_polygon_with_hole():
+    polygons = parse_kml(SQUARE_KML)
+    assert len(polygons) == 1 and len(polygons[0]) == 2
+    assert bbox_of(polygons) == (-120.0, 36.0, -119.99, 36.01)
+    assert contains(polygons, -119.998, 36.002)
+    assert not contains(polygons, -119.995, 36.005)  # inside the hole
+    # ~0.9 km x ~1.1 km minus a ~0.18 km x ~0.22 km hole
+    assert 950_000 < area_m2(polygons) < 1_000_000
+
+
+def test_parse_kml_without_polygons():
+    with pytest.raises(GeometryError):
+        parse_kml(b"Test KML content")
+
+
+def test_parse_shp_outer_ring_and_hole():
+    outer = [(0, 0), (0, 1), (1, 1), (1, 0), (0, 0)]  # clockwise
+    hole = [(0.4, 0.4), (0.6, 0.4), (0.6, 0.6), (0.4, 0.6), (0.4, 0.4)]  # counter-clockwise
+    polygons = parse_shp(build_shp([outer, hole]))
+    assert len(polygons) == 1 and len(polygons[0]) == 2
+    assert contains(polygons, 0.2, 0.2)
+    assert not contains(polygons, 0.5, 0.5)
+
+
+@pytest.mark.parametrize('coordinate', [b'east,36.0', b'nan,36.0', b'-120.0,inf'])
+def test_parse_kml_rejects_bad_coordinates(coordinate):
+    with pytest.raises(GeometryError, match='Invalid KML coordinate'):
+        parse_kml(SQUARE_KML.replace(b'-119.99,36.01', coordinate, 1))
+
+
+def test_parse_shp_rejects_corrupt_records():
+    shp = build_shp([[(0, 0), (0, 1), (1, 1), (1, 0), (0, 0)]])
+    counts = 100 + 8 + 36  # num_parts, num_points of the only record
+    for num_parts, num_points in [(-1, 5), (1, -5), (1, 500), (10 ** 6, 5)]:
+        corrupt = shp[:counts] + struct.pack('<2i', num_parts, num_points) + shp[counts + 8:]
+        with pytest.raises(GeometryError, match='SHP'):
+            parse_shp(corrupt)
+    with pytest.raises(GeometryError, match='SHP'):
+        parse_shp(shp[:100] + struct.pack('>2i', 1, -4) + shp[108:])
+
+
+def test_rtree_matches_linear_scan():
+    entries = [((x, y, x + 1.5, y + 1.5), (x, y)) for x in range(30) for y in range(30)]
+    tree = RTree(entries)
+    for point in [(0.5, 0.5), (10.2, 3.9), (29.9, 29.9), (-1, -1)]:
+        expected = sorted(item for bbox, item in entries
+                          if bbox[0] <= point[0] <= bbox[2] and bbox[1] <= point[1] <= bbox[3])
+        assert sorted(tree.query_point(*point)) == expected
+
+
+def test_simplify_drops_collinear_noise_but_keeps_corners():
+    # A ~1 km square with 200 near-collinear points along each edge
+    edge = [i / 200 * 0.01 for i in range(200)]
+    ring = ([(-120 + d, 36.0) for d in edge] + [(-119.99, 36.0 + d) for d in edge]
+            + [(-119.99 - d, 36.01) for d in edge] + [(-120.0, 36.01 - d) for d in edge] + [(-120.0, 36.0)])
+    simplified = simplify([[ring]], 10.0)[0][0]
+    assert len(simplified) == 5
+    corners = {(round(x, 6), round(y, 6)) for x, y in simplified}
+    assert corners == {(-120.0, 36.0), (-119.99, 36.0), (-119.99, 36.01), (-120.0, 36.01)}
+    assert area_m2([[simplified]]) == pytest.approx(area_m2([[ring]]), rel=1e-6)
+
+
+def test_simplified_levels_round_to_level_precision():
+    levels = simplified_levels(parse_kml(SQUARE_KML))
+    assert set(levels) == set(SIMPLIFY_LEVELS)
+    assert levels['low'][0][0][1] == [-119.99, 36.0]
+
+
+def test_encode_polyline_reference_vector():
+    ring = [(-120.2, 38.5), (-120.95, 40.7), (-126.453, 43.252)]
+    assert encode_polyline(ring, 5) == '_p~iF~ps|U_ulLnnqC_mqNvxq`@'
@@ -0,0 +1,124 @@
+import random
+import time
+from datetime import datetime, timedelta
+from app.apps.multi_control.hydraulics import (
+    IntervalTree, PlanCheck, ZoneDemand, ZoneRun, solve_plan, zone_flow
+)
+from app.apps.multi_control.schedule import compile_schedule
+
+START = datetime(2026, 10, 19)
+
+
+def daily(start_time, *zones, minutes=30):
+    return {'frequency': 'daily', 'start_time': start_time,
+            'zones': [{'zone_id': zone, 'duration_minutes': minutes} for zone in zones]}
+
+
+def test_interval_tree_matches_a_linear_scan():
+    rng = random.Random(3)
+    runs = []
+    for index in range(2_000):
+        start = START + timedelta(minutes=rng.randrange(7 * 24 * 60))
+        runs.append(ZoneRun(start, start + timedelta(minutes=rng.randrange(1, 240)), index, None, None, 1.0))
+    tree = IntervalTree(runs)
+    for _ in range(200):
+        start = START + timedelta(minutes=rng.randrange(7 * 24 * 60))
+        end = start + timedelta(minutes=rng.randrange(1, 120))
+        expected = {run.zone_id for run in runs if run.start < end and run.end > start}
+        assert {run.zone_id for run in tree.overlapping(start, end)} == expected
+
+
+def test_zone_flow_from_rate_and_area():
+    # 10 mm/h over one hectare
+    assert zone_flow(10, 10_000) == 100
+    assert zone_flow(None, 10_000) is None
+
+
+def test_overlaps_within_capacity_are_reported_but_allowed():
+    zones = {1: ZoneDemand(10, 40.0), 2: ZoneDemand(10, 40.0)}
+    check = PlanCheck([(7, compile_schedule(daily('06:00', 1)))], zones, 100.0, START)
+    schedule = daily('06:15', 2)
+    report = solve_plan(schedule, compile_schedule(schedule), check)
+    assert report['ok'] and report['proposal'] is None
+    assert report['peak_flow'] == 80.0
+    assert report['overlap_count'] == 7  # one per day on the shared controller
+    assert report['overlaps'][0]['other_plan_id'] == 7
+
+
+def test_over_capacity_plan_gets_a_delayed_proposal():
+    zones = {1: ZoneDemand(10, 60.0), 2: ZoneDemand(10, 60.0), 3: ZoneDemand(11, 30.0)}
+    others = [(7, compile_schedule(daily('06:00', 1, 3)))]  # zone 1 06:00-06:30, zone 3 06:30-07:00
+    check = PlanCheck(others, zones, 100.0, START)
+    schedule = daily('06:10', 2)
+    report = solve_plan(schedule, compile_schedule(schedule), check)
+
+    assert not report['ok']
+    assert report['violation_count'] == 7
+    assert report['violations'][0]['flow'] == 120.0
+    # Zone 2 can start once zone 1 is done; zone 3 alongside it still fits
+    assert report['proposal']['delay_minutes'] == 20
+    assert report['proposal']['schedule']['start_times'] == ['06:30']
+    proposal = report['proposal']['schedule']
+    assert solve_plan(proposal, compile_schedule(proposal), check)['ok']
+
+
+def test_double_booked_zone_is_a_conflict():
+    zones = {1: ZoneDemand(10, None)}
+    check = PlanCheck([(7, compile_schedule(daily('06:00', 1)))], zones, None, START)
+    schedule = daily('06:20', 1)
+    report = solve_plan(schedule, compile_schedule(schedule), check)
+    assert report['zone_conflict_count'] == 7 and report['unmetered_zones'] == [1]
+    assert report['proposal']['schedule']['start_times'] == ['06:30']
+
+
+def test_unfixable_plans_get_no_proposal():
+    zones = {1: ZoneDemand(10, 150.0)}
+    check = PlanCheck([], zones, 100.0, START)
+    schedule = daily('06:00', 1)
+    report = solve_plan(schedule, compile_schedule(schedule), check)
+    assert not report['ok'] and report['proposal'] is None
+
+    # Two start times ten minutes apart make a 30 minute run collide with itself
+    zones = {1: ZoneDemand(10, 10.0)}
+    schedule = {**daily('06:00', 1), 'start_times': ['06:00', '06:10']}
+    report = solve_plan(schedule, compile_schedule(schedule), PlanCheck([], zones, 100.0, START))
+    assert report['zone_conflict_count'] and report['proposal'] is None
+
+
+def test_one_off_plans_shift_their_start():
+    zones = {1: ZoneDemand(10, 80.0), 2: ZoneDemand(10, 80.0)}
+    check = PlanCheck([(7, compile_schedule(daily('06:00', 1)))], zones, 100.0, START)
+    schedule = {'frequency': 'once', 'start_at': '2026-10-20T06:00', 'zones': [{'zone_id': 2, 'duration_minutes': 15}]}
+    report = solve_plan(schedule, compile_schedule(schedule), check)
+    assert report['proposal']['schedule']['start_at'] == '2026-10-20T06:30:00'
+
+
+def test_large_account_solves_well_under_a_second():
+    rng = random.Random(11)
+    zones = {zone: ZoneDemand(zone // 20, 5.0 + rng.random() * 20) for zone in range(400)}
+    # 40 plans of 10 zones, twice a day, spread over the morning and evening
+    others = []
+    for plan_id in range(40):
+        plan_zones = rng.sample(range(400), 10)
+        schedule = {**daily('05:00', *plan_zones, minutes=15),
+                    'start_times': [f"{rng.randrange(4, 9):02d}:{rng.randrange(60):02d}",
+                                    f"{rng.randrange(17, 21):02d}:{rng.randrange(60):02d}"]}
+        others.append((plan_id, compile_schedule(schedule)))
+    schedule = {**daily('06:00', *range(380, 400), minutes=10), 'start_times': ['06:00', '18:00']}
+
+    started = time.perf_counter()
+    check = PlanCheck(others, zones, 60.0, START)
+    report = solve_plan(schedule, compile_schedule(schedule), check)
+    elapsed = time.perf_counter() - started
+
+    print(f"\n{len(check.tree)} existing runs, {report['runs']} new: solved in {elapsed * 1000:.1f} ms")
+    assert report['proposal'] is not None or report['ok']
+    assert elapsed < 1
+
+
+def test_unknown_zones_fail_without_a_proposal():
+    zones = {1: ZoneDemand(10, 10.0)}
+    schedule = daily('06:00', 1, 99)
+    report = solve_plan(schedule, compile_schedule(schedule), PlanCheck([], zones, 100.0, START))
+    assert report['unknown_zones'] == [99]
+    assert not report['ok'] and report['proposal'] is None
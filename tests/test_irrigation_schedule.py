@@ -0,0 +1,98 @@
+import random
+import time
+from datetime import datetime, timedelta
+import pytest
+from app.apps.multi_control.schedule import ScheduleError, FireQueue, compile_schedule
+
+
+def test_daily_runs_at_each_start_time():
+    schedule = compile_schedule({'frequency': 'daily', 'start_times': ['18:30', '06:00'], 'zones': [1]})
+    assert schedule.next_run(datetime(2026, 10, 18, 5, 0)) == datetime(2026, 10, 18, 6, 0)
+    assert schedule.next_run(datetime(2026, 10, 18, 6, 0)) == datetime(2026, 10, 18, 18, 30)
+    assert schedule.next_run(datetime(2026, 10, 18, 19, 0)) == datetime(2026, 10, 19, 6, 0)
+
+
+def test_weekly_runs_in_local_time():
+    schedule = compile_schedule({
+        'frequency': 'weekly', 'days': ['mon', 'thu'], 'start_time': '06:00',
+        'timezone': 'Europe/Madrid', 'zones': [1]
+    })
+    # Sunday 18 October 2026; Madrid is UTC+2 until the 25th, UTC+1 after
+    assert schedule.next_run(datetime(2026, 10, 18, 12, 0)) == datetime(2026, 10, 19, 4, 0)
+    assert schedule.next_run(datetime(2026, 10, 19, 4, 0)) == datetime(2026, 10, 22, 4, 0)
+    assert schedule.next_run(datetime(2026, 10, 23, 0, 0)) == datetime(2026, 10, 26, 5, 0)
+
+
+def test_interval_and_one_off_runs():
+    interval = compile_schedule({'frequency': 'interval', 'every_hours': 8, 'start_at': '2026-10-18T02:00',
+                                 'zones': [1]})
+    assert interval.next_run(datetime(2026, 10, 17)) == datetime(2026, 10, 18, 2, 0)
+    assert interval.next_run(datetime(2026, 10, 18, 10, 0)) == datetime(2026, 10, 18, 18, 0)
+
+    once = compile_schedule({'frequency': 'once', 'start_at': '2026-10-18T02:00', 'zones': [1]})
+    assert once.next_run(datetime(2026, 10, 18)) == datetime(2026, 10, 18, 2, 0)
+    assert once.next_run(datetime(2026, 10, 18, 2, 0)) is None
+
+    disabled = compile_schedule({'frequency': 'daily', 'start_time': '06:00', 'zones': [1], 'enabled': False})
+    assert disabled.next_run(datetime(2026, 10, 18)) is None
+
+
+def test_zones_run_one_after_another():
+    schedule = compile_schedule({'frequency': 'daily', 'start_time': '06:00',
+                                 'zones': [{'zone_id': 3, 'duration_minutes': 15}, 4]})
+    assert schedule.steps == [
+        (0, 'zone_on', 3, 15.0), (900, 'zone_off', 3, 15.0),
+        (900, 'zone_on', 4, 10.0), (1500, 'zone_off', 4, 10.0)
+    ]
+    assert schedule.duration == 1500
+
+
+@pytest.mark.parametrize('schedule', [
+    {'frequency': 'hourly', 'zones': [1]},
+    {'frequency': 'daily', 'zones': [1]},
+    {'frequency': 'daily', 'start_time': '25:00', 'zones': [1]},
+    {'frequency': 'weekly', 'start_time': '06:00', 'zones': [1]},
+    {'frequency': 'daily', 'start_time': '06:00', 'zones': []},
+    {'frequency': 'daily', 'start_time': '06:00', 'zones': [{'zone_id': 1, 'duration_minutes': 0}]},
+    {'frequency': 'interval', 'every_hours': 0.1, 'zones': [{'zone_id': 1, 'duration_minutes': 30}]},
+    {'frequency': 'daily', 'start_time': '06:00', 'timezone': 'Mars/Olympus', 'zones': [1]},
+])
+def test_invalid_schedules_are_rejected(schedule):
+    with pytest.raises(ScheduleError):
+        compile_schedule(schedule)
+
+
+def test_fire_queue_pops_in_time_order():
+    queue = FireQueue()
+    start = datetime(2026, 10, 18)
+    for minutes in (30, 10, 20, 10):
+        queue.push(start + timedelta(minutes=minutes), minutes)
+    assert queue.next_due() == start + timedelta(minutes=10)
+    assert queue.pop_due(start) is None
+    popped = []
+    while (due := queue.pop_due(start + timedelta(minutes=20))) is not None:
+        popped.append(due[1])
+    assert popped == [10, 10, 20]
+    assert len(queue) == 1
+
+
+def test_tick_cost_does_not_grow_with_plan_count():
+    start = datetime(2026, 10, 18)
+    rng = random.Random(7)
+    timings = {}
+    for plans in (1_000, 100_000):
+        queue = FireQueue()
+        for plan_id in range(plans):
+            queue.push(start + timedelta(seconds=rng.randrange(86400)), plan_id)
+        # 500 one-minute ticks, each popping what is due and re-queueing it a day later
+        now, popped, started = start, 0, time.perf_counter()
+        for _ in range(500):
+            now += timedelta(minutes=1)
+            while (due := queue.pop_due(now)) is not None:
+                queue.push(due[0] + timedelta(days=1), due[1])
+                popped += 1
+        timings[plans] = (time.perf_counter() - started) / max(popped, 1)
+
+    print(f"\nper due plan: {timings[1_000] * 1e6:.2f} us with 1k plans, {timings[100_000] * 1e6:.2f} us with 100k")
+    # O(log n): 100x the plans must cost far less than 100x per entry
+    assert timings[100_000] < timings[1_000] * 10
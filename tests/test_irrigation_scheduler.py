@@ -0,0 +1,210 @@
+import json
+from datetime import datetime, timedelta
+import pytest
+from app.extensions import db
+from app.apps.multi_control.models import Field, Equipment, Zone, IrrigationPlan, Log, WaterUsageDaily
+from app.apps.multi_control.services import IrrigationScheduler
+
+DAY = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+
+@pytest.fixture
+def irrigation(app):
+    field = Field(account_id=1, name='Orchard')
+    db.session.add(field)
+    db.session.flush()
+    equipment = Equipment(account_id=1, field_id=field.id, name='Valves', controller_id='IRR-1')
+    db.session.add(equipment)
+    db.session.flush()
+    zones = [Zone(account_id=1, equipment_id=equipment.id, name=name) for name in ('North', 'South')]
+    db.session.add_all(zones)
+    db.session.commit()
+
+    client = app.test_client()
+    response = client.post('/multi_controls/plans/', json={
+        'name': 'Morning', 'field_id': field.id, 'account_id': 1,
+        'schedule': {'frequency': 'daily', 'start_time': '06:00', 'zones': [
+            {'zone_id': zones[0].id, 'duration_minutes': 20}, {'zone_id': zones[1].id, 'duration_minutes': 10}
+        ]}
+    })
+    assert response.status_code == 201
+    return client, field, zones, json.loads(response.data)['id']
+
+
+def irrigation_commands():
+    logs = Log.query.filter_by(event_type='irrigation_command').order_by(Log.timestamp, Log.id).all()
+    return [(log.event_data['zone_name'], log.event_data['action']) for log in logs]
+
+
+def test_plan_runs_its_zones_in_order(irrigation):
+    client, field, zones, plan_id = irrigation
+    scheduler = IrrigationScheduler()
+
+    assert scheduler.tick(DAY + timedelta(hours=5)) == 0
+    assert scheduler.tick(DAY + timedelta(hours=6, minutes=1)) == 1
+    assert db.session.get(Field, field.id).current_zone == 'North'
+
+    assert scheduler.tick(DAY + timedelta(hours=6, minutes=35)) == 3
+    assert irrigation_commands() == [
+        ('North', 'zone_on'), ('North', 'zone_off'), ('South', 'zone_on'), ('South', 'zone_off')
+    ]
+    db.session.expire_all()
+    assert db.session.get(Field, field.id).current_zone is None
+    assert scheduler.queue.next_due() == DAY + timedelta(days=1, hours=6)
+
+
+def test_plan_changes_are_picked_up_incrementally(irrigation):
+    client, field, zones, plan_id = irrigation
+    scheduler = IrrigationScheduler()
+    scheduler.tick(DAY)
+
+    client.put(f'/multi_controls/plans/{plan_id}', json={
+        'schedule': {'frequency': 'daily', 'start_time': '07:00', 'zones': [zones[1].id]}
+    })
+    assert scheduler.tick(DAY + timedelta(hours=6, minutes=30)) == 0
+    assert scheduler.tick(DAY + timedelta(hours=7, minutes=30)) == 2
+    assert irrigation_commands() == [('South', 'zone_on'), ('South', 'zone_off')]
+
+
+def test_deleting_a_plan_lets_the_running_zone_finish(irrigation):
+    client, field, zones, plan_id = irrigation
+    scheduler = IrrigationScheduler()
+    scheduler.tick(DAY)
+    scheduler.tick(DAY + timedelta(hours=6, minutes=5))
+
+    assert client.delete(f'/multi_controls/plans/{plan_id}').status_code == 200
+    scheduler.notify(plan_id)
+    scheduler.tick(DAY + timedelta(hours=7))
+    # The run already under way completes; no later run is started
+    assert irrigation_commands()[-1] == ('South', 'zone_off')
+    assert scheduler.tick(DAY + timedelta(days=1, hours=7)) == 0
+
+
+def test_invalid_schedule_is_rejected(irrigation):
+    client, field, zones, plan_id = irrigation
+    response = client.put(f'/multi_controls/plans/{plan_id}', json={
+        'schedule': {'frequency': 'weekly', 'start_time': '06:00', 'zones': [zones[0].id]}
+    })
+    assert response.status_code == 400
+    assert 'days' in json.loads(response.data)['error']
+
+
+def test_plans_that_overdraw_the_field_are_rejected(irrigation):
+    client, field, zones, plan_id = irrigation
+    field.flow_rate = 100.0
+    for zone in zones:
+        zone.application_rate, zone.area = 10.0, 6000.0  # 60 m3/h each
+    db.session.commit()
+    schedule = {'frequency': 'daily', 'start_time': '06:10', 'zones': [{'zone_id': zones[1].id, 'duration_minutes': 10}]}
+
+    response = client.post('/multi_controls/plans/', json={
+        'name': 'Overlap', 'field_id': field.id, 'account_id': 1, 'schedule': schedule
+    })
+    assert response.status_code == 409
+    check = json.loads(response.data)['check']
+    assert check['violations'][0]['flow'] == 120.0
+    # After North (06:00-06:20) and the existing South run (06:20-06:30)
+    proposal = check['proposal']['schedule']
+    assert proposal['start_times'] == ['06:30']
+
+    response = client.post('/multi_controls/plans/check', json={'field_id': field.id, 'schedule': proposal})
+    assert json.loads(response.data)['ok']
+    assert client.post('/multi_controls/plans/', json={
+        'name': 'Packed', 'field_id': field.id, 'account_id': 1, 'schedule': proposal
+    }).status_code == 201
+    # A plan is not checked against its own previous schedule
+    assert client.put(f'/multi_controls/plans/{plan_id}', json={'schedule': {
+        'frequency': 'daily', 'start_time': '06:05', 'zones': [zones[0].id]
+    }}).status_code == 200
+    assert client.post('/multi_controls/plans/', json={
+        'name': 'Forced', 'field_id': field.id, 'account_id': 1, 'schedule': schedule, 'allow_conflicts': True
+    }).status_code == 201
+
+
+def test_plans_only_accept_zones_of_their_field(irrigation):
+    client, field, zones, plan_id = irrigation
+    other_field = Field(account_id=2, name='Neighbour')
+    db.session.add(other_field)
+    db.session.flush()
+    other_equipment = Equipment(account_id=2, field_id=other_field.id, name='Other valves', controller_id='IRR-2')
+    db.session.add(other_equipment)
+    db.session.flush()
+    other_zone = Zone(account_id=2, equipment_id=other_equipment.id, name='Theirs')
+    db.session.add(other_zone)
+    db.session.commit()
+    schedule = {'frequency': 'daily', 'start_time': '09:00', 'zones': [zones[0].id, other_zone.id]}
+
+    response = client.post('/multi_controls/plans/', json={
+        'name': 'Trespass', 'field_id': field.id, 'account_id': 1, 'schedule': schedule, 'allow_conflicts': True
+    })
+    assert response.status_code == 400
+    assert str(other_zone.id) in json.loads(response.data)['error']
+    assert client.put(f'/multi_controls/plans/{plan_id}', json={'schedule': schedule}).status_code == 400
+
+
+def test_dispatched_commands_stay_out_of_the_rollups(irrigation):
+    client, field, zones, plan_id = irrigation
+    scheduler = IrrigationScheduler()
+    scheduler.tick(DAY)
+    scheduler.tick(DAY + timedelta(hours=6, minutes=35))
+    assert len(irrigation_commands()) == 4
+
+    # Only the controller's report of the completed run is water usage
+    assert WaterUsageDaily.query.filter_by(field_id=field.id).count() == 0
+
+    # Only the controller's report of the completed run is water usage
+    client.post('/multi_controls/logs/bulk', json=[{
+        'controller_id': 'IRR-1', 'event_type': 'irrigation_event',
+        'event_data': {'zone_id': zones[0].id, 'water_volume': 12.5, 'duration': 20},
+        'timestamp': (DAY + timedelta(hours=6, minutes=20)).isoformat()
+    }])
+    rollups = db.session.query(WaterUsageDaily.zone_id, WaterUsageDaily.event_count, WaterUsageDaily.duration,
+                               WaterUsageDaily.water_volume).filter(WaterUsageDaily.field_id == field.id).all()
+    assert rollups == [(zones[0].id, 1, 20.0, 12.5)]
+
+
+def test_moving_a_plan_rechecks_it_on_the_new_field(irrigation):
+    client, field, zones, plan_id = irrigation
+    annex = Field(account_id=1, name='Annex', flow_rate=100.0)
+    db.session.add(annex)
+    db.session.commit()
+    # The plan's zones are still wired to the orchard's controller
+    assert client.put(f'/multi_controls/plans/{plan_id}', json={'field_id': annex.id}).status_code == 400
+
+    equipment = Equipment.query.filter_by(controller_id='IRR-1').one()
+    equipment.field_id = annex.id
+    for zone in zones:
+        zone.application_rate, zone.area = 10.0, 6000.0  # 60 m3/h each
+    db.session.commit()
+    client.post('/multi_controls/plans/', json={
+        'name': 'Annex morning', 'field_id': annex.id, 'account_id': 1, 'allow_conflicts': True,
+        'schedule': {'frequency': 'daily', 'start_time': '06:10', 'zones': [zones[1].id]}
+    })
+
+    response = client.put(f'/multi_controls/plans/{plan_id}', json={'field_id': annex.id})
+    assert response.status_code == 409
+    assert json.loads(response.data)['check']['violation_count']
+    assert client.put(f'/multi_controls/plans/{plan_id}', json={
+        'field_id': annex.id, 'allow_conflicts': True
+    }).status_code == 200
+
+
+@pytest.mark.parametrize('field_id', ['1', 1.5, True, None])
+def test_plan_field_id_must_be_an_integer(irrigation, field_id):
+    client, field, zones, plan_id = irrigation
+    response = client.put(f'/multi_controls/plans/{plan_id}', json={'field_id': field_id})
+    assert response.status_code == 400
+    assert json.loads(response.data)['error'] == 'field_id must be an integer'
+
+
+def test_plans_cannot_move_to_another_accounts_field(irrigation):
+    client, field, zones, plan_id = irrigation
+    other_field = Field(account_id=2, name='Neighbour')
+    db.session.add(other_field)
+    db.session.commit()
+
+    for field_id in (other_field.id, other_field.id + 1000):
+        response = client.put(f'/multi_controls/plans/{plan_id}', json={'field_id': field_id, 'allow_conflicts': True})
+        assert response.status_code == 404
+    db.session.expire_all()
+    assert db.session.get(IrrigationPlan, plan_id).field_id == field.id
@@ -0,0 +1,77 @@
+import threading
+import time
+import warnings
+from flask import Flask
+from app.extensions import db
+from app.apps.task_manager.models import build_task_model
+from app.utils.model_registry import ModelRegistry
+
+
+def test_models_are_cached_per_account():
+    registry = ModelRegistry(build_task_model)
+    model = registry.get(101)
+    assert registry.get('101') is model
+    assert model.__tablename__ == 'tasks_101'
+    assert registry.get(102) is not model
+    registry.clear()
+
+
+def test_models_are_kept_past_the_warning_size(caplog):
+    app = Flask(__name__)
+    app.config['DYNAMIC_MODEL_WARN_AFTER'] = 2
+    registry = ModelRegistry(build_task_model)
+    with app.app_context():
+        first = registry.get(201)
+        registry.get(202)
+        registry.get(203)
+        registry.get(204)
+        assert registry.stats()['warn_after'] == 2
+
+    # A class handed out earlier stays mapped and is the one returned again
+    assert registry.get(201) is first
+    assert len(registry) == 4 and registry.stats()['misses'] == 4
+    assert len([r for r in caplog.records if 'model registry holds' in r.getMessage()]) == 1
+    assert first.__table__ is db.metadata.tables['tasks_201']
+    registry.clear()
+
+
+def test_bootstrap_runs_once_across_threads():
+    calls = []
+    registry = ModelRegistry(build_task_model, bootstrap=lambda: calls.append(time.sleep(0.01)))
+    models = {}
+
+    def load(account_id):
+        models.setdefault(account_id, set()).add(registry.get(account_id))
+
+    threads = [threading.Thread(target=load, args=(300 + i % 4,)) for i in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert all(len(classes) == 1 for classes in models.values())
+    registry.clear()
+
+
+def test_registry_overhead_benchmark():
+    iterations = 200
+    with warnings.catch_warnings():
+        # Rebuilding the same class name is exactly what the registry avoids
+        warnings.simplefilter('ignore')
+        started = time.perf_counter()
+        for _ in range(iterations):
+            build_task_model(400)
+        uncached = (time.perf_counter() - started) / iterations
+
+        registry = ModelRegistry(build_task_model)
+        registry.get(400)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        registry.get(400)
+    cached = (time.perf_counter() - started) / iterations
+    registry.clear()
+
+    print(f"\nper-request model lookup: {uncached * 1e6:.1f} us uncached, {cached * 1e6:.2f} us cached "
+          f"({uncached / cached:.0f}x)")
+    assert cached * 20 < uncached
@@ -4,9 +4,20 @@ from datetime import datetime, timedelta
 from app.extensions import db
 from app.models.user_app import UserApp
 from app.apps.multi_control.models import (
-    Field, Equipment, Zone, IrrigationPlan, Alert, Log, Firmware
+    Field, Equipment, Zone, IrrigationPlan, Alert, Log, Firmware, FirmwareRolloutTarget,
+    WaterUsageHourly, WaterUsageDaily, Geometry, FirmwareDelta
 )
+from app.apps.multi_control import services
+from app.apps.multi_control.services import (
+    RollupService, LogPartitionService, PresenceService, RolloutService, FirmwareStorageService
+)
+from app.apps.multi_control.delta import apply_delta
+from app.services.blob_store import get_blob_store
+import hashlib
 import io
+import os
+import time
+from unittest.mock import Mock
 
 
 @pytest.fixture
@@ -69,7 +80,8 @@ class TestFieldManagement:
         data = json.loads(response.data)
         assert data['name'] == "Test Field"
 
-    def test_upload_kml(self, test_client, init_database):
+    def test_upload_kml(self, app, test_client, init_database, tmp_path):
+        app.config['BLOB_STORAGE_PATH'] = str(tmp_path)
         data = {'field_id': init_database['field_id']}
         file_data = io.BytesIO(b"Test KML content")
         response = test_client.post(
@@ -78,6 +90,56 @@ class TestFieldManagement:
             content_type='multipart/form-data'
         )
         assert response.status_code == 200
+        digest = json.loads(response.data)['sha256']
+        assert db.session.get(Field, init_database['field_id']).kml_blob == digest
+        with get_blob_store(app).open(digest) as blob:
+            assert blob.read() == b"Test KML content"
+
+    def test_upload_deduplicates_blobs(self, app, test_client, init_database, tmp_path):
+        app.config['BLOB_STORAGE_PATH'] = str(tmp_path)
+        digests = set()
+        for kind in ('kml', 'shp'):
+            response = test_client.post(
+                f'/multi_controls/fields/upload_{kind}',
+                data={'file': (io.BytesIO(b"same bytes"), f'test.{kind}'), 'field_id': init_database['field_id']},
+                content_type='multipart/form-data'
+            )
+            digests.add(json.loads(response.data)['sha256'])
+        assert len(digests) == 1
+        assert len([p for p in tmp_path.rglob('*') if p.is_file()]) == 1
+
+    def test_geometries_are_simplified_and_revalidated(self, app, test_client, init_database, tmp_path):
+        app.config['BLOB_STORAGE_PATH'] = str(tmp_path)
+        # A ~1 km square traced with 100 points per edge
+        steps = [i / 100 * 0.01 for i in range(100)]
+        ring = ([(-120 + d, 36.0) for d in steps] + [(-119.99, 36.0 + d) for d in steps]
+                + [(-119.99 - d, 36.01) for d in steps] + [(-120.0, 36.01 - d) for d in steps] + [(-120.0, 36.0)])
+        coordinates = ' '.join(f'{lon},{lat}' for lon, lat in ring)
+        kml = (f'<kml xmlns="http://www.opengis.net/kml/2.2"><Placemark><Polygon><outerBoundaryIs><LinearRing>'
+               f'<coordinates>{coordinates}</coordinates></LinearRing></outerBoundaryIs></Polygon></Placemark></kml>')
+        test_client.post(
+            '/multi_controls/fields/upload_kml',
+            data={'file': (io.BytesIO(kml.encode()), 'field.kml'), 'field_id': init_database['field_id']},
+            content_type='multipart/form-data'
+        )
+
+        url = f'/multi_controls/geometries/?account_id={init_database["account_id"]}&owner_type=field'
+        response = test_client.get(f'{url}&zoom=12')
+        assert response.status_code == 200
+        assert response.headers['ETag']
+        feature = json.loads(response.data)['features'][0]
+        assert feature['properties']['owner_id'] == init_database['field_id']
+        assert len(feature['geometry']['coordinates'][0][0]) == 5
+
+        full = json.loads(test_client.get(f'{url}&level=full').data)['features'][0]
+        assert len(full['geometry']['coordinates'][0][0]) == len(ring)
+
+        revalidated = test_client.get(f'{url}&zoom=12', headers={'If-None-Match': response.headers['ETag']})
+        assert revalidated.status_code == 304
+
+        encoded = json.loads(test_client.get(f'{url}&zoom=12&format=polyline').data)
+        assert encoded['encoding'] == 'polyline'
+        assert isinstance(encoded['features'][0]['geometry']['coordinates'][0][0], str)
 
 
 class TestEquipmentManagement:
@@ -108,6 +170,41 @@ class TestEquipmentManagement:
         )
         assert response.status_code == 201
 
+    def test_heartbeat_flush_transitions(self, test_client, init_database):
+        response = test_client.post(
+            '/multi_controls/equipment/heartbeat',
+            data=json.dumps({'controller_id': init_database['controller_id']}),
+            content_type='application/json'
+        )
+        assert response.status_code == 202
+
+        result = PresenceService.flush(timeout=90)
+        assert result['activated'] == [init_database['controller_id']]
+        assert db.session.get(Equipment, init_database['equipment_id']).status == 'ACTIVE'
+        assert PresenceService.flush(timeout=90)['activated'] == []
+
+        result = PresenceService.flush(timeout=90, now=time.time() + 120)
+        assert result['deactivated'] == [init_database['controller_id']]
+        db.session.expire_all()
+        assert db.session.get(Equipment, init_database['equipment_id']).status == 'INACTIVE'
+
+    def test_flush_leaves_controllers_without_heartbeats_alone(self, init_database):
+        equipment = db.session.get(Equipment, init_database['equipment_id'])
+        equipment.status = 'ACTIVE'
+        db.session.commit()
+        PresenceService.store.hdel(PresenceService.HASH_KEY, *PresenceService.last_seen())
+
+        assert PresenceService.flush(timeout=90, now=time.time() + 3600)['deactivated'] == []
+        assert db.session.get(Equipment, init_database['equipment_id']).status == 'ACTIVE'
+
+    def test_in_memory_flusher_refuses_several_workers(self, app):
+        app.testing, app.config['WEB_WORKERS'] = False, 4
+        try:
+            PresenceService.ensure_flusher(app)
+        finally:
+            app.testing = True
+        assert PresenceService._flusher is None or not PresenceService._flusher.is_alive()
+
 
 class TestZoneManagement:
     def test_create_zone(self, test_client, init_database):
@@ -125,6 +222,48 @@ class TestZoneManagement:
         )
         assert response.status_code == 201
 
+    def test_zone_geometry_drives_area_and_lookup(self, app, test_client, init_database, tmp_path):
+        app.config['BLOB_STORAGE_PATH'] = str(tmp_path)
+        zone = Zone(
+            name='Mapped Zone',
+            equipment_id=init_database['equipment_id'],
+            account_id=init_database['account_id']
+        )
+        db.session.add(zone)
+        db.session.commit()
+
+        kml = b"""<kml xmlns="http://www.opengis.net/kml/2.2"><Placemark><Polygon><outerBoundaryIs>
+            <LinearRing><coordinates>-120,36 -119.99,36 -119.99,36.01 -120,36.01 -120,36</coordinates></LinearRing>
+            </outerBoundaryIs></Polygon></Placemark></kml>"""
+        response = test_client.post(
+            '/multi_controls/zones/upload_kml',
+            data={'file': (io.BytesIO(kml), 'zone.kml'), 'zone_id': zone.id},
+            content_type='multipart/form-data'
+        )
+        assert response.status_code == 200
+        assert json.loads(response.data)['geometry']['polygons'] == 1
+        assert db.session.get(Zone, zone.id).area > 0
+
+        base = f'/multi_controls/zones/locate?account_id={init_database["account_id"]}'
+        inside = json.loads(test_client.get(f'{base}&lat=36.005&lon=-119.995').data)
+        outside = json.loads(test_client.get(f'{base}&lat=36.5&lon=-119.995').data)
+        assert [z['zone_id'] for z in inside] == [zone.id]
+        assert outside == []
+
+        # A broken re-upload replaces the file, so the old shape must not linger
+        response = test_client.post(
+            '/multi_controls/zones/upload_kml',
+            data={'file': (io.BytesIO(b'<kml><coordinates>east,north</coordinates></kml>'), 'zone.kml'),
+                  'zone_id': zone.id},
+            content_type='multipart/form-data'
+        )
+        assert response.status_code == 200
+        assert json.loads(response.data)['geometry'] is None
+        db.session.expire_all()
+        assert db.session.get(Zone, zone.id).area is None
+        assert Geometry.query.filter_by(owner_type='zone', owner_id=zone.id).count() == 0
+        assert json.loads(test_client.get(f'{base}&lat=36.005&lon=-119.995').data) == []
+
     def test_list_zones(self, test_client, init_database):
         response = test_client.get(f'/multi_controls/zones/?account_id={init_database["account_id"]}')
         assert response.status_code == 200
@@ -155,6 +294,96 @@ class TestLogsAndReports:
         response = test_client.get(f'/multi_controls/logs/?account_id={init_database["account_id"]}')
         assert response.status_code == 200
 
+    def test_get_logs_keyset_pagination(self, test_client, init_database):
+        now = datetime.utcnow()
+        for i in range(5):
+            db.session.add(Log(
+                account_id=init_database['account_id'],
+                field_id=init_database['field_id'],
+                event_type='telemetry',
+                event_data={'seq': i},
+                timestamp=now - timedelta(minutes=i)
+            ))
+        db.session.commit()
+
+        seen = []
+        cursor = None
+        while True:
+            url = f'/multi_controls/logs/?account_id={init_database["account_id"]}&limit=2'
+            if cursor:
+                url += f'&cursor={cursor}'
+            data = json.loads(test_client.get(url).data)
+            seen.extend(log['event_data']['seq'] for log in data['logs'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        assert seen == [0, 1, 2, 3, 4]
+
+    def test_get_logs_ndjson_stream(self, test_client, init_database):
+        db.session.add(Log(
+            account_id=init_database['account_id'],
+            field_id=init_database['field_id'],
+            event_type='telemetry',
+            event_data={}
+        ))
+        db.session.commit()
+        response = test_client.get(f'/multi_controls/logs/?account_id={init_database["account_id"]}&format=ndjson')
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        lines = response.get_data(as_text=True).strip().split("\n")
+        assert json.loads(lines[0])['event_type'] == 'telemetry'
+
+    @pytest.mark.parametrize('query', ['limit=0', 'limit=-1', 'limit=abc', 'limit=1001',
+                                       'limit=0&format=ndjson', 'limit=-5&format=ndjson'])
+    def test_get_logs_rejects_bad_limits(self, test_client, init_database, query):
+        response = test_client.get(f'/multi_controls/logs/?account_id={init_database["account_id"]}&{query}')
+        assert response.status_code == 400
+        assert 'limit' in json.loads(response.data)['error']
+
+    def test_bulk_ingest_logs(self, test_client, init_database):
+        events = [
+            {'controller_id': init_database['controller_id'], 'event_type': 'telemetry', 'event_data': {'pressure': 48.5}},
+            {'controller_id': init_database['controller_id'], 'event_type': 'error', 'timestamp': datetime.utcnow().isoformat()},
+            {'controller_id': 'UNKNOWN'}
+        ]
+        response = test_client.post(
+            '/multi_controls/logs/bulk',
+            data=json.dumps(events),
+            content_type='application/json'
+        )
+        assert response.status_code == 201
+        data = json.loads(response.data)
+        assert data['inserted'] == 2
+        assert data['rejected'][0]['index'] == 2
+        assert Log.query.filter_by(account_id=init_database['account_id']).count() == 2
+
+    def test_bulk_ingest_normalizes_offsets_and_rejects_bad_event_data(self, test_client, init_database):
+        controller_id = init_database['controller_id']
+        events = [
+            {'controller_id': controller_id, 'event_type': 'offset', 'timestamp': '2026-10-18T10:00:00+02:00'},
+            {'controller_id': controller_id, 'event_data': [1, 2]},
+            {'controller_id': controller_id, 'event_data': 'text'}
+        ]
+        response = test_client.post('/multi_controls/logs/bulk', json=events)
+        assert response.status_code == 201
+        data = json.loads(response.data)
+        assert data['inserted'] == 1
+        assert [item['index'] for item in data['rejected']] == [1, 2]
+        assert Log.query.filter_by(event_type='offset').one().timestamp == datetime(2026, 10, 18, 8, 0)
+
+    def test_bulk_ingest_logs_ndjson(self, test_client, init_database):
+        body = "\n".join(
+            json.dumps({'controller_id': init_database['controller_id'], 'event_data': {'seq': i}})
+            for i in range(5)
+        )
+        response = test_client.post(
+            '/multi_controls/logs/bulk',
+            data=body,
+            content_type='application/x-ndjson'
+        )
+        assert response.status_code == 201
+        assert json.loads(response.data)['inserted'] == 5
+
     def test_water_usage_report(self, test_client, init_database):
         response = test_client.get(
             f'/multi_controls/reports/water-usage?account_id={init_database["account_id"]}'
@@ -163,10 +392,155 @@ class TestLogsAndReports:
         )
         assert response.status_code == 200
 
+    def test_water_usage_report_aggregates(self, test_client, init_database):
+        day = datetime(2025, 3, 1, 6, 0)
+        for hours, volume in [(0, 100.0), (1, 50.0), (25, 30.0)]:
+            db.session.add(Log(
+                account_id=init_database['account_id'],
+                field_id=init_database['field_id'],
+                event_type='irrigation_event',
+                event_data={'water_volume': volume},
+                timestamp=day + timedelta(hours=hours)
+            ))
+        db.session.commit()
+
+        response = test_client.get(
+            f'/multi_controls/reports/water-usage?account_id={init_database["account_id"]}&granularity=day'
+        )
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['total_water_usage'] == 180.0
+        assert data['usage_by_field'][str(init_database['field_id'])] == 180.0
+        assert sorted(data['usage_by_date'].values()) == [30.0, 150.0]
+
+    def test_water_usage_report_reads_rollups(self, test_client, init_database):
+        day = datetime(2025, 3, 1)
+        events = [
+            {'controller_id': init_database['controller_id'], 'event_type': 'irrigation_event',
+             'event_data': {'water_volume': 40.0, 'zone_id': 1}, 'timestamp': (day + timedelta(hours=2)).isoformat()},
+            {'controller_id': init_database['controller_id'], 'event_type': 'irrigation_event',
+             'event_data': {'water_volume': 60.0, 'zone_id': 2}, 'timestamp': (day + timedelta(hours=3)).isoformat()}
+        ]
+        test_client.post('/multi_controls/logs/bulk', data=json.dumps(events), content_type='application/json')
+
+        response = test_client.get(
+            f'/multi_controls/reports/water-usage?account_id={init_database["account_id"]}'
+            f'&start_date={day.isoformat()}&end_date={(day + timedelta(days=1)).isoformat()}'
+        )
+        data = json.loads(response.data)
+        assert data['source'] == 'water_usage_daily'
+        assert data['total_water_usage'] == 100.0
+
+        assert WaterUsageHourly.query.filter_by(account_id=init_database['account_id']).count() == 2
+        RollupService.rebuild(init_database['account_id'])
+        assert WaterUsageDaily.query.filter_by(account_id=init_database['account_id']).count() == 2
+
+    def test_water_usage_range_is_half_open_for_both_sources(self, test_client, init_database):
+        day = datetime(2025, 3, 1)
+        events = [
+            {'controller_id': init_database['controller_id'], 'event_type': 'irrigation_event',
+             'event_data': {'water_volume': volume}, 'timestamp': timestamp.isoformat()}
+            for volume, timestamp in ((40.0, day + timedelta(hours=2)), (60.0, day + timedelta(days=1)))
+        ]
+        test_client.post('/multi_controls/logs/bulk', data=json.dumps(events), content_type='application/json')
+
+        url = f'/multi_controls/reports/water-usage?account_id={init_database["account_id"]}'
+        end = (day + timedelta(days=1)).isoformat()
+        rollup = json.loads(test_client.get(f'{url}&start_date={day.isoformat()}&end_date={end}').data)
+        raw = json.loads(test_client.get(
+            f'{url}&start_date={(day + timedelta(minutes=1)).isoformat()}&end_date={end}'
+        ).data)
+        assert (rollup['source'], raw['source']) == ('water_usage_daily', 'logs')
+        assert rollup['total_water_usage'] == raw['total_water_usage'] == 40.0
+
+    def test_water_usage_report_invalid_granularity(self, test_client, init_database):
+        response = test_client.get(
+            f'/multi_controls/reports/water-usage?account_id={init_database["account_id"]}&granularity=minute'
+        )
+        assert response.status_code == 400
+
     def test_system_health_report(self, test_client, init_database):
         response = test_client.get(f'/multi_controls/reports/system-health?account_id={init_database["account_id"]}')
         assert response.status_code == 200
 
+    def test_system_health_recent_errors_follow_the_lookback(self, app, test_client, init_database):
+        db.session.add(Log(
+            account_id=init_database['account_id'], field_id=init_database['field_id'], event_type='error',
+            event_data={'message': 'old failure'}, timestamp=datetime.utcnow() - timedelta(days=40)
+        ))
+        db.session.commit()
+        url = f'/multi_controls/reports/system-health?account_id={init_database["account_id"]}'
+
+        report = json.loads(test_client.get(url).data)
+        assert report['recent_errors'] == [] and report['recent_errors_lookback_days'] == 30
+
+        app.config['LOG_REPORT_LOOKBACK_DAYS'] = 0
+        try:
+            report = json.loads(test_client.get(url).data)
+        finally:
+            app.config['LOG_REPORT_LOOKBACK_DAYS'] = 30
+        assert [error['message'] for error in report['recent_errors']] == ['old failure']
+        assert report['recent_errors_lookback_days'] is None
+
+
+class TestLogPartitions:
+    def test_ensure_and_drop_partitions(self, init_database):
+        now = datetime(2025, 6, 15)
+        db.session.add(Log(
+            account_id=init_database['account_id'],
+            field_id=init_database['field_id'],
+            event_type='telemetry',
+            event_data={},
+            timestamp=now
+        ))
+        db.session.commit()
+
+        created = LogPartitionService.ensure_partitions(months_ahead=1, now=now)
+        assert created == ['logs_2025_06', 'logs_2025_07']
+        assert db.session.execute(db.text("SELECT count(*) FROM logs_2025_06")).scalar() == 1
+        assert Log.query.filter_by(account_id=init_database['account_id']).count() == 1
+
+        removed = LogPartitionService.drop_partitions(older_than_months=0, now=datetime(2025, 7, 1))
+        assert removed == ['logs_2025_06']
+        assert Log.query.filter_by(account_id=init_database['account_id']).count() == 0
+
+
+class TestLiveUpdates:
+    def test_long_poll_receives_changes(self, test_client, init_database):
+        url = f'/multi_controls/events/?account_id={init_database["account_id"]}&mode=poll&timeout=0'
+        since = json.loads(test_client.get(url).data)['last_id']
+
+        field = db.session.get(Field, init_database['field_id'])
+        field.pressure = 42.0
+        db.session.add(Alert(
+            account_id=init_database['account_id'],
+            field_id=init_database['field_id'],
+            alert_type='pressure_low',
+            message='Pressure below threshold'
+        ))
+        db.session.commit()
+
+        data = json.loads(test_client.get(f'{url}&since={since}').data)
+        assert [item['event'] for item in data['events']] == ['field', 'alert']
+        assert data['events'][0]['data']['pressure'] == 42.0
+        assert data['last_id'] == data['events'][-1]['id']
+
+    @pytest.mark.parametrize('foreign_id', ['0badc0ffee00-999999', '999999'])
+    def test_resume_from_another_workers_id_starts_from_now(self, test_client, init_database, foreign_id):
+        # Ids issued by another worker or before a restart may be far above this worker's counter
+        url = f'/multi_controls/events/?account_id={init_database["account_id"]}&mode=poll&timeout=0'
+        field = db.session.get(Field, init_database['field_id'])
+        field.pressure = 43.0
+        db.session.commit()
+        resumed = json.loads(test_client.get(url, headers={'Last-Event-ID': foreign_id}).data)
+        assert resumed['events'] == []
+
+        field.pressure = 44.0
+        db.session.commit()
+        events = json.loads(test_client.get(f'{url}&since={resumed["last_id"]}').data)['events']
+        assert [item['data']['pressure'] for item in events] == [44.0]
+        assert test_client.get(f'{url}&since=abc-def').status_code == 400
+
 
 class TestFirmwareManagement:
     def test_list_firmware(self, test_client, init_database):
@@ -198,6 +572,268 @@ class TestFirmwareManagement:
         )
         assert response.status_code == 200
 
+    def post_image(self, test_client, image, account_id, equipment_id, version='2.0.0'):
+        return test_client.post(
+            '/multi_controls/firmware/',
+            data={
+                'file': (io.BytesIO(image), 'controller.bin'),
+                'account_id': account_id,
+                'equipment_id': equipment_id,
+                'version': version
+            },
+            content_type='multipart/form-data'
+        )
+
+    def upload_image(self, test_client, init_database, image, version='2.0.0'):
+        response = self.post_image(
+            test_client, image, init_database['account_id'], init_database['equipment_id'], version
+        )
+        assert response.status_code == 201
+        return json.loads(response.data)
+
+    def test_firmware_chunks_dedupe_across_accounts(self, app, test_client, init_database, tmp_path):
+        app.config.update(BLOB_STORAGE_PATH=str(tmp_path), FIRMWARE_CHUNK_SIZE=64 * 1024)
+        other_account = init_database['account_id'] + 1
+        other_field = Field(account_id=other_account, name="Other Field")
+        db.session.add(other_field)
+        db.session.commit()
+        other_equipment = Equipment(account_id=other_account, field_id=other_field.id,
+                                    name="Other Controller", controller_id="CTRL002")
+        db.session.add(other_equipment)
+        db.session.commit()
+
+        image = os.urandom(150 * 1024)
+        first = self.upload_image(test_client, init_database, image)
+        response = self.post_image(test_client, image, other_account, other_equipment.id)
+        assert response.status_code == 201
+        second = json.loads(response.data)
+
+        assert first['chunks'] == 3
+        assert first['sha256'] == second['sha256'] == hashlib.sha256(image).hexdigest()
+        assert len([p for p in tmp_path.rglob('*') if p.is_file()]) == 3
+
+        manifest = json.loads(test_client.get(
+            f'/multi_controls/firmware/{first["id"]}/manifest?account_id={init_database["account_id"]}'
+        ).data)
+        assert [chunk['size'] for chunk in manifest['chunks']] == [65536, 65536, 22528]
+        assert manifest['chunks'][1]['sha256'] == hashlib.sha256(image[65536:131072]).hexdigest()
+
+    def test_firmware_routes_are_scoped_to_the_account(self, app, test_client, init_database, tmp_path):
+        app.config['BLOB_STORAGE_PATH'] = str(tmp_path)
+        firmware_id = self.upload_image(test_client, init_database, b'account image')['id']
+        other_account = init_database['account_id'] + 1
+        for route in ('manifest', 'download', 'delta'):
+            url = f'/multi_controls/firmware/{firmware_id}/{route}?from_version=1.0.0'
+            assert test_client.get(url).status_code == 400
+            assert test_client.get(f'{url}&account_id={other_account}').status_code == 404
+
+    def test_firmware_upload_rejects_another_accounts_equipment(self, test_client, init_database):
+        response = self.post_image(test_client, b'image', init_database['account_id'] + 1,
+                                   init_database['equipment_id'])
+        assert response.status_code == 404
+        assert Firmware.query.count() == 0
+
+    def test_firmware_download_supports_range_and_etag(self, app, test_client, init_database, tmp_path):
+        app.config.update(BLOB_STORAGE_PATH=str(tmp_path), FIRMWARE_CHUNK_SIZE=64 * 1024)
+        image = os.urandom(150 * 1024)
+        firmware_id = self.upload_image(test_client, init_database, image)['id']
+        url = f'/multi_controls/firmware/{firmware_id}/download?account_id={init_database["account_id"]}'
+
+        full = test_client.get(url)
+        assert full.status_code == 200
+        assert full.data == image
+        etag = full.headers['ETag']
+
+        resumed = test_client.get(url, headers={'Range': 'bytes=100000-', 'If-Range': etag})
+        assert resumed.status_code == 206
+        assert resumed.data == image[100000:]
+        assert resumed.headers['Content-Range'] == f'bytes 100000-{len(image) - 1}/{len(image)}'
+
+        # A range across a chunk boundary is read from the chunks; no whole-image copy is stored
+        straddling = test_client.get(url, headers={'Range': 'bytes=60000-70000'})
+        assert straddling.data == image[60000:70001]
+        assert len([p for p in tmp_path.rglob('*') if p.is_file()]) == 3
+
+        assert test_client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    def test_firmware_delta_from_reported_version(self, app, test_client, init_database, tmp_path):
+        app.config['BLOB_STORAGE_PATH'] = str(tmp_path)
+        old_image = os.urandom(200 * 1024)
+        new_image = old_image[:5000] + b'patched section' + old_image[5000:]
+        self.upload_image(test_client, init_database, old_image, version='1.0.0')
+        firmware_id = self.upload_image(test_client, init_database, new_image, version='1.1.0')['id']
+
+        account_id = init_database['account_id']
+        response = test_client.get(f'/multi_controls/firmware/{firmware_id}/delta?account_id={account_id}',
+                                   headers={'X-Firmware-Version': '1.0.0'})
+        assert response.status_code == 200
+        assert len(response.data) < len(new_image) // 50
+        assert apply_delta(old_image, response.data) == new_image
+        assert response.headers['X-Firmware-Sha256'] == hashlib.sha256(new_image).hexdigest()
+
+        unknown = test_client.get(
+            f'/multi_controls/firmware/{firmware_id}/delta?from_version=0.9.0&account_id={account_id}'
+        )
+        assert unknown.status_code == 302
+        assert unknown.headers['Location'].endswith(
+            f'/multi_controls/firmware/{firmware_id}/download?account_id={account_id}'
+        )
+
+    def test_firmware_upload_queues_the_delta_build(self, app, test_client, init_database, tmp_path, monkeypatch):
+        app.config['BLOB_STORAGE_PATH'] = str(tmp_path)
+        old_image = os.urandom(200 * 1024)
+        self.upload_image(test_client, init_database, old_image, version='1.0.0')
+
+        started = []
+        monkeypatch.setattr(services.threading, 'Thread', lambda **kwargs: started.append(kwargs) or Mock())
+        monkeypatch.setattr(app, 'testing', False)
+        self.upload_image(test_client, init_database, old_image + b'patch', version='1.1.0')
+        assert [thread['name'] for thread in started] == ['firmware-delta']
+        assert FirmwareDelta.query.count() == 0
+
+    def test_firmware_delta_miss_serves_full_image_first(self, app, test_client, init_database, tmp_path):
+        app.config['BLOB_STORAGE_PATH'] = str(tmp_path)
+        old_image = os.urandom(200 * 1024)
+        self.upload_image(test_client, init_database, old_image, version='1.0.0')
+        self.upload_image(test_client, init_database, old_image + b'one', version='1.1.0')
+        firmware_id = self.upload_image(test_client, init_database, old_image + b'two', version='1.2.0')['id']
+        account_id = init_database['account_id']
+        url = f'/multi_controls/firmware/{firmware_id}/delta?from_version=1.0.0&account_id={account_id}'
+
+        # Uploads only prebuild the delta from the previous release
+        miss = test_client.get(url)
+        assert miss.status_code == 302
+        assert miss.headers['Location'].endswith(
+            f'/multi_controls/firmware/{firmware_id}/download?account_id={account_id}'
+        )
+
+        hit = test_client.get(url)
+        assert hit.status_code == 200
+        assert apply_delta(old_image, hit.data) == old_image + b'two'
+
+    def test_legacy_inline_firmware_is_served_once_chunked(self, app, test_client, init_database, tmp_path):
+        app.config['BLOB_STORAGE_PATH'] = str(tmp_path)
+        firmware = Firmware(
+            account_id=init_database['account_id'],
+            equipment_id=init_database['equipment_id'],
+            version='1.0.0',
+            release_date=datetime.utcnow(),
+            file_data=b'legacy image'
+        )
+        db.session.add(firmware)
+        db.session.commit()
+
+        url = f'/multi_controls/firmware/{firmware.id}/download?account_id={init_database["account_id"]}'
+
+        # GETs never convert; `flask chunk_firmware` does
+        assert test_client.get(url).status_code == 404
+        assert db.session.get(Firmware, firmware.id).file_data == b'legacy image'
+
+        assert FirmwareStorageService.ensure_chunked(firmware, 64 * 1024)
+        db.session.commit()
+        assert test_client.get(url).data == b'legacy image'
+        firmware = db.session.get(Firmware, firmware.id)
+        assert firmware.file_data is None
+        assert firmware.file_size == len(b'legacy image')
+        assert firmware.sha256 == hashlib.sha256(b'legacy image').hexdigest()
+
+
+class TestFirmwareRollouts:
+    @pytest.fixture
+    def fleet(self, init_database):
+        controllers = []
+        for i in range(6):
+            equipment = Equipment(
+                account_id=init_database['account_id'], field_id=init_database['field_id'],
+                name=f"Fleet {i}", controller_id=f"FLEET{i:03d}", status='ACTIVE'
+            )
+            db.session.add(equipment)
+            controllers.append(equipment)
+        firmware = Firmware(
+            account_id=init_database['account_id'], equipment_id=init_database['equipment_id'],
+            version='3.0.0', release_date=datetime.utcnow()
+        )
+        db.session.add(firmware)
+        db.session.commit()
+        return {'firmware_id': firmware.id, 'controllers': [c.controller_id for c in controllers],
+                'equipment_ids': [c.id for c in controllers]}
+
+    def start(self, test_client, init_database, fleet, **limits):
+        response = test_client.post('/multi_controls/firmware/rollouts/', data=json.dumps({
+            'account_id': init_database['account_id'], 'firmware_id': fleet['firmware_id'],
+            'equipment_ids': fleet['equipment_ids'], **limits
+        }), content_type='application/json')
+        assert response.status_code == 201
+        return json.loads(response.data)['id']
+
+    def report(self, test_client, fleet, controller_id, status):
+        return test_client.post(f'/multi_controls/firmware/report/{controller_id}', data=json.dumps({
+            'firmware_id': fleet['firmware_id'], 'status': status
+        }), content_type='application/json')
+
+    def downloading(self, rollout_id):
+        return [
+            (target.equipment_id, target.wave) for target in FirmwareRolloutTarget.query.filter_by(
+                rollout_id=rollout_id, status='downloading'
+            ).order_by(FirmwareRolloutTarget.id)
+        ]
+
+    def test_waves_respect_concurrency_and_ordering(self, test_client, init_database, fleet):
+        rollout_id = self.start(test_client, init_database, fleet, wave_size=3, max_concurrency=2)
+        ids = fleet['equipment_ids']
+
+        assert RolloutService.tick(max_downloads=10, target_timeout=600) == {rollout_id: 2}
+        assert self.downloading(rollout_id) == [(ids[0], 0), (ids[1], 0)]
+
+        # The third controller of wave 0 goes before anything in wave 1
+        self.report(test_client, fleet, fleet['controllers'][0], 'succeeded')
+        RolloutService.tick(max_downloads=10, target_timeout=600)
+        assert self.downloading(rollout_id) == [(ids[1], 0), (ids[2], 0)]
+
+        for controller_id in fleet['controllers'][1:3]:
+            self.report(test_client, fleet, controller_id, 'succeeded')
+        RolloutService.tick(max_downloads=10, target_timeout=600)
+        assert [wave for _, wave in self.downloading(rollout_id)] == [1, 1]
+
+    def test_global_download_cap(self, test_client, init_database, fleet):
+        first = self.start(test_client, init_database, fleet, wave_size=6, max_concurrency=5)
+        second = self.start(test_client, init_database, fleet, wave_size=6, max_concurrency=5)
+        assert RolloutService.tick(max_downloads=4, target_timeout=600) == {first: 4}
+        assert not self.downloading(second)
+        assert RolloutService.tick(max_downloads=4, target_timeout=600) == {}
+
+    def test_error_rate_pauses_rollout(self, test_client, init_database, fleet):
+        rollout_id = self.start(
+            test_client, init_database, fleet, wave_size=6, max_concurrency=3, error_threshold=0.5, min_samples=2
+        )
+        RolloutService.tick(max_downloads=10, target_timeout=600)
+        self.report(test_client, fleet, fleet['controllers'][0], 'failed')
+        self.report(test_client, fleet, fleet['controllers'][1], 'failed')
+        assert RolloutService.tick(max_downloads=10, target_timeout=600) == {}
+
+        progress = json.loads(test_client.get(f'/multi_controls/firmware/rollouts/{rollout_id}').data)
+        assert progress['status'] == 'paused'
+        assert progress['targets']['failed'] == 2
+        assert progress['targets']['pending'] == 3
+
+    def test_offline_wave_is_skipped_and_rollout_completes(self, test_client, init_database, fleet):
+        Equipment.query.filter(Equipment.id.in_(fleet['equipment_ids'][:3])).update(
+            {'status': 'INACTIVE'}, synchronize_session=False
+        )
+        db.session.commit()
+        rollout_id = self.start(test_client, init_database, fleet, wave_size=3, max_concurrency=3)
+
+        RolloutService.tick(max_downloads=10, target_timeout=600)
+        RolloutService.tick(max_downloads=10, target_timeout=600)
+        for controller_id in fleet['controllers'][3:]:
+            self.report(test_client, fleet, controller_id, 'succeeded')
+        RolloutService.tick(max_downloads=10, target_timeout=600)
+
+        progress = json.loads(test_client.get(f'/multi_controls/firmware/rollouts/{rollout_id}').data)
+        assert progress['status'] == 'completed'
+        assert progress['targets']['skipped'] == 3
+        assert progress['targets']['succeeded'] == 3
+
 
 class TestSystemStatus:
     def test_system_status(self, test_client, init_database):
@@ -207,6 +843,22 @@ class TestSystemStatus:
         assert 'status' in data
         assert 'equipment' in data
 
+    def test_system_status_cache_invalidation(self, test_client, init_database):
+        url = f'/multi_controls/status/?account_id={init_database["account_id"]}'
+        assert json.loads(test_client.get(url).data)['alerts']['active'] == 0
+        hits = json.loads(test_client.get('/multi_controls/status/cache').data)['hits']
+        test_client.get(url)
+        assert json.loads(test_client.get('/multi_controls/status/cache').data)['hits'] == hits + 1
+
+        db.session.add(Alert(
+            account_id=init_database['account_id'],
+            field_id=init_database['field_id'],
+            alert_type='pressure_low',
+            message='Pressure below threshold'
+        ))
+        db.session.commit()
+        assert json.loads(test_client.get(url).data)['alerts']['active'] == 1
+
     def test_ping(self, test_client):
         response = test_client.get('/multi_controls/ping')
         assert response.status_code == 200
@@ -0,0 +1,140 @@
+import json
+import os
+import pytest
+from datetime import datetime, timedelta
+from app.extensions import db
+from app.apps.multi_control.models import Field, Equipment, Alert, Log
+from app.apps.multi_control.services import StatusService
+
+# Planner cost ceilings per hot query, recorded from a seeded database.
+# Run with UPDATE_QUERY_PLAN_BASELINES=1 to re-record after an intended change.
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'query_plan_baselines.json')
+COST_TOLERANCE = 1.25
+HOT_TABLES = {'equipment', 'alerts', 'logs'}
+ACCOUNT_ID = 1
+HOT_QUERY_NAMES = [
+    'system_status', 'list_alerts', 'get_logs_page', 'get_logs_by_type', 'health_recent_errors'
+]
+# Composite indexes each hot query must use; the older single-column ones do not count
+EXPECTED_INDEXES = {
+    'system_status': {'ix_equipment_account_status', 'ix_alerts_account_unresolved', 'ix_logs_account_event_timestamp'},
+    'list_alerts': {'ix_alerts_account_unresolved'},
+    'get_logs_page': {'ix_logs_account_timestamp'},
+    'get_logs_by_type': {'ix_logs_account_event_timestamp'},
+    'health_recent_errors': {'ix_logs_account_event_timestamp'},
+}
+
+
+@pytest.fixture
+def seeded(app):
+    now = datetime.utcnow()
+    for account_id in (ACCOUNT_ID, ACCOUNT_ID + 1):
+        field = Field(account_id=account_id, name=f"Field {account_id}")
+        db.session.add(field)
+        db.session.flush()
+        for i in range(20):
+            db.session.add(Equipment(
+                account_id=account_id, field_id=field.id, name=f"Controller {i}",
+                controller_id=f"CTRL-{account_id}-{i}", status='ACTIVE' if i % 2 else 'INACTIVE'
+            ))
+            db.session.add(Alert(
+                account_id=account_id, field_id=field.id, alert_type='pressure_low',
+                message='Pressure below threshold', resolved=bool(i % 4)
+            ))
+        for i in range(500):
+            db.session.add(Log(
+                account_id=account_id, field_id=field.id,
+                event_type='error' if i % 10 == 0 else 'telemetry',
+                event_data={'seq': i}, timestamp=now - timedelta(hours=i)
+            ))
+    db.session.commit()
+    db.session.execute(db.text("ANALYZE equipment, alerts, logs"))
+    # The seeded tables are small enough that a seq scan would always win; price it out so the
+    # plans show which index the planner picks once the tables are large
+    db.session.execute(db.text("SET enable_seqscan = off"))
+    yield
+    db.session.execute(db.text("RESET enable_seqscan"))
+
+
+def hot_queries():
+    since = datetime.utcnow() - timedelta(hours=24)
+    return {
+        'system_status': StatusService.status_query(ACCOUNT_ID),
+        'list_alerts': Alert.query.filter_by(
+            account_id=ACCOUNT_ID, resolved=False
+        ).order_by(Alert.created_at.desc()),
+        'get_logs_page': Log.query.filter_by(account_id=ACCOUNT_ID).order_by(
+            Log.timestamp.desc(), Log.id.desc()
+        ).limit(101),
+        'get_logs_by_type': Log.query.filter_by(
+            account_id=ACCOUNT_ID, event_type='telemetry'
+        ).filter(Log.timestamp >= since).order_by(Log.timestamp.desc(), Log.id.desc()),
+        'health_recent_errors': Log.query.filter_by(
+            account_id=ACCOUNT_ID, event_type='error'
+        ).filter(Log.timestamp >= since - timedelta(days=29)).order_by(Log.timestamp.desc()).limit(10),
+    }
+
+
+def explain(query):
+    statement = getattr(query, 'statement', query)
+    compiled = statement.compile(dialect=db.engine.dialect)
+    result = db.session.connection().exec_driver_sql(
+        "EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params
+    ).scalar()
+    plan = result if isinstance(result, list) else json.loads(result)
+    return plan[0]['Plan']
+
+
+def walk(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from walk(child)
+
+
+def root_index(name):
+    """Parent index name for an index of a logs partition, the name itself otherwise"""
+    return db.session.execute(db.text("""
+        WITH RECURSIVE chain(oid) AS (
+            SELECT to_regclass(:name)::oid
+            UNION ALL
+            SELECT inherits.inhparent FROM pg_inherits inherits JOIN chain ON inherits.inhrelid = chain.oid
+        )
+        SELECT c.relname FROM chain JOIN pg_class c ON c.oid = chain.oid
+        WHERE NOT EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = chain.oid)
+    """), {'name': name}).scalar() or name
+
+
+def load_baselines():
+    if not os.path.exists(BASELINE_PATH):
+        return {}
+    with open(BASELINE_PATH) as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize('name', HOT_QUERY_NAMES)
+def test_hot_query_plan(app, seeded, name):
+    plan = explain(hot_queries()[name])
+
+    seq_scans = [
+        node.get('Relation Name') for node in walk(plan)
+        if node['Node Type'] == 'Seq Scan' and node.get('Relation Name', '').split('_')[0] in HOT_TABLES
+    ]
+    assert not seq_scans, f"{name} falls back to a sequential scan on {seq_scans}"
+    used = {root_index(node['Index Name']) for node in walk(plan) if 'Index Name' in node}
+    missing = EXPECTED_INDEXES[name] - used
+    assert not missing, f"{name} does not use {sorted(missing)}; plan uses {sorted(used)}"
+
+    baselines = load_baselines()
+    cost = plan['Total Cost']
+    if os.getenv('UPDATE_QUERY_PLAN_BASELINES'):
+        baselines[name] = cost
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        return
+    assert name in baselines, (
+        f"No cost baseline for {name} in {os.path.basename(BASELINE_PATH)}; "
+        "record one with UPDATE_QUERY_PLAN_BASELINES=1 and commit the file"
+    )
+    assert cost <= baselines[name] * COST_TOLERANCE, (
+        f"{name} cost regressed from {baselines[name]} to {cost}"
+    )
@@ -0,0 +1,137 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import pytest
+from app.extensions import db
+from app.apps.multi_control.models import Field, Equipment, SimCard
+from app.apps.multi_control.services import SimSyncService
+from app.services.soracom_service import SoracomClient
+
+STATUSES = ['active', 'inactive', 'ready', 'suspended']
+
+
+class FakeSubscribers(BaseHTTPRequestHandler):
+    """GET /v1/subscribers with status_filter and last_evaluated_key paging"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        status = query.get('status_filter', [None])[0]
+        if status in self.server.failing:
+            body, headers, code = {'message': 'unavailable'}, {}, 500
+        else:
+            with self.server.lock:
+                matching = sorted(
+                    (s for s in self.server.subscribers.values() if status is None or s['status'] == status),
+                    key=lambda s: s['imsi']
+                )
+            start = query.get('last_evaluated_key', [None])[0]
+            if start:
+                matching = [s for s in matching if s['imsi'] > start]
+            limit = int(query['limit'][0])
+            body, code = matching[:limit], 200
+            headers = {'x-soracom-next-key': body[-1]['imsi']} if len(matching) > limit else {}
+
+        payload = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+@pytest.fixture
+def soracom():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeSubscribers)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.failing = set()
+    server.subscribers = {
+        f'44010{i:010d}': {
+            'imsi': f'44010{i:010d}',
+            'iccid': f'8981100{i:012d}',
+            'status': STATUSES[i % len(STATUSES)],
+            'speedClass': 's1.standard',
+            'sessionStatus': {'online': i % 2 == 0},
+            'tags': {'controller_id': f'SIM-CTRL-{i}'} if i < 5 else {},
+            'lastModifiedAt': 1760000000000 + i
+        }
+        for i in range(250)
+    }
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(soracom):
+    return SoracomClient(f'http://127.0.0.1:{soracom.server_port}/v1', api_key='key', token='token',
+                         max_retries=0, pool_size=4)
+
+
+def sync(client):
+    return SimSyncService.sync(client, statuses=STATUSES, page_size=40, batch_size=100)
+
+
+def test_sync_writes_only_changed_rows(app, soracom, client):
+    first = sync(client)
+    assert (first.status, first.fetched, first.changed) == ('succeeded', 250, 250)
+    assert SimCard.query.count() == 250
+
+    second = sync(client)
+    assert (second.fetched, second.changed) == (250, 0)
+
+    untouched = db.session.get(SimCard, '440100000000100').synced_at
+    with soracom.lock:
+        soracom.subscribers['440100000000007']['status'] = 'active'
+        soracom.subscribers['440100000000008']['tags'] = {'controller_id': 'SIM-CTRL-8'}
+        soracom.subscribers['440100000000009']['sessionStatus'] = {'online': True}
+    third = sync(client)
+    assert third.changed == 3
+
+    db.session.expire_all()
+    assert db.session.get(SimCard, '440100000000007').status == 'active'
+    assert db.session.get(SimCard, '440100000000008').controller_id == 'SIM-CTRL-8'
+    assert db.session.get(SimCard, '440100000000100').synced_at == untouched
+
+
+def test_failed_partition_is_reported_without_losing_the_rest(app, soracom, client):
+    soracom.failing.add('suspended')
+    run = sync(client)
+    assert run.status == 'partial'
+    assert run.fetched == 250 - len(range(3, 250, len(STATUSES)))
+    assert 'suspended' in run.error
+
+
+def test_sims_are_linked_to_equipment(app, soracom, client):
+    field = Field(account_id=1, name='SIM Field')
+    db.session.add(field)
+    db.session.flush()
+    db.session.add(Equipment(account_id=1, field_id=field.id, name='Cellular', controller_id='SIM-CTRL-3'))
+    db.session.commit()
+    sync(client)
+
+    test_client = app.test_client()
+    sims = json.loads(test_client.get('/multi_controls/sims/?account_id=1').data)
+    assert [(sim['imsi'], sim['controller_id']) for sim in sims] == [('440100000000003', 'SIM-CTRL-3')]
+
+    metrics = json.loads(test_client.get('/multi_controls/sims/sync').data)
+    assert metrics['last_duration_ms'] is not None
+    assert metrics['runs'][0]['fetched'] == 250
+
+
+def test_unexpected_errors_still_finish_the_run(app, soracom, client):
+    with soracom.lock:
+        soracom.subscribers['440100000000042']['lastModifiedAt'] = 'yesterday'
+    run = sync(client)
+    assert run.status == 'failed' and run.finished_at is not None
+    assert run.error and SimCard.query.count() == 0
@@ -0,0 +1,132 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import pytest
+from app.services.soracom_service import SoracomClient, SoracomError
+
+
+class FakeSoracom(BaseHTTPRequestHandler):
+    """Just enough of the Soracom API: subscribers, paging, a flaky and a slow endpoint"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        state = self.server.state
+        url = urlparse(self.path)
+        with state['lock']:
+            state['requests'] += 1
+            state['connections'].add(self.client_address)
+        if self.headers.get('X-Soracom-API-Key') != 'key':
+            return self.reply(401, {'message': 'Unauthorized'})
+
+        parts = url.path.strip('/').split('/')
+        if parts == ['v1', 'flaky']:
+            with state['lock']:
+                state['flaky'] += 1
+                failing = state['flaky'] <= 2
+            return self.reply(503, {'message': 'busy'}) if failing else self.reply(200, {'ok': True})
+        if parts == ['v1', 'slow']:
+            time.sleep(0.5)
+            return self.reply(200, {'ok': True})
+        if parts == ['v1', 'subscribers']:
+            query = parse_qs(url.query)
+            limit = int(query['limit'][0])
+            start = int(query.get('last_evaluated_key', ['0'])[0])
+            page = [{'imsi': f'{i:015d}'} for i in range(start, min(start + limit, 250))]
+            headers = {'x-soracom-next-key': str(start + limit)} if start + limit < 250 else {}
+            return self.reply(200, page, headers)
+        if parts[:2] == ['v1', 'subscribers'] and len(parts) == 3:
+            time.sleep(0.05)
+            return self.reply(200, {'imsi': parts[2], 'status': 'active'})
+        return self.reply(404, {'message': 'Not found'})
+
+
+@pytest.fixture
+def soracom():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeSoracom)
+    server.daemon_threads = True
+    server.state = {'lock': threading.Lock(), 'requests': 0, 'connections': set(), 'flaky': 0}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_client(server, **options):
+    options = {'api_key': 'key', 'token': 'token', 'backoff': 0.01, 'pool_size': 8, **options}
+    return SoracomClient(f'http://127.0.0.1:{server.server_port}/v1', **options)
+
+
+def test_bulk_lookups_reuse_pooled_connections(soracom):
+    client = make_client(soracom)
+    imsis = [f'{i:015d}' for i in range(200)]
+
+    started = time.perf_counter()
+    results = client.get_subscribers(imsis)
+    elapsed = time.perf_counter() - started
+
+    assert [results[imsi]['imsi'] for imsi in imsis] == imsis
+    assert soracom.state['requests'] == 200
+    assert len(soracom.state['connections']) <= client.pool_size
+    # 200 lookups at 50 ms each would take 10 s serially
+    assert elapsed < 5
+
+
+def test_subscriber_reads_are_cached(soracom):
+    client = make_client(soracom, cache_ttl=60)
+    client.get_subscriber('001010000000001')
+    client.get_subscriber('001010000000001')
+    assert soracom.state['requests'] == 1
+
+    client.get_subscriber('001010000000001', cached=False)
+    assert soracom.state['requests'] == 2
+
+
+def test_transient_errors_are_retried(soracom):
+    client = make_client(soracom, max_retries=3)
+    assert client.request('GET', '/flaky') == {'ok': True}
+    assert soracom.state['flaky'] == 3
+
+
+def test_retries_are_bounded(soracom):
+    client = make_client(soracom, max_retries=1)
+    with pytest.raises(SoracomError) as error:
+        client.request('GET', '/flaky')
+    assert error.value.status_code == 503
+    assert soracom.state['flaky'] == 2
+
+
+def test_read_timeout(soracom):
+    client = make_client(soracom, timeout=(1, 0.1), max_retries=0)
+    with pytest.raises(SoracomError) as error:
+        client.request('GET', '/slow')
+    assert error.value.status_code == 503
+
+
+def test_pagination_follows_next_key(soracom):
+    client = make_client(soracom)
+    pages = list(client.iter_pages('/subscribers', limit=100))
+    assert [len(page) for page in pages] == [100, 100, 50]
+
+
+def test_client_errors_are_not_retried(soracom):
+    client = make_client(soracom, api_key='wrong')
+    with pytest.raises(SoracomError) as error:
+        client.request('GET', '/subscribers/001010000000001')
+    assert error.value.status_code == 401
+    assert soracom.state['requests'] == 1
@@ -0,0 +1,141 @@
+import os
+import random
+import statistics
+import time
+import pytest
+from sqlalchemy import inspect, text
+from app.extensions import db
+from app.apps.multi_control.models import create_multi_control_model, multi_control_models, shared_multi_control_models
+from app.apps.multi_control.services import MultiControlService
+from app.apps.task_manager.services import TaskService
+from app.services.tenancy import TenancyService
+
+SCALE_ACCOUNTS = int(os.getenv('TENANCY_SCALE_ACCOUNTS', 0))
+
+
+@pytest.fixture
+def shared(app):
+    app.config['TENANCY_MODE'] = 'shared'
+    return app
+
+
+def test_shared_mode_isolates_accounts(shared):
+    _, first = MultiControlService.create_control(1, 'First')
+    MultiControlService.create_control(2, 'Second')
+    assert [control['title'] for control in MultiControlService.get_controls(1)] == ['First']
+    assert MultiControlService.update_control_status(2, first['id'], 'INACTIVE')[0] is False
+    assert MultiControlService.delete_control(2, first['id'])[0] is False
+    assert MultiControlService.update_control_status(1, first['id'], 'INACTIVE')[1]['status'] == 'INACTIVE'
+
+    _, task = TaskService.create_task(1, 'Irrigate')
+    assert TaskService.get_tasks(2) == []
+    # query.get() through another account's class must not find the row
+    assert TaskService.update_task_status(2, task['id'], 'completed')[0] is False
+    assert TaskService.update_task_status(1, task['id'], 'completed')[1]['status'] == 'COMPLETED'
+
+    assert not inspect(db.engine).has_table('multi_controls_1')
+    assert db.session.execute(text("SELECT count(*) FROM multi_controls")).scalar() == 2
+
+
+def test_account_tables_are_migrated_into_the_shared_table(app):
+    create_multi_control_model(7).__table__.create(db.engine)
+    MultiControlService.create_control(7, 'Legacy')
+
+    summary = TenancyService.migrate_account_tables('multi_controls')
+    assert (summary['tables'], summary['rows'], summary['failed']) == (1, 1, {})
+    # Repeating the run copies nothing twice
+    assert TenancyService.migrate_account_tables('multi_controls', drop_source=True)['rows'] == 0
+    assert not inspect(db.engine).has_table('multi_controls_7')
+
+    app.config['TENANCY_MODE'] = 'shared'
+    assert [control['title'] for control in MultiControlService.get_controls(7)] == ['Legacy']
+
+
+def test_rls_setting_follows_the_session(shared):
+    shared.config['TENANCY_RLS'] = True
+    create_multi_control_model(5)
+    setting = text("SELECT current_setting('app.account_id', true)")
+    assert db.session.execute(setting).scalar() == '5'
+    db.session.commit()
+    assert db.session.execute(setting).scalar() == '5'
+    db.session.commit()
+
+    TenancyService.enable_rls('multi_controls')
+    try:
+        policies = db.session.execute(text(
+            "SELECT count(*) FROM pg_policies WHERE tablename = 'multi_controls'"
+        )).scalar()
+        assert policies == 1
+        MultiControlService.create_control(5, 'Visible')
+        if not db.session.execute(text("SELECT rolbypassrls OR rolsuper FROM pg_roles WHERE rolname = current_user")).scalar():
+            # Policies only apply to roles that cannot bypass them
+            create_multi_control_model(6)
+            db.session.commit()
+            assert db.session.execute(text("SELECT count(*) FROM multi_controls")).scalar() == 0
+    finally:
+        db.session.rollback()
+        TenancyService.disable_rls('multi_controls')
+
+
+def _create_account_tables(first, count, batch=200):
+    for start in range(first, first + count, batch):
+        end = min(start + batch, first + count) - 1
+        db.session.execute(text(f"""
+            DO $$ BEGIN FOR account IN {start}..{end} LOOP
+                EXECUTE format('CREATE TABLE %I (id UUID PRIMARY KEY, title VARCHAR(255) NOT NULL, '
+                               'description TEXT, status controlstatus NOT NULL, created_at TIMESTAMP NOT NULL)',
+                               'multi_controls_' || account);
+                EXECUTE format('INSERT INTO %I VALUES (md5(%L)::uuid, %L, NULL, ''ACTIVE'', now())',
+                               'multi_controls_' || account, account, 'Control ' || account);
+            END LOOP; END $$
+        """))
+        db.session.commit()
+
+
+def _request_latencies(accounts):
+    timings = []
+    for account_id in accounts:
+        started = time.perf_counter()
+        assert len(MultiControlService.get_controls(account_id)) == 1
+        db.session.commit()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), sorted(timings)[int(len(timings) * 0.95)]
+
+
+@pytest.mark.skipif(not SCALE_ACCOUNTS, reason='set TENANCY_SCALE_ACCOUNTS=10000 to run the tenancy scale test')
+def test_shared_tables_scale(app):
+    first = 1_000_000
+    sample = random.Random(42).sample(range(first, first + SCALE_ACCOUNTS), min(200, SCALE_ACCOUNTS))
+    baseline = TenancyService.catalog_stats()
+    try:
+        _create_account_tables(first, SCALE_ACCOUNTS)
+        per_table = TenancyService.catalog_stats()
+        multi_control_models.clear()
+        table_latency = _request_latencies(sample)
+        per_table['metadata_tables'] = TenancyService.catalog_stats()['metadata_tables']
+
+        summary = TenancyService.migrate_account_tables('multi_controls', drop_source=True)
+        assert (summary['tables'], summary['rows']) == (SCALE_ACCOUNTS, SCALE_ACCOUNTS)
+        multi_control_models.clear()
+        shared_stats = TenancyService.catalog_stats()
+
+        app.config['TENANCY_MODE'] = 'shared'
+        shared_multi_control_models.clear()
+        shared_latency = _request_latencies(sample)
+        shared_stats['metadata_tables'] = TenancyService.catalog_stats()['metadata_tables']
+    finally:
+        db.session.rollback()
+        for _, table in TenancyService.account_tables('multi_controls'):
+            db.session.execute(text(f"DROP TABLE {table}"))
+        db.session.commit()
+
+    print(f"\n{SCALE_ACCOUNTS} accounts          per-table     shared")
+    for key in ('relations', 'attributes', 'catalog_bytes', 'metadata_tables'):
+        print(f"{key:<24}{per_table[key]:>10}{shared_stats[key]:>11}")
+    print(f"{'request p50 / p95 (ms)':<24}{table_latency[0]:>5.2f}/{table_latency[1]:<5.2f}"
+          f"{shared_latency[0]:>6.2f}/{shared_latency[1]:.2f}")
+
+    # Each per-account table adds at least its heap, primary key index and TOAST relations
+    assert per_table['relations'] - baseline['relations'] >= 3 * SCALE_ACCOUNTS
+    assert shared_stats['relations'] <= baseline['relations']
+    assert shared_stats['metadata_tables'] <= baseline['metadata_tables'] + 1